@@ -171,6 +171,68 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# The recommendations cache is shared by every worker process, so cached recommendations and
+# their invalidation stay consistent across workers and management commands. Set
+# RECOMMENDATION_CACHE_URL (e.g. redis://host:6379/1) to use Redis; the table of the default
+# database cache is created by the movie migrations.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'recommendations': env.cache(
+        'RECOMMENDATION_CACHE_URL', default='dbcache://recommendation_cache?max_entries=100000'
+    ),
+}
+
+# Recommender artifacts (built by `manage.py build_recommender_index`)
+RECOMMENDER_ROOT = env.str('RECOMMENDER_ROOT', default=os.path.join(BASE_DIR, 'recommender_artifacts'))
+# Seconds between checks for catalog edits made through other worker processes
+RECOMMENDER_SYNC_INTERVAL = env.int('RECOMMENDER_SYNC_INTERVAL', default=60)
+# Load and sync the recommender in a background thread, so no request waits for it
+RECOMMENDER_BACKGROUND_LOAD = env.bool('RECOMMENDER_BACKGROUND_LOAD', default=True)
+# Seconds before the last synced edit that each sync reads again, for edits that commit late
+RECOMMENDER_SYNC_OVERLAP = env.int('RECOMMENDER_SYNC_OVERLAP', default=300)
+# Recency half-life of a preference in a user's taste vector, and how long the vector stays cached
+TASTE_HALF_LIFE_DAYS = 90
+TASTE_CACHE_TIMEOUT = 60 * 60 * 24
+# Seconds a user's ranked questionnaire recommendations stay cached
+RECOMMENDATION_CACHE_TIMEOUT = 60 * 60
+# Blend weights of the hybrid recommender's signals, and how many candidate movies
+# the candidate stage hands to the scoring stage
+HYBRID_WEIGHTS = {
+    'questionnaire': 1.0,
+    'content': 1.0,
+    'collaborative': 1.0,
+}
+HYBRID_CANDIDATE_BUDGET = 500
+# Largest candidate pool the diversity re-ranker picks from
+RECOMMENDER_DIVERSITY_POOL = 100
+# Trending: half-life of an engagement event, the weight of each event type in the score,
+# when a worker flushes its buffered events, the window in which a user's repeated events
+# of one movie and type count once, and how many movies each trending list keeps
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_WEIGHTS = {
+    'likes': 1.0,
+    'watchlist_adds': 0.5,
+    'ratings': 0.75,
+}
+TRENDING_FLUSH_EVENTS = 500
+TRENDING_FLUSH_SECONDS = 30
+TRENDING_DEDUP_HOURS = 24
+TRENDING_LIST_SIZE = 200
+# Dimensions of the dense LSA embeddings replacing the sparse TF-IDF rows (None keeps TF-IDF)
+RECOMMENDER_EMBEDDING_DIM = None
+# Hashed term columns (those used by the most movies) the LSA projection keeps; its components
+# take dimensions x columns x 4 bytes, e.g. 128 x 32768 x 4 = 16 MB
+RECOMMENDER_EMBEDDING_COLUMNS = 32768
+# Approximate nearest neighbor backend for content similarity ('exact' or 'ivf').
+# Catalogs smaller than MIN_ROWS are always scanned exactly; PROBES is the recall/latency knob,
+# read on every query, so changing it needs no rebuild.
+RECOMMENDER_ANN = {
+    'BACKEND': 'ivf',
+    'MIN_ROWS': 20000,
+    'LISTS': None,  # defaults to sqrt(rows)
+    'PROBES': 8,
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
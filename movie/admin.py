@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Movie, UserPreference, RecommendationQuestion, UserAnswer
+from .models import (
+    Movie, MovieNeighbor, MovieAlsoLiked, MovieTrendingScore, UserPreference, RecommendationQuestion, UserAnswer
+)
 
 
 @admin.register(Movie)
@@ -11,6 +13,31 @@ class MovieAdmin(admin.ModelAdmin):
     list_per_page = 25
 
 
+@admin.register(MovieNeighbor)
+class MovieNeighborAdmin(admin.ModelAdmin):
+    list_display = ('movie', 'rank', 'neighbor', 'score')
+    search_fields = ('movie__title', 'neighbor__title')
+    raw_id_fields = ('movie', 'neighbor')
+    list_per_page = 50
+
+
+@admin.register(MovieAlsoLiked)
+class MovieAlsoLikedAdmin(admin.ModelAdmin):
+    list_display = ('movie', 'rank', 'neighbor', 'score')
+    search_fields = ('movie__title', 'neighbor__title')
+    raw_id_fields = ('movie', 'neighbor')
+    list_per_page = 50
+
+
+@admin.register(MovieTrendingScore)
+class MovieTrendingScoreAdmin(admin.ModelAdmin):
+    list_display = ('movie', 'score', 'likes', 'watchlist_adds', 'ratings', 'updated_at')
+    search_fields = ('movie__title',)
+    raw_id_fields = ('movie',)
+    ordering = ('-rank_key',)
+    list_per_page = 50
+
+
 @admin.register(UserPreference)
 class UserPreferenceAdmin(admin.ModelAdmin):
     list_display = ('user', 'movie', 'liked', 'watchlist', 'rating', 'created_at')
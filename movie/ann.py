@@ -0,0 +1,226 @@
+import copy
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from django.conf import settings
+
+from . import recommender_store
+
+
+def _dot(rows, matrix):
+    """Dense (len(rows) x len(matrix)) similarity block for sparse or dense row vectors."""
+    product = rows @ matrix.T
+    return product.toarray() if sparse.issparse(product) else np.asarray(product)
+
+
+class ExactIndex:
+    """Backend that always scans the whole matrix; also the fallback for small catalogs."""
+
+    name = 'exact'
+
+    def __init__(self, probes=None):
+        self.probes = probes
+
+    def build(self, matrix, movie_ids):
+        return self
+
+    def candidate_ids(self, vectors, probes=None):
+        # None means "every row"
+        return None
+
+    def save(self, path):
+        return {'backend': self.name}
+
+    @classmethod
+    def load(cls, path, params, mmap=True):
+        return cls()
+
+    def with_extra_ids(self, movie_ids):
+        return self
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file index: rows are clustered with spherical k-means and a query only
+    scores the rows in its `probes` closest clusters. More probes means higher recall
+    and more rows scored; queries read RECOMMENDER_ANN['PROBES'] unless given `probes`,
+    so the setting takes effect without a rebuild. Works on sparse TF-IDF rows as well as dense embeddings;
+    sparse centroids are truncated to their `centroid_terms` heaviest features.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, n_lists=None, probes=8, iterations=10, train_size=50000, centroid_terms=256,
+                 seed=0):
+        super().__init__(probes)
+        self.n_lists = n_lists
+        self.iterations = iterations
+        self.train_size = train_size
+        self.centroid_terms = centroid_terms
+        self.seed = seed
+        self.centroids = None
+        self.list_offsets = None
+        self.list_ids = None
+        # Movies added or re-embedded after the build; always scored
+        self.extra_ids = np.empty(0, dtype=np.int64)
+
+    def build(self, matrix, movie_ids, block_size=4096):
+        rng = np.random.default_rng(self.seed)
+        n_rows = matrix.shape[0]
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n_rows))), n_rows)
+
+        sample = matrix
+        if n_rows > self.train_size:
+            sample = matrix[np.sort(rng.choice(n_rows, self.train_size, replace=False))]
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)]
+        for _ in range(self.iterations):
+            assignment = self._assign(sample, centroids, block_size)
+            centroids = self._update_centroids(sample, assignment, n_lists, centroids)
+        self.centroids = centroids
+
+        assignment = self._assign(matrix, centroids, block_size)
+        order = np.argsort(assignment, kind='stable')
+        self.list_ids = np.asarray(movie_ids, dtype=np.int64)[order]
+        self.list_offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1)).astype(np.int64)
+        return self
+
+    @staticmethod
+    def _assign(matrix, centroids, block_size):
+        assignment = np.empty(matrix.shape[0], dtype=np.int32)
+        for start in range(0, matrix.shape[0], block_size):
+            assignment[start:start + block_size] = _dot(matrix[start:start + block_size], centroids).argmax(axis=1)
+        return assignment
+
+    def _update_centroids(self, sample, assignment, n_lists, previous):
+        membership = sparse.csr_matrix(
+            (np.ones(len(assignment), dtype=np.float32), (assignment, np.arange(len(assignment)))),
+            shape=(n_lists, sample.shape[0]),
+        )
+        sums = membership @ sample
+        if sparse.issparse(sums):
+            sums = self._truncate(sums.tocsr())
+        else:
+            sums = np.asarray(sums)
+        # Empty clusters keep their previous centroid instead of collapsing to zero
+        empty = np.asarray(membership.sum(axis=1)).ravel() == 0
+        if empty.any():
+            if sparse.issparse(sums):
+                keep = sparse.diags((~empty).astype(np.float32))
+                sums = (keep @ sums + sparse.diags(empty.astype(np.float32)) @ previous).tocsr()
+            else:
+                sums[empty] = previous[empty]
+        return normalize(sums).astype(np.float32)
+
+    def _truncate(self, centroids):
+        for row in range(centroids.shape[0]):
+            lo, hi = centroids.indptr[row], centroids.indptr[row + 1]
+            if hi - lo > self.centroid_terms:
+                values = centroids.data[lo:hi]
+                cutoff = np.partition(values, hi - lo - self.centroid_terms)[hi - lo - self.centroid_terms]
+                values[values < cutoff] = 0
+        centroids.eliminate_zeros()
+        return centroids
+
+    def candidate_ids(self, vectors, probes=None):
+        """Ids in the `probes` closest clusters of each query vector, plus the extra ids."""
+        probes = min(probes or settings.RECOMMENDER_ANN['PROBES'], len(self.list_offsets) - 1)
+        closest = _dot(vectors, self.centroids)
+        lists = np.unique(np.argpartition(-closest, probes - 1, axis=1)[:, :probes])
+        parts = [self.list_ids[self.list_offsets[lst]:self.list_offsets[lst + 1]] for lst in lists]
+        return np.concatenate(parts + [self.extra_ids])
+
+    def with_extra_ids(self, movie_ids):
+        updated = copy.copy(self)
+        updated.extra_ids = np.union1d(self.extra_ids, np.asarray(movie_ids, dtype=np.int64))
+        return updated
+
+    def save(self, path):
+        arrays = {'ann_list_offsets': self.list_offsets, 'ann_list_ids': self.list_ids}
+        if sparse.issparse(self.centroids):
+            arrays.update(
+                ann_centroid_data=self.centroids.data,
+                ann_centroid_indices=self.centroids.indices,
+                ann_centroid_indptr=self.centroids.indptr,
+            )
+        else:
+            arrays['ann_centroids'] = self.centroids
+        recommender_store.save_arrays(path, **arrays)
+        return {
+            'backend': self.name,
+            'probes': self.probes,
+            'n_lists': len(self.list_offsets) - 1,
+            'centroid_shape': list(self.centroids.shape),
+            'sparse': sparse.issparse(self.centroids),
+        }
+
+    @classmethod
+    def load(cls, path, params, mmap=True):
+        index = cls(n_lists=params['n_lists'], probes=params['probes'])
+        if params['sparse']:
+            index.centroids = sparse.csr_matrix(
+                (
+                    recommender_store.load_array(path, 'ann_centroid_data', mmap),
+                    recommender_store.load_array(path, 'ann_centroid_indices', mmap),
+                    recommender_store.load_array(path, 'ann_centroid_indptr', mmap),
+                ),
+                shape=tuple(params['centroid_shape']),
+                copy=False,
+            )
+        else:
+            index.centroids = recommender_store.load_array(path, 'ann_centroids', mmap)
+        index.list_offsets = recommender_store.load_array(path, 'ann_list_offsets', mmap)
+        index.list_ids = recommender_store.load_array(path, 'ann_list_ids', mmap)
+        return index
+
+
+ANN_BACKENDS = {backend.name: backend for backend in (ExactIndex, IVFIndex)}
+
+
+def build_ann_index(backend, matrix, movie_ids, **params):
+    if backend not in ANN_BACKENDS:
+        raise ValueError(f"Unknown ANN backend '{backend}', expected one of {sorted(ANN_BACKENDS)}")
+    return ANN_BACKENDS[backend](**params).build(matrix, movie_ids)
+
+
+def load_ann_index(path, params, mmap=True):
+    if not params:
+        return ExactIndex()
+    return ANN_BACKENDS[params['backend']].load(path, params, mmap)
+
+
+def recall_report(recommender, probes_options=(1, 2, 4, 8, 16, 32), queries=200, limit=10, seed=0):
+    """
+    Compare the ANN backend against an exact scan on a sample of catalog rows and return
+    recall@limit, mean latency and mean rows scored for every probe setting.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = len(recommender)
+    rows = rng.choice(n_rows, min(queries, n_rows), replace=False)
+
+    exact = {}
+    started = time.perf_counter()
+    for row in rows:
+        exact[row] = set(recommender.similar_rows(row, limit, probes=None, exact=True))
+    exact_ms = (time.perf_counter() - started) * 1000 / len(rows)
+
+    report = {'queries': len(rows), 'limit': limit, 'exact_latency_ms': exact_ms, 'probes': []}
+    for probes in probes_options:
+        hits = total = scored = 0
+        started = time.perf_counter()
+        for row in rows:
+            found = recommender.similar_rows(row, limit, probes=probes)
+            hits += len(exact[row] & set(found))
+            total += len(exact[row])
+        latency_ms = (time.perf_counter() - started) * 1000 / len(rows)
+        for row in rows[:20]:
+            candidates = recommender.ann_index.candidate_ids(recommender.row_vectors(slice(row, row + 1)), probes)
+            scored += n_rows if candidates is None else len(candidates)
+        report['probes'].append({
+            'probes': probes,
+            'recall': hits / total if total else 1.0,
+            'latency_ms': latency_ms,
+            'rows_scored': scored / min(20, len(rows)),
+        })
+    return report
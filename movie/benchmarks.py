@@ -0,0 +1,296 @@
+import os
+import platform
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+from django.conf import settings
+
+from .ann import recall_report
+from .models import GENRE_CHOICES, LANGUAGE_CHOICES
+from .recommendations import BUILD_FIELDS, MovieRecommender
+from . import recommender_store
+
+# Synthetic ids start far above any real catalog, so they never collide with real movies
+ID_OFFSET = 10 ** 12
+
+SyntheticMovie = namedtuple('SyntheticMovie', BUILD_FIELDS)
+
+_ENGLISH_WORDS = (
+    'love war city night dark man woman family secret life death world story journey home king queen '
+    'dream shadow fire blood heart house road last first lost time girl boy son daughter father mother '
+    'friend enemy detective police killer ghost island ocean space star planet future past revenge truth '
+    'lie game hunt escape prison school summer winter spring autumn river mountain desert forest storm '
+    'light silence memory promise betrayal hope fear power money crime justice soldier doctor teacher '
+    'artist singer thief spy agent hero legend empire kingdom village street train ship storm battle '
+    'mission machine robot alien monster vampire witch magic curse wedding divorce brother sister '
+    'stranger neighbor orphan widow captain pilot nurse lawyer judge hunter farmer sailor writer'
+).split()
+_PERSIAN_WORDS = (
+    'عشق جنگ شهر شب تاریک مرد زن خانواده راز زندگی مرگ دنیا داستان سفر خانه پادشاه ملکه رویا سایه آتش '
+    'خون قلب جاده آخرین اولین گمشده زمان دختر پسر پدر مادر دوست دشمن کارآگاه پلیس قاتل روح جزیره '
+    'دریا فضا ستاره آینده گذشته انتقام حقیقت دروغ بازی فرار زندان مدرسه تابستان زمستان بهار پاییز رود '
+    'کوه بیابان جنگل طوفان نور سکوت خاطره قول خیانت امید ترس قدرت پول جنایت عدالت سرباز پزشک معلم '
+    'هنرمند خواننده دزد جاسوس قهرمان افسانه امپراتوری روستا خیابان قطار کشتی نبرد ماموریت ماشین'
+).split()
+_ENGLISH_SYLLABLES = 'ka ri mo len tar vis dor el an sha ben qua zel ro mi tu per gal hen os'.split()
+_PERSIAN_SYLLABLES = 'با ری مو لن تار وی در ال ان شا بن زل رو می تو پر گل هن اس نو'.split()
+_FIRST_NAMES = 'John Maria Ali Sara Reza Emma David Leila Omid Anna Hassan Laura Amir Nina Peter Mina'.split()
+_LAST_NAMES = 'Smith Karimi Jones Ahmadi Brown Rezaei Miller Hosseini Davis Moradi Wilson Jafari'.split()
+
+
+def _vocabulary(base_words, syllables, size, rng):
+    # Real words first, then generated ones for the long tail of rare terms
+    words = list(base_words)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(syllables, rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return np.array(words, dtype=object)
+
+
+class SyntheticCatalog:
+    """
+    Deterministic synthetic movies with English and Persian titles and overviews.
+    Word frequencies follow a Zipf distribution over a long-tailed vocabulary, so the
+    TF-IDF matrix has a realistic mix of common and rare terms.
+    """
+
+    def __init__(self, size, seed=0, vocabulary_size=50000):
+        self.size = size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.english = _vocabulary(_ENGLISH_WORDS, _ENGLISH_SYLLABLES, vocabulary_size, rng)
+        self.persian = _vocabulary(_PERSIAN_WORDS, _PERSIAN_SYLLABLES, vocabulary_size, rng)
+        self.genres = [value for value, _ in GENRE_CHOICES]
+        self.languages = [value for value, _ in LANGUAGE_CHOICES]
+
+    def _words(self, rng, vocabulary, counts):
+        ranks = np.minimum(rng.zipf(1.3, int(counts.sum())), len(vocabulary)) - 1
+        words = vocabulary[ranks]
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        return [' '.join(words[bounds[i]:bounds[i + 1]]) for i in range(len(counts))]
+
+    def chunks(self, chunk_size=2000):
+        """Yield lists of SyntheticMovie in id order; each chunk is generated on demand."""
+        for start in range(0, self.size, chunk_size):
+            rng = np.random.default_rng((self.seed, start))
+            n = min(chunk_size, self.size - start)
+            titles = self._words(rng, self.english, rng.integers(1, 5, n))
+            titles_fa = self._words(rng, self.persian, rng.integers(1, 5, n))
+            overviews = self._words(rng, self.english, rng.integers(20, 80, n))
+            overviews_fa = self._words(rng, self.persian, rng.integers(20, 80, n))
+            keywords = self._words(rng, self.english, rng.integers(0, 6, n))
+            years = rng.integers(1950, 2026, n)
+            ratings = np.round(rng.normal(6.5, 1.2, n).clip(1, 10), 1)
+            genres = rng.integers(0, len(self.genres), n)
+            languages = np.minimum(rng.zipf(1.8, n), len(self.languages)) - 1
+            series = rng.random(n) < 0.2
+            names = rng.integers(0, len(_FIRST_NAMES) * len(_LAST_NAMES), (n, 4))
+
+            def person(code):
+                return f"{_FIRST_NAMES[code % len(_FIRST_NAMES)]} {_LAST_NAMES[code // len(_FIRST_NAMES)]}"
+
+            yield [
+                SyntheticMovie(
+                    id=ID_OFFSET + start + i,
+                    updated_at=None,
+                    release_year=int(years[i]),
+                    imdb_rating=float(ratings[i]),
+                    tmdb_rating=None,
+                    original_language=self.languages[languages[i]],
+                    is_tv_series=bool(series[i]),
+                    title=titles[i].title(),
+                    title_fa=titles_fa[i],
+                    overview=overviews[i],
+                    overview_fa=overviews_fa[i],
+                    genre=self.genres[genres[i]],
+                    director=person(names[i, 0]),
+                    cast=[person(code) for code in names[i, 1:]],
+                    keywords=keywords[i].split(),
+                )
+                for i in range(n)
+            ]
+
+    def sample_titles(self, count, seed=1):
+        """Titles of `count` random movies, English and Persian alternating."""
+        rng = np.random.default_rng(seed)
+        wanted = set(rng.choice(self.size, min(count, self.size), replace=False).tolist())
+        titles = []
+        for chunk in self.chunks():
+            for movie in chunk:
+                if movie.id - ID_OFFSET in wanted:
+                    titles.append(movie.title if len(titles) % 2 == 0 else movie.title_fa)
+        return titles
+
+
+def synthetic_answers(count, seed=2):
+    """Random questionnaire answer sets in the shape answer_rows reads."""
+    rng = np.random.default_rng(seed)
+    genres = [value for value, _ in GENRE_CHOICES]
+    languages = [value for value, _ in LANGUAGE_CHOICES]
+
+    def answer(text, question_type, value):
+        return SimpleNamespace(question=SimpleNamespace(question_text=text, question_type=question_type),
+                               answer_value=value)
+
+    answer_sets = []
+    for _ in range(count):
+        start = int(rng.integers(1950, 2020))
+        answer_sets.append([
+            answer('Which genres do you like?', 'multiple', list(rng.choice(genres, rng.integers(1, 4), False))),
+            answer('Release year range', 'range', [start, start + int(rng.integers(5, 30))]),
+            answer('Minimum rating', 'range', [float(rng.integers(5, 9))]),
+            answer('Which languages?', 'multiple', list(rng.choice(languages, rng.integers(1, 3), False))),
+            answer('Movie or series type?', 'single', str(rng.choice(['movie', 'series']))),
+        ])
+    return answer_sets
+
+
+def _peak_rss():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def _latency(call, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        call(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {'queries': len(timings), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'mean_ms': float(np.mean(timings))}
+
+
+def benchmark_ann(recommender, rows, limit=10):
+    """
+    Latency of ANN similarity queries for `rows` at the configured probes and their
+    recall@`limit` against the exact scan, plus the recall and latency of every probe
+    setting from `recall_report`.
+    """
+    exact = {row: set(recommender.similar_rows(row, limit, exact=True).tolist()) for row in rows}
+    found = {}
+
+    def query(row):
+        found[row] = recommender.similar_rows(row, limit)
+
+    latency = _latency(query, rows)
+    hits = sum(len(exact[row] & set(found[row].tolist())) for row in rows)
+    total = sum(len(exact[row]) for row in rows)
+    return {
+        'probes': recommender.ann_index.probes or settings.RECOMMENDER_ANN['PROBES'],
+        'recall': hits / total if total else 1.0,
+        'limit': limit,
+        'similar_rows': latency,
+        'probe_sweep': recall_report(recommender, queries=len(rows), limit=limit)['probes'],
+    }
+
+
+def benchmark_size(size, queries=200, chunk_size=2000, workers=1, seed=0, ann='ivf', n_lists=None):
+    """
+    Build, save and query a recommender on a synthetic catalog of `size` movies. Only
+    the in-memory paths are timed (title resolution, exact and ANN similarity and
+    questionnaire scoring), never the neighbor table or the hydration query, so no
+    database is used. The `ann` index is built for every size, whatever MIN_ROWS says.
+    """
+    catalog = SyntheticCatalog(size, seed)
+    memory_before = recommender_store.process_memory()
+
+    started = time.perf_counter()
+    recommender = MovieRecommender(prepare=False)
+    recommender.fit_chunks(catalog.chunks(chunk_size), workers)
+    build_seconds = time.perf_counter() - started
+
+    params = {} if ann == 'exact' else {
+        'n_lists': n_lists or settings.RECOMMENDER_ANN['LISTS'], 'probes': settings.RECOMMENDER_ANN['PROBES'],
+    }
+    started = time.perf_counter()
+    index = recommender.build_ann(ann, **params)
+    ann_build_seconds = time.perf_counter() - started
+    memory_after = recommender_store.process_memory()
+
+    path = tempfile.mkdtemp(prefix='recommender-benchmark-')
+    try:
+        recommender.save(path)
+        artifact_bytes = recommender_store.directory_size(path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    titles = catalog.sample_titles(queries)
+    rows = np.random.default_rng(seed).choice(size, min(queries, size), replace=False)
+    answer_sets = synthetic_answers(queries)
+    return {
+        'movies': size,
+        'features': recommender.feature_matrix.shape[1],
+        'nnz': int(recommender.feature_matrix.nnz),
+        'build_seconds': build_seconds,
+        'peak_rss_bytes': _peak_rss(),
+        'build_rss_delta_bytes': memory_after['rss'] - memory_before['rss'],
+        'artifact_bytes': artifact_bytes,
+        'title_lookup': _latency(recommender.title_index.lookup, titles),
+        'similar_rows': _latency(lambda row: recommender.similar_rows(row, exact=True), rows),
+        'answer_rows': _latency(recommender.answer_rows, answer_sets),
+        'ann': {
+            'backend': ann,
+            'lists': index.centroids.shape[0] if getattr(index, 'centroids', None) is not None else None,
+            'build_seconds': ann_build_seconds,
+            **benchmark_ann(recommender, rows),
+        },
+    }
+
+
+def run_benchmarks(sizes, **options):
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'options': options,
+        'results': [benchmark_size(size, **options) for size in sizes],
+    }
+
+
+# Lower is better for every compared metric
+COMPARED_METRICS = (
+    ('build_seconds',),
+    ('artifact_bytes',),
+    ('title_lookup', 'p95_ms'),
+    ('similar_rows', 'p95_ms'),
+    ('answer_rows', 'p95_ms'),
+    ('ann', 'build_seconds'),
+    ('ann', 'similar_rows', 'p95_ms'),
+)
+# Higher is better
+COMPARED_SCORES = (
+    ('ann', 'recall'),
+)
+
+
+def compare_runs(baseline, current, tolerance=0.2):
+    """
+    List (movies, metric, baseline, current) for every metric more than `tolerance` worse
+    than baseline. Metrics the baseline did not record are skipped.
+    """
+    baseline_by_size = {result['movies']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_by_size.get(result['movies'])
+        if previous is None:
+            continue
+        for paths, worse in ((COMPARED_METRICS, lambda old, new: new > old * (1 + tolerance)),
+                             (COMPARED_SCORES, lambda old, new: new < old * (1 - tolerance))):
+            for path in paths:
+                old, new = previous, result
+                for key in path:
+                    old, new = old.get(key) if old else None, new[key]
+                if old and worse(old, new):
+                    regressions.append((result['movies'], '.'.join(path), old, new))
+    return regressions
@@ -0,0 +1,193 @@
+import numpy as np
+
+from . import recommender_store
+
+MISSING = -1
+
+
+class CatalogFilter:
+    """Constraints a result must meet; constraints left unset do not filter."""
+
+    def __init__(self, is_tv_series=None, genres=(), languages=(), min_year=None, max_year=None, min_rating=None):
+        self.is_tv_series = is_tv_series
+        self.genres = list(genres or ())
+        self.languages = list(languages or ())
+        self.min_year = min_year
+        self.max_year = max_year
+        self.min_rating = min_rating
+
+    def __bool__(self):
+        return (self.is_tv_series is not None or bool(self.genres) or bool(self.languages)
+                or self.min_year is not None or self.max_year is not None or self.min_rating is not None)
+
+
+class CatalogColumns:
+    """
+    Columnar snapshot of the movie attributes the recommenders filter and score on,
+    one entry per recommender row. Genres and languages are stored as small integer
+    codes into the `genres` / `languages` vocabularies; a missing value is -1, a
+    missing release year is 0 and a missing rating is NaN.
+    """
+
+    def __init__(self, genre, release_year, rating, language, is_tv_series, genres, languages):
+        self.genre = genre
+        self.release_year = release_year
+        self.rating = rating
+        self.language = language
+        self.is_tv_series = is_tv_series
+        self.genres = list(genres)
+        self.languages = list(languages)
+        # Sorted rows per (column, value), built on first use
+        self._partitions = {}
+
+    @classmethod
+    def from_movies(cls, movies, genres=(), languages=()):
+        genres, languages = list(genres), list(languages)
+        genre_codes = {value: code for code, value in enumerate(genres)}
+        language_codes = {value: code for code, value in enumerate(languages)}
+
+        def encode(value, codes, vocabulary):
+            if not value:
+                return MISSING
+            if value not in codes:
+                codes[value] = len(vocabulary)
+                vocabulary.append(value)
+            return codes[value]
+
+        movies = list(movies)
+        return cls(
+            genre=np.array([encode(m.genre, genre_codes, genres) for m in movies], dtype=np.int16),
+            release_year=np.array([m.release_year or 0 for m in movies], dtype=np.int16),
+            # IMDb first, TMDB when IMDb is missing, as questionnaire scoring always did
+            rating=np.array([(m.imdb_rating or m.tmdb_rating) or np.nan for m in movies], dtype=np.float32),
+            language=np.array([encode(m.original_language, language_codes, languages) for m in movies],
+                              dtype=np.int16),
+            is_tv_series=np.array([bool(m.is_tv_series) for m in movies], dtype=bool),
+            genres=genres,
+            languages=languages,
+        )
+
+    def __len__(self):
+        return len(self.genre)
+
+    def genre_mask(self, values):
+        return self._code_mask(self.genre, self.genres, values)
+
+    def language_mask(self, values):
+        return self._code_mask(self.language, self.languages, values)
+
+    @staticmethod
+    def _code_mask(codes, vocabulary, values):
+        selected = [vocabulary.index(v) for v in values if v in vocabulary]
+        if len(selected) <= 8:
+            # A handful of equality checks beats a gather for typical answers
+            mask = np.zeros(len(codes), dtype=bool)
+            for code in selected:
+                mask |= codes == code
+            return mask
+        # One lookup per row; the extra trailing slot is what MISSING (-1) indexes
+        table = np.zeros(len(vocabulary) + 1, dtype=bool)
+        table[selected] = True
+        return np.take(table, codes)
+
+    def partition(self, column, value):
+        """Sorted rows whose `column` equals `value`; cached, since columns never change in place."""
+        key = (column, value)
+        rows = self._partitions.get(key)
+        if rows is None:
+            rows = np.flatnonzero(getattr(self, column) == value)
+            self._partitions[key] = rows
+        return rows
+
+    def _code_partitions(self, column, vocabulary, values):
+        parts = [self.partition(column, vocabulary.index(v)) for v in values if v in vocabulary]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def filter_rows(self, catalog_filter):
+        """
+        Sorted rows matching `catalog_filter`. Series, genre and language constraints
+        intersect cached partitions, so the year and rating checks only run on the
+        rows those partitions leave.
+        """
+        rows = None
+        partitions = []
+        if catalog_filter.is_tv_series is not None:
+            partitions.append(self.partition('is_tv_series', bool(catalog_filter.is_tv_series)))
+        if catalog_filter.genres:
+            partitions.append(self._code_partitions('genre', self.genres, catalog_filter.genres))
+        if catalog_filter.languages:
+            partitions.append(self._code_partitions('language', self.languages, catalog_filter.languages))
+        for part in sorted(partitions, key=len):
+            rows = part if rows is None else np.intersect1d(rows, part, assume_unique=True)
+        if rows is None:
+            rows = np.arange(len(self))
+
+        keep = np.ones(len(rows), dtype=bool)
+        if catalog_filter.min_year is not None or catalog_filter.max_year is not None:
+            years = self.release_year[rows]
+            keep &= years != 0
+            if catalog_filter.min_year is not None:
+                keep &= years >= catalog_filter.min_year
+            if catalog_filter.max_year is not None:
+                keep &= years <= catalog_filter.max_year
+        if catalog_filter.min_rating is not None:
+            keep &= self.rating[rows] >= catalog_filter.min_rating
+        return rows[keep]
+
+    def take(self, rows):
+        return CatalogColumns(
+            self.genre[rows], self.release_year[rows], self.rating[rows], self.language[rows],
+            self.is_tv_series[rows], self.genres, self.languages,
+        )
+
+    def concatenate(self, movies):
+        """Return columns for the current rows followed by `movies`, sharing the vocabularies."""
+        added = CatalogColumns.from_movies(movies, self.genres, self.languages)
+        return CatalogColumns(
+            np.concatenate([self.genre, added.genre]),
+            np.concatenate([self.release_year, added.release_year]),
+            np.concatenate([self.rating, added.rating]),
+            np.concatenate([self.language, added.language]),
+            np.concatenate([self.is_tv_series, added.is_tv_series]),
+            added.genres,
+            added.languages,
+        )
+
+    @classmethod
+    def stack(cls, parts):
+        """Concatenate parts built in sequence, each sharing (a prefix of) the last part's vocabularies."""
+        if not parts:
+            return cls.from_movies([])
+        return cls(
+            np.concatenate([part.genre for part in parts]),
+            np.concatenate([part.release_year for part in parts]),
+            np.concatenate([part.rating for part in parts]),
+            np.concatenate([part.language for part in parts]),
+            np.concatenate([part.is_tv_series for part in parts]),
+            parts[-1].genres,
+            parts[-1].languages,
+        )
+
+    def save(self, path):
+        recommender_store.save_arrays(
+            path,
+            genre=self.genre,
+            release_year=self.release_year,
+            rating=self.rating,
+            language=self.language,
+            is_tv_series=self.is_tv_series,
+        )
+        recommender_store.write_json(path, 'catalog.json', {'genres': self.genres, 'languages': self.languages})
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        vocabularies = recommender_store.read_json(path, 'catalog.json')
+        return cls(
+            genre=recommender_store.load_array(path, 'genre', mmap),
+            release_year=recommender_store.load_array(path, 'release_year', mmap),
+            rating=recommender_store.load_array(path, 'rating', mmap),
+            language=recommender_store.load_array(path, 'language', mmap),
+            is_tv_series=recommender_store.load_array(path, 'is_tv_series', mmap),
+            genres=vocabularies['genres'],
+            languages=vocabularies['languages'],
+        )
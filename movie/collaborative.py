@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from scipy import sparse
+
+from .models import UserPreference, MovieAlsoLiked
+from . import recommender_store
+
+# Ratings are on a 0-10 scale; at or above this a rating counts like a like
+HIGH_RATING = 7.0
+
+
+def positive_preferences():
+    return UserPreference.objects.filter(Q(liked=True) | Q(rating__gte=HIGH_RATING))
+
+
+def stream_interactions(queryset, chunk_size=10000):
+    """Yield (user_ids, movie_ids) array pairs of at most `chunk_size` preferences each."""
+    rows = queryset.values_list('user_id', 'movie_id').order_by('user_id', 'movie_id')
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _to_arrays(chunk)
+            chunk = []
+    if chunk:
+        yield _to_arrays(chunk)
+
+
+def _to_arrays(chunk):
+    pairs = np.array(chunk, dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+class InteractionMatrix:
+    """Sparse users x movies matrix with the id of every row and column."""
+
+    def __init__(self, matrix, user_ids, movie_ids):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Build from (user_ids, movie_ids[, values]) chunks; missing values count as 1."""
+        user_parts, movie_parts, value_parts = [], [], []
+        for chunk in chunks:
+            user_parts.append(chunk[0])
+            movie_parts.append(chunk[1])
+            if len(chunk) > 2:
+                value_parts.append(chunk[2])
+        if not user_parts:
+            return cls(sparse.csr_matrix((0, 0), dtype=np.float32), np.empty(0, np.int64), np.empty(0, np.int64))
+
+        user_ids, user_rows = np.unique(np.concatenate(user_parts), return_inverse=True)
+        movie_ids, movie_columns = np.unique(np.concatenate(movie_parts), return_inverse=True)
+        data = np.concatenate(value_parts).astype(np.float32) if value_parts else \
+            np.ones(len(user_rows), dtype=np.float32)
+        matrix = sparse.csr_matrix((data, (user_rows, movie_columns)), shape=(len(user_ids), len(movie_ids)))
+        matrix.sum_duplicates()
+        return cls(matrix, user_ids, movie_ids)
+
+
+def iter_also_liked(interactions, k=20, min_support=2, block_size=1024):
+    """
+    Yield (movie_id, neighbor_ids, scores) from item-item co-occurrence: the number of
+    users who liked both movies, normalized by the geometric mean of their popularity
+    (cosine). Pairs seen fewer than `min_support` times are ignored. The co-occurrence
+    matrix is built one block of movies at a time.
+    """
+    binary = interactions.matrix.copy()
+    binary.data[:] = 1
+    by_movie = binary.T.tocsr()
+    popularity = np.asarray(binary.sum(axis=0), dtype=np.float64).ravel()
+    norms = np.sqrt(np.maximum(popularity, 1))
+
+    for start in range(0, by_movie.shape[0], block_size):
+        block = (by_movie[start:start + block_size] @ binary).tocsr()
+        for offset in range(block.shape[0]):
+            column = start + offset
+            lo, hi = block.indptr[offset], block.indptr[offset + 1]
+            neighbors, counts = block.indices[lo:hi], block.data[lo:hi]
+            keep = (neighbors != column) & (counts >= min_support)
+            neighbors, counts = neighbors[keep], counts[keep]
+            if not len(neighbors):
+                continue
+            scores = counts / (norms[column] * norms[neighbors])
+            if len(neighbors) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                neighbors, scores = neighbors[top], scores[top]
+            order = np.lexsort((neighbors, -scores))
+            yield interactions.movie_ids[column], interactions.movie_ids[neighbors[order]], scores[order]
+
+
+def also_liked_movies(movie_id, limit=10):
+    """Top precomputed "users who liked this also liked" movies, one indexed query."""
+    rows = MovieAlsoLiked.objects.filter(movie_id=movie_id).select_related('neighbor').order_by('rank')[:limit]
+    return [row.neighbor for row in rows]
+
+
+def implicit_preferences():
+    return UserPreference.objects.filter(Q(liked=True) | Q(watchlist=True) | Q(rating__gte=HIGH_RATING))
+
+
+def stream_preference_strengths(queryset, chunk_size=10000):
+    """
+    Yield (user_ids, movie_ids, strengths) chunks for implicit-feedback training. A like
+    counts 1, a watchlist add 0.5 and a high rating rating/10; low ratings add nothing.
+    """
+    rows = queryset.values_list('user_id', 'movie_id', 'liked', 'watchlist', 'rating').order_by('user_id', 'movie_id')
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _to_strengths(chunk)
+            chunk = []
+    if chunk:
+        yield _to_strengths(chunk)
+
+
+def _to_strengths(chunk):
+    user_ids, movie_ids, liked, watchlist, rating = zip(*chunk)
+    rating = np.array([r if r is not None else 0.0 for r in rating], dtype=np.float32)
+    strengths = (np.array(liked, dtype=np.float32)
+                 + 0.5 * np.array(watchlist, dtype=np.float32)
+                 + np.where(rating >= HIGH_RATING, rating / 10, 0))
+    keep = strengths > 0
+    return (np.array(user_ids, dtype=np.int64)[keep], np.array(movie_ids, dtype=np.int64)[keep],
+            strengths[keep])
+
+
+class ImplicitALS:
+    """
+    Implicit-feedback matrix factorization (Hu, Koren & Volinsky) trained with
+    alternating least squares. Each half-epoch solves every user (or item) at once
+    with a few batched conjugate-gradient steps warm-started from the previous
+    factors; blocks of rows are solved in parallel threads, which NumPy's BLAS
+    kernels run without holding the GIL.
+    """
+
+    def __init__(self, factors=64, regularization=0.05, alpha=20.0, epochs=15, cg_steps=3, workers=None,
+                 seed=0):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.epochs = epochs
+        self.cg_steps = cg_steps
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.user_factors = None
+        self.item_factors = None
+        self.user_ids = None
+        self.movie_ids = None
+        self.version = None
+
+    def fit(self, interactions, callback=None):
+        """Train on an InteractionMatrix of strengths; `callback(epoch, seconds)` runs after each epoch."""
+        rng = np.random.default_rng(self.seed)
+        by_user = interactions.matrix.tocsr().astype(np.float32)
+        by_item = by_user.T.tocsr()
+        n_users, n_items = by_user.shape
+
+        self.user_ids, self.movie_ids = interactions.user_ids, interactions.movie_ids
+        self.user_factors = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        self.item_factors = (rng.standard_normal((n_items, self.factors)) * 0.01).astype(np.float32)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for epoch in range(self.epochs):
+                started = time.perf_counter()
+                self._solve(pool, by_user, self.user_factors, self.item_factors)
+                self._solve(pool, by_item, self.item_factors, self.user_factors)
+                if callback:
+                    callback(epoch + 1, time.perf_counter() - started)
+        return self
+
+    def _solve(self, pool, confidence, factors, fixed):
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors, dtype=np.float32)
+        block_size = max(1, -(-confidence.shape[0] // self.workers))
+        blocks = [(start, min(start + block_size, confidence.shape[0]))
+                  for start in range(0, confidence.shape[0], block_size)]
+        list(pool.map(lambda block: self._solve_block(confidence, factors, fixed, gram, *block), blocks))
+
+    def _solve_block(self, confidence, factors, fixed, gram, start, stop):
+        # For every row u: (F^T C_u F + reg I) x_u = F^T C_u p_u with C_u = 1 + alpha * strength
+        block = confidence[start:stop]
+        if not block.nnz:
+            return
+        weights = block.copy()
+        nnz_rows = np.repeat(np.arange(block.shape[0]), np.diff(block.indptr))
+        fixed_rows = fixed[block.indices]
+
+        def apply(vectors):
+            weights.data = self.alpha * block.data * np.einsum('ij,ij->i', vectors[nnz_rows], fixed_rows)
+            return vectors @ gram + weights @ fixed
+
+        targets = block.copy()
+        targets.data = 1 + self.alpha * block.data
+        targets = targets @ fixed
+
+        x = factors[start:stop].copy()
+        residual = targets - apply(x)
+        direction = residual.copy()
+        residual_norm = np.einsum('ij,ij->i', residual, residual)
+        for _ in range(self.cg_steps):
+            applied = apply(direction)
+            step = residual_norm / np.maximum(np.einsum('ij,ij->i', direction, applied), 1e-10)
+            x += step[:, None] * direction
+            residual -= step[:, None] * applied
+            new_norm = np.einsum('ij,ij->i', residual, residual)
+            direction = residual + (new_norm / np.maximum(residual_norm, 1e-10))[:, None] * direction
+            residual_norm = new_norm
+        factors[start:stop] = x
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.user_factors, self.item_factors, self.user_ids, self.movie_ids))
+
+    def user_row(self, user_id):
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return row
+        return None
+
+    def recommend(self, user_id, limit=10, exclude_movie_ids=()):
+        """Top (movie_ids, scores) for a user, or empty arrays for users the model has not seen."""
+        row = self.user_row(user_id)
+        if row is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self.item_factors @ self.user_factors[row]
+        excluded = np.isin(self.movie_ids, np.asarray(list(exclude_movie_ids), dtype=np.int64))
+        scores[excluded] = -np.inf
+        limit = min(limit, len(scores) - int(excluded.sum()))
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return self.movie_ids[top], scores[top]
+
+    def score_movies(self, user_id, movie_ids):
+        """Predicted preference of a user for each of `movie_ids`; 0 for unseen users or movies."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        scores = np.zeros(len(movie_ids), dtype=np.float32)
+        row = self.user_row(user_id)
+        if row is None or not len(self.movie_ids) or not len(movie_ids):
+            return scores
+        columns = np.minimum(np.searchsorted(self.movie_ids, movie_ids), len(self.movie_ids) - 1)
+        known = self.movie_ids[columns] == movie_ids
+        scores[known] = self.item_factors[columns[known]] @ self.user_factors[row]
+        return scores
+
+    def save(self, path):
+        recommender_store.save_arrays(
+            path,
+            user_factors=self.user_factors,
+            item_factors=self.item_factors,
+            user_ids=self.user_ids,
+            movie_ids=self.movie_ids,
+        )
+        return recommender_store.write_manifest(
+            path,
+            factors=self.factors,
+            regularization=self.regularization,
+            alpha=self.alpha,
+            epochs=self.epochs,
+            users=len(self.user_ids),
+            movies=len(self.movie_ids),
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        manifest = recommender_store.read_manifest(path)
+        model = cls(factors=manifest['factors'], regularization=manifest['regularization'],
+                    alpha=manifest['alpha'], epochs=manifest['epochs'])
+        model.user_factors = recommender_store.load_array(path, 'user_factors', mmap)
+        model.item_factors = recommender_store.load_array(path, 'item_factors', mmap)
+        model.user_ids = recommender_store.load_array(path, 'user_ids', mmap)
+        model.movie_ids = recommender_store.load_array(path, 'movie_ids', mmap)
+        model.version = manifest['version']
+        return model
+
+
+_als_model = None
+_als_lock = threading.Lock()
+_als_checked = 0.0
+
+
+def get_als_model():
+    """The newest trained ALS model, loaded once per process; None until one is trained."""
+    global _als_model, _als_checked
+    with _als_lock:
+        if _als_model is None or time.monotonic() - _als_checked >= settings.RECOMMENDER_SYNC_INTERVAL:
+            _als_checked = time.monotonic()
+            latest = recommender_store.current_version_dir('als')
+            if latest is not None and (_als_model is None or
+                                       recommender_store.version_name(latest) != _als_model.version):
+                _als_model = ImplicitALS.load(latest)
+        return _als_model
+
+
+def reset_als_model():
+    """Forget the loaded model; the next `get_als_model()` reloads from disk."""
+    global _als_model, _als_checked
+    with _als_lock:
+        _als_model = None
+        _als_checked = 0.0
@@ -0,0 +1,34 @@
+import numpy as np
+from django.conf import settings
+
+
+def pool_size(limit):
+    """Candidates fetched to re-rank `limit` results; capped so re-ranking stays sub-millisecond."""
+    return max(limit, min(3 * limit, settings.RECOMMENDER_DIVERSITY_POOL))
+
+
+def mmr_order(relevance, similarity, limit, diversity):
+    """
+    Maximal marginal relevance: positions into the candidate pool, picked one at a time
+    by (1 - diversity) * relevance - diversity * (highest similarity to anything already
+    picked). `similarity` is the pool's pairwise similarity matrix; relevance is scaled
+    to the best candidate so both terms share one scale.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    count = len(relevance)
+    limit = min(limit, count)
+    top = relevance.max() if count else 0
+    if top > 0:
+        relevance = relevance / top
+
+    redundancy = np.zeros(count, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    order = np.empty(limit, dtype=np.int64)
+    for position in range(limit):
+        gain = (1 - diversity) * relevance - diversity * redundancy
+        gain[~available] = -np.inf
+        pick = int(np.argmax(gain))
+        order[position] = pick
+        available[pick] = False
+        np.maximum(redundancy, similarity[pick], out=redundancy)
+    return order
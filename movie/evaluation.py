@@ -0,0 +1,238 @@
+import time
+
+import numpy as np
+
+from .collaborative import (
+    ImplicitALS, InteractionMatrix, implicit_preferences, positive_preferences, stream_interactions,
+    stream_preference_strengths,
+)
+from .models import UserAnswer
+from .recommendations import get_recommender
+
+
+def _top_k(scores, k, exclude=None):
+    scores = np.asarray(scores, dtype=np.float64).copy()
+    if exclude is not None and len(exclude):
+        scores[exclude] = -np.inf
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.lexsort((top, -scores[top]))]
+    return top[np.isfinite(scores[top]) & (scores[top] > 0)]
+
+
+class PopularityStrategy:
+    """Most liked movies in the training period; the baseline every engine should beat."""
+
+    name = 'popularity'
+
+    def fit(self, train, cutoff):
+        self.train = train
+        self.popularity = np.asarray(train.matrix.sum(axis=0)).ravel()
+        return self
+
+    def recommend(self, user_id, history_columns, k):
+        return self.train.movie_ids[_top_k(self.popularity, k, history_columns)]
+
+
+class ItemItemStrategy(PopularityStrategy):
+    """
+    Co-occurrence cosine like `iter_also_liked`, scored per user as two sparse products
+    (history -> co-likers -> their movies) so the item x item matrix is never built.
+    """
+
+    name = 'item_item'
+
+    def fit(self, train, cutoff):
+        super().fit(train, cutoff)
+        self.binary = train.matrix.copy().tocsr()
+        self.binary.data[:] = 1
+        self.by_movie = self.binary.T.tocsr()
+        self.norms = np.sqrt(np.maximum(self.popularity, 1))
+        return self
+
+    def recommend(self, user_id, history_columns, k):
+        if not len(history_columns):
+            return np.empty(0, dtype=np.int64)
+        weights = 1 / self.norms[history_columns]
+        co_likers = weights @ self.by_movie[history_columns]
+        scores = (self.binary.T @ co_likers) / self.norms
+        return self.train.movie_ids[_top_k(scores, k, history_columns)]
+
+
+class ContentStrategy(PopularityStrategy):
+    """TF-IDF profile of the user's training likes scored against every movie."""
+
+    name = 'content'
+
+    def fit(self, train, cutoff):
+        super().fit(train, cutoff)
+        self.recommender = get_recommender(background=False)
+        return self
+
+    def recommend(self, user_id, history_columns, k):
+        recommender = self.recommender
+        if recommender.feature_matrix is None or not len(history_columns):
+            return np.empty(0, dtype=np.int64)
+        rows = recommender.rows_for_ids(self.train.movie_ids[history_columns])
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        profile = np.asarray(recommender.row_vectors(rows).sum(axis=0)).ravel()
+        scores = recommender.vector_scores(profile[np.newaxis, :])
+        return recommender.movie_ids[_top_k(scores, k, rows)]
+
+
+class ALSStrategy(PopularityStrategy):
+    """Implicit ALS trained on the training period only."""
+
+    name = 'als'
+
+    def __init__(self, **params):
+        self.params = params
+
+    def fit(self, train, cutoff):
+        super().fit(train, cutoff)
+        strengths = InteractionMatrix.from_chunks(
+            stream_preference_strengths(implicit_preferences().filter(created_at__lt=cutoff))
+        )
+        self.model = ImplicitALS(**self.params).fit(strengths) if strengths.matrix.nnz else None
+        return self
+
+    def recommend(self, user_id, history_columns, k):
+        if self.model is None:
+            return np.empty(0, dtype=np.int64)
+        movie_ids, _ = self.model.recommend(user_id, k, self.train.movie_ids[history_columns])
+        return movie_ids
+
+
+class QuestionnaireStrategy(PopularityStrategy):
+    """Questionnaire scoring for users who answered it; `weights` overrides some or all of ANSWER_WEIGHTS."""
+
+    name = 'questionnaire'
+
+    def __init__(self, weights=None):
+        self.weights = weights
+        self.answers = {}
+
+    def fit(self, train, cutoff):
+        super().fit(train, cutoff)
+        self.recommender = get_recommender(background=False)
+        return self
+
+    def prefetch(self, user_ids):
+        self.answers = {}
+        for answer in UserAnswer.objects.filter(user_id__in=list(user_ids)).select_related('question'):
+            self.answers.setdefault(answer.user_id, []).append(answer)
+
+    def recommend(self, user_id, history_columns, k):
+        answers = self.answers.get(user_id)
+        if not answers:
+            return None
+        seen_rows = self.recommender.rows_for_ids(self.train.movie_ids[history_columns])
+        rows = self.recommender.answer_rows(answers, k, self.weights, seen_rows)
+        return self.recommender.movie_ids[rows]
+
+
+EVALUATION_STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (PopularityStrategy, ItemItemStrategy, ContentStrategy, ALSStrategy, QuestionnaireStrategy)
+}
+
+
+def time_split_cutoff(test_fraction=0.2):
+    """created_at of the first preference in the newest `test_fraction` of positive preferences."""
+    queryset = positive_preferences()
+    total = queryset.count()
+    if not total:
+        return None
+    index = min(total - 1, int(total * (1 - test_fraction)))
+    return queryset.order_by('created_at').values_list('created_at', flat=True)[index]
+
+
+def load_split(cutoff, chunk_size=10000):
+    """Streamed (train, test) interaction matrices of positive preferences before/after `cutoff`."""
+    train = InteractionMatrix.from_chunks(
+        stream_interactions(positive_preferences().filter(created_at__lt=cutoff), chunk_size)
+    )
+    test = InteractionMatrix.from_chunks(
+        stream_interactions(positive_preferences().filter(created_at__gte=cutoff), chunk_size)
+    )
+    return train, test
+
+
+def ranking_metrics(recommended, relevant, k):
+    """precision@k, recall@k and binary NDCG@k of one ranked list."""
+    hits = np.isin(np.asarray(recommended[:k], dtype=np.int64), relevant)
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(len(relevant), k)].sum()
+    return {
+        'precision': hits.sum() / k,
+        'recall': hits.sum() / len(relevant),
+        'ndcg': float((hits * discounts[:len(hits)]).sum() / ideal) if ideal else 0.0,
+    }
+
+
+def evaluate(strategies, train, test, k=10, batch_size=500, per_query=None):
+    """
+    Replay every test user that also has training history and return per-strategy mean
+    precision/recall/NDCG@k, catalog coverage and latency percentiles. When `per_query`
+    is a list, one record per (strategy, user) with its metrics and latency is appended.
+    """
+    train_by_user = train.matrix.tocsr()
+    test_by_user = test.matrix.tocsr()
+    rows = np.searchsorted(train.user_ids, test.user_ids)
+    rows = np.minimum(rows, max(len(train.user_ids) - 1, 0))
+    has_history = len(train.user_ids) > 0
+    users = [
+        (int(user_id), int(row), test_row)
+        for test_row, (user_id, row) in enumerate(zip(test.user_ids, rows))
+        if has_history and train.user_ids[row] == user_id
+    ]
+
+    totals = {strategy.name: {'users': 0, 'precision': 0.0, 'recall': 0.0, 'ndcg': 0.0,
+                              'latencies': [], 'recommended': set()} for strategy in strategies}
+    for start in range(0, len(users), batch_size):
+        batch = users[start:start + batch_size]
+        for strategy in strategies:
+            if hasattr(strategy, 'prefetch'):
+                strategy.prefetch(user_id for user_id, _, _ in batch)
+
+        for user_id, row, test_row in batch:
+            history = train_by_user.indices[train_by_user.indptr[row]:train_by_user.indptr[row + 1]]
+            relevant = test.movie_ids[test_by_user.indices[test_by_user.indptr[test_row]:
+                                                           test_by_user.indptr[test_row + 1]]]
+            for strategy in strategies:
+                started = time.perf_counter()
+                recommended = strategy.recommend(user_id, history, k)
+                latency_ms = (time.perf_counter() - started) * 1000
+                if recommended is None:
+                    continue
+                metrics = ranking_metrics(recommended, relevant, k)
+                total = totals[strategy.name]
+                total['users'] += 1
+                total['latencies'].append(latency_ms)
+                total['recommended'].update(int(movie_id) for movie_id in recommended)
+                for name, value in metrics.items():
+                    total[name] += value
+                if per_query is not None:
+                    per_query.append({'strategy': strategy.name, 'user_id': user_id,
+                                      'latency_ms': latency_ms, **metrics})
+
+    catalog_size = len(np.union1d(train.movie_ids, test.movie_ids))
+    summary = {}
+    for name, total in totals.items():
+        evaluated = total['users']
+        latencies = total['latencies'] or [0.0]
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary[name] = {
+            'users': evaluated,
+            f'precision@{k}': total['precision'] / evaluated if evaluated else 0.0,
+            f'recall@{k}': total['recall'] / evaluated if evaluated else 0.0,
+            f'ndcg@{k}': total['ndcg'] / evaluated if evaluated else 0.0,
+            'coverage': len(total['recommended']) / catalog_size if catalog_size else 0.0,
+            'latency_p50_ms': p50,
+            'latency_p95_ms': p95,
+            'latency_p99_ms': p99,
+        }
+    return summary
@@ -0,0 +1,50 @@
+import re
+
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# Kept free of Django imports so process-pool workers can unpickle these functions
+# without setting up the project.
+
+# Movie fields that make up a movie's feature text, in order
+FEATURE_FIELDS = ('title', 'title_fa', 'overview', 'overview_fa', 'genre', 'director', 'cast', 'keywords')
+
+# Term hashing replaces a fitted vocabulary, so chunks can be vectorized independently
+HASHING_PARAMS = {
+    'n_features': 2 ** 18,
+    'stop_words': 'english',
+}
+
+
+def feature_text(values):
+    """Feature text for one movie given the FEATURE_FIELDS values in order."""
+    title, title_fa, overview, overview_fa, genre, director, cast, keywords = values
+    features = [
+        title or '',
+        title_fa or '',
+        overview or '',
+        overview_fa or '',
+        genre or '',
+        director or '',
+        ' '.join(cast or []),
+        ' '.join(keywords or [])
+    ]
+    return ' '.join(clean_text(f) for f in features)
+
+
+def clean_text(text):
+    """Lowercase and strip punctuation, as every feature and query text is."""
+    return re.sub(r'[^\w\s]', '', text.lower())
+
+
+def movie_feature_text(movie):
+    return feature_text([getattr(movie, field) for field in FEATURE_FIELDS])
+
+
+def make_hasher(n_features=HASHING_PARAMS['n_features'], stop_words=HASHING_PARAMS['stop_words']):
+    # Raw term counts; IDF weighting and L2 normalization are applied after all chunks are stacked
+    return HashingVectorizer(n_features=n_features, stop_words=stop_words, alternate_sign=False, norm=None)
+
+
+def hash_chunk(values, params):
+    """Term-count CSR rows for a chunk of FEATURE_FIELDS tuples."""
+    return make_hasher(**params).transform([feature_text(v) for v in values])
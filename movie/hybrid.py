@@ -0,0 +1,155 @@
+import time
+from contextlib import contextmanager
+from functools import cached_property
+
+import numpy as np
+from django.conf import settings
+
+from .collaborative import get_als_model
+from .diversity import pool_size
+from .models import UserAnswer
+from .recommendation_cache import cache, cached_answers_fingerprint, catalog_generation
+from .recommendations import get_recommender
+from .seen import get_seen_set
+from .taste import get_taste_vector
+
+HYBRID_SIGNALS = ('questionnaire', 'content', 'collaborative')
+
+
+def _candidates_key(user_id):
+    return f'hybrid:candidates:{user_id}'
+
+
+def _ranking_key(user_id):
+    return f'hybrid:ranking:{user_id}'
+
+
+def forget_hybrid_results(user_id):
+    """Drop the user's cached candidates and ranking after their preferences change."""
+    cache.delete_many([_candidates_key(user_id), _ranking_key(user_id)])
+
+
+def _normalized(scores):
+    # Scale a signal by its best candidate so signals on different scales blend evenly
+    top = scores.max() if len(scores) else 0
+    return scores / top if top > 0 else np.zeros_like(scores)
+
+
+class HybridRecommender:
+    """
+    Blends questionnaire, content (taste vector) and collaborative (ALS) scores for one
+    user in two stages. The candidate stage takes the best `candidate_budget` movies of
+    each signal and the scoring stage blends all signals over those candidates only.
+    Both stages are cached per user until the answers, preferences, weights or any of
+    the models change. `timings` holds the duration of each stage that ran.
+    """
+
+    def __init__(self, user_id, weights=None, candidate_budget=None, recommender=None, als_model=None):
+        self.user_id = user_id
+        self.weights = {**settings.HYBRID_WEIGHTS, **(weights or {})}
+        self.candidate_budget = candidate_budget or settings.HYBRID_CANDIDATE_BUDGET
+        self.recommender = recommender or get_recommender()
+        self.als_model = als_model if als_model is not None else get_als_model()
+        self.timings = {}
+
+    def _load_answers(self):
+        return UserAnswer.objects.filter(user_id=self.user_id).select_related('question')
+
+    @cached_property
+    def _answers_state(self):
+        return cached_answers_fingerprint(self.user_id, self._load_answers)
+
+    @cached_property
+    def answers(self):
+        fingerprint, answers = self._answers_state
+        if fingerprint is None:
+            return []
+        return answers if answers is not None else list(self._load_answers())
+
+    @cached_property
+    def seen(self):
+        return get_seen_set(self.user_id)
+
+    @cached_property
+    def taste(self):
+        return get_taste_vector(self.user_id, self.recommender)
+
+    def _signature(self):
+        return (
+            self._answers_state[0],
+            self.seen.stamp,
+            # Candidates are cached as rows, which are only valid for the same applied edits
+            self.recommender.revision,
+            self.als_model.version if self.als_model is not None else None,
+            catalog_generation(),
+            tuple(self.weights[signal] for signal in HYBRID_SIGNALS),
+            self.candidate_budget,
+        )
+
+    @contextmanager
+    def _stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[f'{name}_ms'] = (time.perf_counter() - started) * 1000
+
+    def candidate_rows(self):
+        """Unseen recommender rows that are among the best `candidate_budget` of any signal."""
+        recommender, budget = self.recommender, self.candidate_budget
+        seen_rows = self.seen.rows(recommender)
+        parts = []
+        if self.weights['questionnaire'] and self.answers:
+            parts.append(recommender.answer_rows(self.answers, budget, exclude_rows=seen_rows))
+        if self.weights['content'] and self.taste.vector is not None:
+            parts.append(recommender.nearest_rows(self.taste.vector, budget, seen_rows))
+        if self.weights['collaborative'] and self.als_model is not None:
+            movie_ids, _ = self.als_model.recommend(self.user_id, budget, self.seen.movie_ids)
+            parts.append(recommender.rows_for_ids(movie_ids))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts).astype(np.int64))
+
+    def blended_scores(self, rows):
+        """Weighted sum of every signal over `rows`, each scaled to its best candidate."""
+        recommender = self.recommender
+        blended = np.zeros(len(rows), dtype=np.float32)
+        if self.weights['questionnaire'] and self.answers:
+            blended += self.weights['questionnaire'] * _normalized(recommender.answer_scores(self.answers, rows))
+        if self.weights['content'] and self.taste.vector is not None:
+            blended += self.weights['content'] * _normalized(recommender.vector_scores(self.taste.vector, rows))
+        if self.weights['collaborative'] and self.als_model is not None:
+            scores = self.als_model.score_movies(self.user_id, recommender.movie_ids[rows])
+            blended += self.weights['collaborative'] * _normalized(scores)
+        return blended
+
+    def recommend(self, limit=10, diversity=0):
+        """Best `limit` movie ids for the user, best first; `diversity` re-ranks them with MMR."""
+        signature = self._signature()
+        ranking = cache.get(_ranking_key(self.user_id))
+        if ranking is not None and ranking[0] == (signature, limit, diversity):
+            return ranking[1]
+
+        with self._stage('candidates'):
+            candidates = cache.get(_candidates_key(self.user_id))
+            if candidates is not None and candidates[0] == signature:
+                rows = candidates[1]
+            else:
+                rows = self.candidate_rows()
+                cache.set(_candidates_key(self.user_id), (signature, rows), settings.RECOMMENDATION_CACHE_TIMEOUT)
+
+        with self._stage('scoring'):
+            scores = self.blended_scores(rows)
+            keep = scores > 0
+            rows, scores = rows[keep], scores[keep]
+            # Highest score first, ties in row (movie id) order
+            order = np.lexsort((rows, -scores))[:pool_size(limit) if diversity else limit]
+            rows, scores = rows[order], scores[order]
+
+        if diversity:
+            with self._stage('diversity'):
+                rows = self.recommender.diversify(rows, scores, limit, diversity)
+        movie_ids = [int(movie_id) for movie_id in self.recommender.movie_ids[rows]]
+        cache.set(_ranking_key(self.user_id), ((signature, limit, diversity), movie_ids),
+                  settings.RECOMMENDATION_CACHE_TIMEOUT)
+        return movie_ids
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from movie.ann import ANN_BACKENDS
+from movie.benchmarks import compare_runs, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark MovieRecommender on synthetic catalogs and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Catalog sizes to benchmark')
+        parser.add_argument('--queries', type=int, default=200, help='Latency samples per method and size')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=1, help='Processes hashing chunks during the build')
+        parser.add_argument('--ann', choices=sorted(ANN_BACKENDS), default='ivf',
+                            help='ANN backend built for every size (probes: RECOMMENDER_ANN["PROBES"])')
+        parser.add_argument('--lists', type=int, help='Number of IVF clusters (default: sqrt(rows))')
+        parser.add_argument('--output', default='recommender_benchmark.json')
+        parser.add_argument('--baseline', help='Earlier results to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed slowdown or growth against the baseline before failing')
+
+    def handle(self, *args, **options):
+        run = run_benchmarks(
+            sorted(options['sizes']),
+            queries=options['queries'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            ann=options['ann'],
+            n_lists=options['lists'],
+        )
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+
+        for result in run['results']:
+            titles, similar, answers = result['title_lookup'], result['similar_rows'], result['answer_rows']
+            ann, ann_similar = result['ann'], result['ann']['similar_rows']
+            self.stdout.write(
+                f"{result['movies']:>9} movies: build {result['build_seconds']:.1f}s, "
+                f"peak RSS {result['peak_rss_bytes'] / 1024 / 1024:.0f} MB, "
+                f"artifact {result['artifact_bytes'] / 1024 / 1024:.1f} MB | "
+                f"titles p50/p95/p99 {titles['p50_ms']:.2f}/{titles['p95_ms']:.2f}/{titles['p99_ms']:.2f} ms | "
+                f"similar p50/p95/p99 {similar['p50_ms']:.2f}/{similar['p95_ms']:.2f}/{similar['p99_ms']:.2f} ms | "
+                f"answers p50/p95/p99 {answers['p50_ms']:.2f}/{answers['p95_ms']:.2f}/{answers['p99_ms']:.2f} ms | "
+                f"{ann['backend']} build {ann['build_seconds']:.1f}s, probes={ann['probes']} "
+                f"recall@{ann['limit']} {ann['recall']:.3f}, "
+                f"p50/p95/p99 {ann_similar['p50_ms']:.2f}/{ann_similar['p95_ms']:.2f}/{ann_similar['p99_ms']:.2f} ms"
+            )
+        self.stdout.write(f"Wrote {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                regressions = compare_runs(json.load(f), run, options['tolerance'])
+            for movies, metric, old, new in regressions:
+                self.stderr.write(f"Regression at {movies} movies: {metric} {old:.3f} -> {new:.3f}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} metrics regressed by more than {options['tolerance']:.0%}")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from movie.models import MovieAlsoLiked
+from movie.collaborative import InteractionMatrix, iter_also_liked, positive_preferences, stream_interactions
+
+
+class Command(BaseCommand):
+    help = 'Precompute "users who liked this also liked" movies from UserPreference co-occurrence'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help='Movies stored per movie')
+        parser.add_argument('--min-support', type=int, default=2,
+                            help='Minimum number of users who liked both movies')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Preferences read per chunk')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per bulk_create')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        interactions = InteractionMatrix.from_chunks(
+            stream_interactions(positive_preferences(), options['chunk_size'])
+        )
+        users, movies = interactions.matrix.shape
+        self.stdout.write(f"Loaded {interactions.matrix.nnz} positive preferences from {users} users on {movies} movies")
+
+        created = 0
+        with transaction.atomic():
+            MovieAlsoLiked.objects.all().delete()
+            batch = []
+            for movie_id, neighbor_ids, scores in iter_also_liked(interactions, options['top_k'],
+                                                                  options['min_support']):
+                batch.extend(
+                    MovieAlsoLiked(movie_id=int(movie_id), neighbor_id=int(neighbor_id), score=float(score), rank=rank)
+                    for rank, (neighbor_id, score) in enumerate(zip(neighbor_ids, scores))
+                )
+                if len(batch) >= options['batch_size']:
+                    MovieAlsoLiked.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            MovieAlsoLiked.objects.bulk_create(batch)
+            created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {created} also-liked rows in {time.perf_counter() - started:.1f}s"
+        ))
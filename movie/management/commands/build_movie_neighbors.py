@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from movie.models import Movie, MovieNeighbor
+from movie.recommendations import load_recommender
+
+
+class Command(BaseCommand):
+    help = 'Precompute the top-K content-similar movies for every movie into the MovieNeighbor table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help='Neighbors stored per movie')
+        parser.add_argument('--block-size', type=int, default=512, help='Rows multiplied per sparse block')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per bulk_create')
+
+    def handle(self, *args, **options):
+        top_k = options['top_k']
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        recommender = load_recommender()
+        if recommender.feature_matrix is None:
+            raise CommandError('No movies in the catalog, nothing to compute')
+
+        # Artifact rows may outlive deleted movies; never write rows that would break the FKs
+        movie_ids = np.asarray(recommender.movie_ids)
+        existing = np.isin(movie_ids, np.fromiter(Movie.objects.values_list('id', flat=True), dtype=np.int64))
+
+        created = 0
+        with transaction.atomic():
+            MovieNeighbor.objects.all().delete()
+            batch = []
+            for row, neighbor_rows, scores in recommender.iter_top_neighbors(top_k, options['block_size']):
+                if not existing[row]:
+                    continue
+                neighbor_rows, scores = neighbor_rows[existing[neighbor_rows]], scores[existing[neighbor_rows]]
+                batch.extend(
+                    MovieNeighbor(movie_id=int(movie_ids[row]), neighbor_id=int(movie_ids[neighbor]),
+                                  score=float(score), rank=rank)
+                    for rank, (neighbor, score) in enumerate(zip(neighbor_rows, scores))
+                )
+                if len(batch) >= batch_size:
+                    MovieNeighbor.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            MovieNeighbor.objects.bulk_create(batch)
+            created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {created} neighbors for {int(existing.sum())} movies "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from movie.recommendations import build_recommender_artifact
+from movie.ann import ANN_BACKENDS
+from movie import recommender_store
+from movie.recommendation_cache import bump_catalog_generation
+
+
+class Command(BaseCommand):
+    help = 'Fit the movie recommender once and publish it as a versioned on-disk artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ann', choices=sorted(ANN_BACKENDS),
+                            help='ANN backend (default: RECOMMENDER_ANN, exact below MIN_ROWS)')
+        parser.add_argument('--lists', type=int, help='Number of IVF clusters (default: sqrt(rows))')
+        parser.add_argument('--probes', type=int,
+                            help='Probes recorded in the manifest (queries read RECOMMENDER_ANN["PROBES"])')
+        parser.add_argument('--recall-queries', type=int, default=200,
+                            help='Sample queries for the recall-vs-exact report (0 to skip)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Movies read and hashed per chunk')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing chunks in parallel (default: CPU count)')
+        parser.add_argument('--lsa-dim', type=int,
+                            help='Project to dense LSA embeddings of this size, e.g. 128-256 '
+                                 '(default: RECOMMENDER_EMBEDDING_DIM, 0 keeps sparse TF-IDF)')
+        parser.add_argument('--keep', type=int, default=3, help='Versions kept on disk after publishing')
+        parser.add_argument('--every', type=int, metavar='SECONDS',
+                            help='Keep running and rebuild on this schedule instead of once')
+
+    def handle(self, *args, **options):
+        while True:
+            # A scheduler runs for days; never reuse a connection the database has dropped
+            close_old_connections()
+            try:
+                # Several workers or schedulers may start a rebuild at once; only one publishes
+                with recommender_store.rebuild_lock() as acquired:
+                    if acquired:
+                        self.build(options)
+                    elif not options['every']:
+                        raise CommandError('Another rebuild is already running')
+                    else:
+                        self.stderr.write('Another rebuild is already running, skipping this round')
+            except Exception as e:
+                if not options['every']:
+                    if isinstance(e, ValueError):
+                        raise CommandError(str(e))
+                    raise
+                # Database outages and the like only cost this round, the schedule keeps going
+                self.stderr.write(f"Rebuild failed, still serving the previous version: {e!r}")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def build(self, options):
+        started = time.perf_counter()
+        path, manifest, report = build_recommender_artifact(
+            backend=options['ann'],
+            n_lists=options['lists'],
+            probes=options['probes'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            recall_queries=options['recall_queries'],
+            embedding_dim=options['lsa_dim'],
+        )
+
+        if report is not None:
+            self.stdout.write(f"ANN recall@{report['limit']} vs exact "
+                              f"({report['exact_latency_ms']:.2f} ms/query exact):")
+            for entry in report['probes']:
+                self.stdout.write(
+                    f"  probes={entry['probes']:<3} recall={entry['recall']:.3f} "
+                    f"latency={entry['latency_ms']:.2f} ms rows_scored={entry['rows_scored']:.0f}"
+                )
+
+        # Workers switch to the new version on their next sync; the old one stays on disk
+        # for requests still holding it
+        recommender_store.publish_version(path)
+        recommender_store.prune_versions(keep=options['keep'])
+        bump_catalog_generation()
+
+        rows, features = manifest['shape']
+        space = f"{features} LSA dimensions" if manifest['embedding_dim'] else f"{features} features"
+        size_mb = recommender_store.directory_size(path) / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(
+            f"Published recommender index {manifest['version']} ({manifest['ann']['backend']}): "
+            f"{rows} movies x {space}, {manifest['nnz']} non-zeros, {size_mb:.2f} MB at {path} "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,83 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from movie.evaluation import EVALUATION_STRATEGIES, evaluate, load_split, time_split_cutoff
+from movie.recommendations import ANSWER_WEIGHTS
+
+
+class Command(BaseCommand):
+    help = 'Replay UserPreference with a time-based split and report quality and latency per recommender'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategies', nargs='+', choices=sorted(EVALUATION_STRATEGIES),
+                            default=sorted(EVALUATION_STRATEGIES))
+        parser.add_argument('--k', type=int, default=10, help='Cut-off for precision, recall and NDCG')
+        parser.add_argument('--cutoff', help='ISO datetime splitting train from test (default: --test-fraction)')
+        parser.add_argument('--test-fraction', type=float, default=0.2,
+                            help='Share of the newest positive preferences held out for testing')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Preferences read per chunk')
+        parser.add_argument('--weights', type=json.loads,
+                            help='Questionnaire weights to try, e.g. \'{"genre": 0.5, "year": 0.1}\'; '
+                                 'criteria left out keep their default weight')
+        parser.add_argument('--als-factors', type=int, default=32)
+        parser.add_argument('--als-epochs', type=int, default=10)
+        parser.add_argument('--output', help='Write the summary (and per-query records) as JSON')
+        parser.add_argument('--per-query', action='store_true', help='Include one record per strategy and user')
+
+    def handle(self, *args, **options):
+        if options['weights'] is not None:
+            if not isinstance(options['weights'], dict):
+                raise CommandError('--weights must be a JSON object')
+            unknown = sorted(set(options['weights']) - set(ANSWER_WEIGHTS))
+            if unknown:
+                raise CommandError(f"Unknown --weights {', '.join(unknown)}; expected some of "
+                                   f"{', '.join(ANSWER_WEIGHTS)}")
+
+        if options['cutoff']:
+            cutoff = parse_datetime(options['cutoff'])
+            if cutoff is None:
+                raise CommandError(f"Invalid --cutoff '{options['cutoff']}'")
+        else:
+            cutoff = time_split_cutoff(options['test_fraction'])
+            if cutoff is None:
+                raise CommandError('No positive preferences to evaluate on')
+
+        started = time.perf_counter()
+        train, test = load_split(cutoff, options['chunk_size'])
+        self.stdout.write(f"Split at {cutoff.isoformat()}: {train.matrix.nnz} train / {test.matrix.nnz} test "
+                          f"preferences, loaded in {time.perf_counter() - started:.1f}s")
+
+        strategies = []
+        for name in options['strategies']:
+            if name == 'als':
+                strategy = EVALUATION_STRATEGIES[name](factors=options['als_factors'], epochs=options['als_epochs'])
+            elif name == 'questionnaire':
+                strategy = EVALUATION_STRATEGIES[name](weights=options['weights'])
+            else:
+                strategy = EVALUATION_STRATEGIES[name]()
+            fit_started = time.perf_counter()
+            strategies.append(strategy.fit(train, cutoff))
+            self.stdout.write(f"  fitted {name} in {time.perf_counter() - fit_started:.1f}s")
+
+        per_query = [] if options['per_query'] else None
+        summary = evaluate(strategies, train, test, k=options['k'], per_query=per_query)
+
+        k = options['k']
+        self.stdout.write(f"{'strategy':<14} {'users':>6} {'P@' + str(k):>7} {'R@' + str(k):>7} "
+                          f"{'NDCG@' + str(k):>8} {'cover':>6} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, result in summary.items():
+            self.stdout.write(
+                f"{name:<14} {result['users']:>6} {result[f'precision@{k}']:>7.4f} {result[f'recall@{k}']:>7.4f} "
+                f"{result[f'ndcg@{k}']:>8.4f} {result['coverage']:>6.3f} "
+                f"{result['latency_p50_ms']:>8.2f} {result['latency_p95_ms']:>8.2f}"
+            )
+
+        if options['output']:
+            report = {'cutoff': cutoff.isoformat(), 'k': k, 'summary': summary}
+            if per_query is not None:
+                report['per_query'] = per_query
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from movie.trending import flush_trending, rebuild_trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed trending counters of every movie from UserPreference history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Preferences read per chunk')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per bulk_create')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        # Events this process buffered are already part of the history being replayed
+        flush_trending()
+        movies = rebuild_trending(chunk_size=options['chunk_size'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored trending scores of {movies} movies in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,35 @@
+from scipy import sparse
+from django.core.management.base import BaseCommand
+from movie.recommendations import load_recommender
+from movie import recommender_store
+
+
+def _mb(value):
+    return 'n/a' if value is None else f"{value / 1024 / 1024:.1f} MB"
+
+
+class Command(BaseCommand):
+    help = 'Report resident memory of this process before and after loading the recommender'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copy', action='store_true',
+                            help='Read the artifact into private memory instead of memory-mapping it')
+
+    def handle(self, *args, **options):
+        before = recommender_store.process_memory()
+        recommender = load_recommender(mmap=not options['copy'])
+        # Touch every page of the matrix so the mapping is actually resident
+        matrix = recommender.feature_matrix
+        if sparse.issparse(matrix):
+            matrix.data.sum()
+            matrix.indices.sum()
+        elif matrix is not None:
+            # Dense LSA embeddings
+            matrix.sum()
+        after = recommender_store.process_memory()
+
+        self.stdout.write(f"Recommender {recommender.version or '(fitted live)'} in process {after['pid']}:")
+        for field in ('rss', 'pss', 'shared', 'private'):
+            delta = None if after[field] is None or before[field] is None else after[field] - before[field]
+            self.stdout.write(f"  {field:<8} before={_mb(before[field]):>10} after={_mb(after[field]):>10} "
+                              f"delta={_mb(delta):>10}")
@@ -0,0 +1,53 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from movie import recommender_store
+from movie.collaborative import ImplicitALS, InteractionMatrix, implicit_preferences, stream_preference_strengths
+
+
+class Command(BaseCommand):
+    help = 'Train the implicit-feedback ALS model on UserPreference and publish its factors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=64, help='Latent factors per user and movie')
+        parser.add_argument('--epochs', type=int, default=15)
+        parser.add_argument('--regularization', type=float, default=0.05)
+        parser.add_argument('--alpha', type=float, default=20.0, help='Confidence scale of a preference')
+        parser.add_argument('--cg-steps', type=int, default=3, help='Conjugate-gradient steps per half-epoch')
+        parser.add_argument('--workers', type=int, default=None, help='Solver threads (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Preferences read per chunk')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        interactions = InteractionMatrix.from_chunks(
+            stream_preference_strengths(implicit_preferences(), options['chunk_size'])
+        )
+        users, movies = interactions.matrix.shape
+        self.stdout.write(f"Loaded {interactions.matrix.nnz} preferences from {users} users on {movies} movies "
+                          f"in {time.perf_counter() - started:.1f}s")
+        if not interactions.matrix.nnz:
+            self.stdout.write(self.style.WARNING("No preferences to train on"))
+            return
+
+        model = ImplicitALS(
+            factors=options['factors'],
+            regularization=options['regularization'],
+            alpha=options['alpha'],
+            epochs=options['epochs'],
+            cg_steps=options['cg_steps'],
+            workers=options['workers'],
+        )
+        self.stdout.write(f"Training {options['factors']} factors with {model.workers} workers")
+        model.fit(interactions, callback=lambda epoch, seconds: self.stdout.write(
+            f"  epoch {epoch}/{model.epochs}: {seconds * 1000:.0f} ms"
+        ))
+
+        path = recommender_store.create_version_dir('als')
+        model.save(path)
+        recommender_store.publish_version(path, 'als')
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved ALS model {os.path.basename(path)}: {model.nbytes / 1024 / 1024:.2f} MB of factors, "
+            f"{recommender_store.directory_size(path) / 1024 / 1024:.2f} MB on disk, "
+            f"{time.perf_counter() - started:.1f}s total"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0003_question_questionnaire_choice_question_questionnaire'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-17 16:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0004_movie_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='movie.movie')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movie.movie')),
+            ],
+            options={
+                'ordering': ['movie', 'rank'],
+                'unique_together': {('movie', 'rank')},
+            },
+        ),
+    ]
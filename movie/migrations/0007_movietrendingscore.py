@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-17 18:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0006_moviealsoliked'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieTrendingScore',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='movie.movie')),
+                ('likes', models.FloatField(default=0)),
+                ('watchlist_adds', models.FloatField(default=0)),
+                ('ratings', models.FloatField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('rank_key', models.FloatField(db_index=True, default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
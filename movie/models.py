@@ -55,12 +55,51 @@ class Movie(models.Model):
     keywords = models.JSONField(null=True, blank=True)
     is_tv_series = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
 
 
+class MovieNeighbor(models.Model):
+    """Precomputed top-K content-similar movies, rebuilt by `manage.py build_movie_neighbors`."""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('movie', 'rank')
+        ordering = ['movie', 'rank']
+
+
+class MovieAlsoLiked(models.Model):
+    """Precomputed "users who liked this also liked" movies, rebuilt by `manage.py build_also_liked`."""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='also_liked')
+    neighbor = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('movie', 'rank')
+        ordering = ['movie', 'rank']
+
+
+class MovieTrendingScore(models.Model):
+    """
+    Time-decayed engagement counters of one movie, decayed to `updated_at` and written
+    in batches by `movie.trending`. `rank_key` orders movies by their current score
+    without re-decaying every row, since all scores decay at the same rate.
+    """
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    likes = models.FloatField(default=0)
+    watchlist_adds = models.FloatField(default=0)
+    ratings = models.FloatField(default=0)
+    score = models.FloatField(default=0)
+    rank_key = models.FloatField(default=0, db_index=True)
+    updated_at = models.DateTimeField()
+
+
 class UserPreference(models.Model):
     user = models.ForeignKey('user.User', on_delete=models.CASCADE)
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+# Every recommender module caches here rather than in the project's default cache
+cache = ConnectionProxy(caches, 'recommendations')
+
+CATALOG_GENERATION_KEY = 'recommendations:catalog_generation'
+
+
+def answers_fingerprint(answers):
+    """Stable hash of a user's questionnaire answers, independent of their order."""
+    payload = sorted(
+        (answer.question_id, json.dumps(answer.answer_value, sort_keys=True, ensure_ascii=False))
+        for answer in answers
+    )
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _fingerprint_key(user_id):
+    return f'recommendations:answers:{user_id}'
+
+
+def _results_key(user_id, fingerprint, recommender, seen):
+    seen_stamp = seen.stamp if seen is not None else ''
+    return f'recommendations:results:{user_id}:{fingerprint}:{recommender.revision}:{catalog_generation()}:{seen_stamp}'
+
+
+def remember_answers(user_id, answers):
+    """Record the fingerprint of freshly saved answers so reads can skip the answer query."""
+    cache.set(_fingerprint_key(user_id), answers_fingerprint(answers), settings.RECOMMENDATION_CACHE_TIMEOUT)
+
+
+def forget_answers(user_id):
+    cache.delete(_fingerprint_key(user_id))
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def catalog_generation():
+    return cache.get_or_set(CATALOG_GENERATION_KEY, _new_generation, None)
+
+
+def bump_catalog_generation():
+    """
+    Invalidate every cached result list after a catalog edit or rebuild. The generation
+    is a fresh random value rather than a counter, so an evicted generation can never
+    come back as a value that old result keys still use.
+    """
+    cache.set(CATALOG_GENERATION_KEY, _new_generation(), None)
+
+
+def cached_answers_fingerprint(user_id, load_answers):
+    """
+    (fingerprint, answers) of the user's answers. `answers` is None when the fingerprint
+    came from the cache; both are None when the user has no answers.
+    """
+    fingerprint = cache.get(_fingerprint_key(user_id))
+    if fingerprint is not None:
+        return fingerprint, None
+    answers = list(load_answers())
+    if not answers:
+        return None, None
+    fingerprint = answers_fingerprint(answers)
+    cache.set(_fingerprint_key(user_id), fingerprint, settings.RECOMMENDATION_CACHE_TIMEOUT)
+    return fingerprint, answers
+
+
+def cached_recommendation_ids(user_id, recommender, load_answers, limit=10, seen=None):
+    """
+    Ranked movie ids for the user's answers, or None when the user has no answers.
+    `load_answers` is only called when the answer fingerprint is not cached, and the
+    scoring pass only runs when no result list is cached for that fingerprint, the
+    current catalog and the `seen` set, whose movies are left out.
+    """
+    fingerprint, answers = cached_answers_fingerprint(user_id, load_answers)
+    if fingerprint is None:
+        return None
+
+    key = _results_key(user_id, fingerprint, recommender, seen)
+    movie_ids = cache.get(key)
+    if movie_ids is None:
+        if answers is None:
+            answers = list(load_answers())
+        exclude_rows = seen.rows(recommender) if seen is not None else None
+        movies = recommender.get_recommendations_from_answers(answers, limit, exclude_rows=exclude_rows)
+        movie_ids = [movie.id for movie in movies]
+        cache.set(key, movie_ids, settings.RECOMMENDATION_CACHE_TIMEOUT)
+    return movie_ids
+
+
+def normalize_description(description):
+    return ' '.join(description.lower().split())
+
+
+def cached_description_ids(description, recommender, limit=10):
+    """
+    Ranked movie ids for a free-text description. Results are shared by every user and
+    cached per normalized description, so popular descriptions skip vectorizing and scoring.
+    """
+    digest = hashlib.sha1(normalize_description(description).encode('utf-8')).hexdigest()
+    key = f'recommendations:describe:{digest}:{limit}:{recommender.revision}:{catalog_generation()}'
+    movie_ids = cache.get(key)
+    if movie_ids is None:
+        movie_ids = [int(movie_id) for movie_id in recommender.movie_ids[recommender.describe_rows(description, limit)]]
+        cache.set(key, movie_ids, settings.RECOMMENDATION_CACHE_TIMEOUT)
+    return movie_ids
@@ -1,115 +1,812 @@
+import copy
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-from .models import Movie
-import re
-from django.db.models import Q
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfTransformer
+from sklearn.preprocessing import normalize
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from .models import Movie, MovieNeighbor
+from . import recommender_store
+from .title_index import TitleIndex
+from .catalog import CatalogColumns, CatalogFilter
+from .diversity import mmr_order, pool_size
+from .ann import ExactIndex, build_ann_index, load_ann_index, recall_report
+from .recommendation_cache import bump_catalog_generation
+from .features import FEATURE_FIELDS, HASHING_PARAMS, clean_text, hash_chunk, make_hasher, movie_feature_text
+
+
+# Questionnaire criteria weights; a movie's score is the sum of the criteria it meets
+# Largest dense similarity block iter_top_neighbors computes at once
+DENSE_BLOCK_BYTES = 64 * 1024 * 1024
+
+ANSWER_WEIGHTS = {
+    'genre': 0.4,
+    'year': 0.2,
+    'rating': 0.2,
+    'language': 0.1,
+    'type': 0.1
+}
+
+
+# Fields read when streaming the catalog; enough for the feature text, the catalog
+# columns and the title index, so full Movie instances are never built
+BUILD_FIELDS = ('id', 'updated_at', 'release_year', 'imdb_rating', 'tmdb_rating', 'original_language',
+                'is_tv_series') + FEATURE_FIELDS
+
+
+def iter_catalog_chunks(queryset, chunk_size=2000):
+    """Yield lists of at most `chunk_size` catalog rows in id order, streamed from the database."""
+    rows = queryset.order_by('id').values_list(*BUILD_FIELDS, named=True)
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 class MovieRecommender:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
+    def __init__(self, prepare=True):
+        self.hashing_params = dict(HASHING_PARAMS)
+        self.tfidf = TfidfTransformer()
+        # Sparse TF-IDF rows, or dense float32 LSA embeddings when `projection` is set.
+        # These are the stored (artifact) rows; read rows through `row_vectors`, which
+        # also sees the edit overlay
         self.feature_matrix = None
-        self.movies = None
-        self._prepare_feature_matrix()
+        # Edit overlay: vectors of movies saved since the load and, for every row, its
+        # stored row (edited rows are numbered after the matrix), or None before any edit
+        self._edits = None
+        self._sources = None
+        # Row of every stored row, -1 for tombstones (replaced or deleted stored rows)
+        self._targets = None
+        # (used TF-IDF columns, float32 SVD components) mapping TF-IDF rows to embeddings
+        self.projection = None
+        # Only compact per-row arrays are kept; result movies are hydrated on demand
+        self.movie_ids = np.empty(0, dtype=np.int64)
+        self.title_index = TitleIndex([], [])
+        self.catalog = CatalogColumns.from_movies([])
+        self.ann_index = ExactIndex()
+        self.version = None
+        # Newest Movie.updated_at read by the build or by the last sync from the database
+        self.synced_at = None
+        # Movie id -> updated_at of edits applied since RECOMMENDER_SYNC_OVERLAP before
+        # synced_at, so rereading that margin does not apply them twice
+        self._applied_edits = {}
+        # Digest of the edits applied on top of the artifact, see `revision`
+        self._changes = ''
+        if prepare:
+            self._prepare_feature_matrix()
 
     def _prepare_feature_matrix(self):
         try:
-            self.movies = list(Movie.objects.all())
-            
-            if not self.movies:
-                self.feature_matrix = None
-                return
-            
-            # Create text representation for each movie
-            movie_features = []
-            for movie in self.movies:
-                features = [
-                    movie.title or '',
-                    movie.title_fa or '',
-                    movie.overview or '',
-                    movie.overview_fa or '',
-                    movie.genre or '',
-                    movie.director or '',
-                    ' '.join(movie.cast or []),
-                    ' '.join(movie.keywords or [])
-                ]
-                # Clean and normalize text
-                features = [re.sub(r'[^\w\s]', '', f.lower()) for f in features]
-                movie_features.append(' '.join(features))
-            
-            # Create feature matrix
-            if movie_features:
-                self.feature_matrix = self.vectorizer.fit_transform(movie_features)
-            else:
-                self.feature_matrix = None
-                
+            self.fit(Movie.objects.all())
         except Exception as e:
             print(f"Error preparing feature matrix: {e}")
             self.feature_matrix = None
-            self.movies = []
+            self.movie_ids = np.empty(0, dtype=np.int64)
+
+    def fit(self, movies, chunk_size=2000, workers=1, embedding_dim=None):
+        """
+        Fit on a Movie queryset, streamed in chunks of `chunk_size` rows, or on any
+        iterable of movies. Terms are hashed, so each chunk is vectorized on its own;
+        with `workers` > 1 chunks are hashed in a process pool while the next ones are
+        read, and at most two chunks per worker are in flight, which keeps peak memory
+        flat apart from the sparse matrix itself. IDF weights are fitted once all
+        chunks are stacked. With `embedding_dim` the TF-IDF rows are then projected to
+        dense LSA embeddings (see fit_embeddings).
+        """
+        if isinstance(movies, QuerySet):
+            chunks = iter_catalog_chunks(movies, chunk_size)
+        else:
+            # Rows are kept in id order so a movie's row can be found with a binary search
+            movies = sorted(movies, key=lambda movie: movie.id)
+            chunks = (movies[start:start + chunk_size] for start in range(0, len(movies), chunk_size))
+        self.fit_chunks(chunks, workers)
+        if embedding_dim and self.feature_matrix is not None:
+            self.fit_embeddings(embedding_dim)
+
+    def fit_chunks(self, chunks, workers=1):
+        """Fit on lists of movies (or rows with the BUILD_FIELDS attributes) already in id order."""
+        id_parts, catalog_parts, counts, titles, pending = [], [], [], [], deque()
+        genres, languages = (), ()
+        self.synced_at = None
+        self._applied_edits = {}
+        self._changes = ''
+
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for chunk in chunks:
+                values = [tuple(getattr(movie, field) for field in FEATURE_FIELDS) for movie in chunk]
+                if pool is None:
+                    counts.append(hash_chunk(values, self.hashing_params))
+                else:
+                    pending.append(pool.submit(hash_chunk, values, self.hashing_params))
+                    while len(pending) > 2 * workers:
+                        counts.append(pending.popleft().result())
+
+                id_parts.append(np.array([movie.id for movie in chunk], dtype=np.int64))
+                titles.extend((movie.id, (movie.title, movie.title_fa)) for movie in chunk)
+                catalog_parts.append(CatalogColumns.from_movies(chunk, genres, languages))
+                genres, languages = catalog_parts[-1].genres, catalog_parts[-1].languages
+                latest = max((movie.updated_at for movie in chunk if movie.updated_at), default=None)
+                if latest and (self.synced_at is None or latest > self.synced_at):
+                    self.synced_at = latest
+            counts.extend(future.result() for future in pending)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        self.movie_ids = np.concatenate(id_parts) if id_parts else np.empty(0, dtype=np.int64)
+        self._edits = self._sources = self._targets = None
+        self.catalog = CatalogColumns.stack(catalog_parts)
+        self.title_index = TitleIndex([movie_id for movie_id, _ in titles], [pair for _, pair in titles])
+        self.ann_index = ExactIndex()
+
+        if not counts:
+            self.feature_matrix = None
+            return
+
+        counts = sparse.vstack(counts, format='csr')
+        self.tfidf = TfidfTransformer().fit(counts)
+        self.feature_matrix = self.tfidf.transform(counts, copy=False).tocsr()
+
+    def fit_embeddings(self, dim=128, seed=0, max_columns=None):
+        """
+        Replace the sparse TF-IDF rows with `dim`-dimensional LSA embeddings: a truncated
+        SVD over the columns the catalog actually uses, stored as one contiguous float32
+        array of L2-normalized rows. Terms that co-occur in the same movies, such as the
+        English and Persian words of its overviews, end up close together. Only the
+        `max_columns` (default RECOMMENDER_EMBEDDING_COLUMNS) columns used by the most
+        movies are kept, which bounds the dim x columns components in the artifact.
+        """
+        matrix = self.feature_matrix
+        if max_columns is None:
+            max_columns = settings.RECOMMENDER_EMBEDDING_COLUMNS
+        document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+        columns = np.flatnonzero(document_frequency).astype(np.int64)
+        if max_columns and len(columns) > max_columns:
+            top = np.argpartition(-document_frequency[columns], max_columns - 1)[:max_columns]
+            columns = np.sort(columns[top])
+        used = matrix[:, columns]
+        # TruncatedSVD needs fewer components than rows and columns
+        dim = max(1, min(dim, used.shape[0] - 1, used.shape[1] - 1))
+        svd = TruncatedSVD(n_components=dim, algorithm='randomized', random_state=seed).fit(used)
+        self.projection = (columns, svd.components_.astype(np.float32))
+        self.feature_matrix = self._project(matrix)
+
+    def _project(self, tfidf_rows):
+        columns, components = self.projection
+        embeddings = np.asarray(tfidf_rows[:, columns] @ components.T, dtype=np.float32)
+        return np.ascontiguousarray(normalize(embeddings))
+
+    @property
+    def dense(self):
+        return self.feature_matrix is not None and not sparse.issparse(self.feature_matrix)
+
+    def vectorize(self, movies):
+        """L2-normalized rows for movies in the recommender's space, weighted with the fitted IDF."""
+        return self._vectorize_texts([movie_feature_text(movie) for movie in movies])
+
+    def _vectorize_texts(self, texts):
+        counts = make_hasher(**self.hashing_params).transform(texts)
+        tfidf_rows = self.tfidf.transform(counts, copy=False)
+        return tfidf_rows if self.projection is None else self._project(tfidf_rows)
+
+    def describe_rows(self, description, limit=10):
+        """
+        Rows best matching a free-text description such as "space heist with a twist".
+        The text is hashed and IDF-weighted like a movie's features, then scored with
+        one product against the feature matrix.
+        """
+        if self.feature_matrix is None:
+            return np.empty(0, dtype=np.int64)
+        vector = self._vectorize_texts([clean_text(description)])
+        if sparse.issparse(vector) and not vector.nnz:
+            # Only stop words or unknown characters
+            return np.empty(0, dtype=np.int64)
+        return self.nearest_rows(vector, limit)
+
+    def build_ann(self, backend, **params):
+        self.ann_index = build_ann_index(backend, self.feature_matrix, self.movie_ids, **params)
+        return self.ann_index
+
+    def save(self, path):
+        if self.feature_matrix is None:
+            raise ValueError("Cannot save an empty recommender")
+
+        matrix = self.feature_matrix if self._sources is None else self.row_vectors(slice(None))
+        if self.dense:
+            columns, components = self.projection
+            recommender_store.save_arrays(path, embeddings=matrix, lsa_columns=columns, lsa_components=components)
+        else:
+            recommender_store.save_arrays(path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr)
+        recommender_store.save_arrays(path, idf=self.tfidf.idf_, movie_ids=self.movie_ids)
+        self.catalog.save(path)
+        self.title_index.save(path)
+        return recommender_store.write_manifest(
+            path,
+            shape=list(matrix.shape),
+            nnz=int(matrix.size if self.dense else matrix.nnz),
+            embedding_dim=matrix.shape[1] if self.dense else None,
+            synced_at=self.synced_at.isoformat() if self.synced_at else None,
+            ann=self.ann_index.save(path),
+            vectorizer=self.hashing_params,
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        manifest = recommender_store.read_manifest(path)
+
+        recommender = cls(prepare=False)
+        # Hashing is stateless, so the IDF weights are the only fitted vectorizer state
+        recommender.hashing_params = manifest['vectorizer']
+        recommender.tfidf.idf_ = np.asarray(recommender_store.load_array(path, 'idf', mmap))
+
+        # The arrays stay memory-mapped (scipy wraps the CSR ones without copying), so every
+        # worker on a node shares one copy of the matrix through the page cache.
+        if manifest.get('embedding_dim'):
+            recommender.feature_matrix = recommender_store.load_array(path, 'embeddings', mmap)
+            recommender.projection = (
+                recommender_store.load_array(path, 'lsa_columns', mmap),
+                recommender_store.load_array(path, 'lsa_components', mmap),
+            )
+        else:
+            recommender.feature_matrix = sparse.csr_matrix(
+                (
+                    recommender_store.load_array(path, 'data', mmap),
+                    recommender_store.load_array(path, 'indices', mmap),
+                    recommender_store.load_array(path, 'indptr', mmap),
+                ),
+                shape=tuple(manifest['shape']),
+                copy=False,
+            )
+        recommender.movie_ids = recommender_store.load_array(path, 'movie_ids', mmap)
+        recommender.catalog = CatalogColumns.load(path, mmap)
+        recommender.ann_index = load_ann_index(path, manifest.get('ann'), mmap)
+        recommender.version = manifest['version']
+        recommender.synced_at = parse_datetime(manifest['synced_at']) if manifest.get('synced_at') else None
+
+        # Rows whose movie was deleted after the build stay in the matrix; hydrate() drops them,
+        # and the next sync removes them and their titles
+        recommender.title_index = TitleIndex.load(path) or recommender._read_title_index()
+        return recommender
+
+    def _read_title_index(self, chunk_size=10000):
+        """
+        Titles of the indexed movies, streamed from the whole table for artifacts saved
+        without them. An IN list of every id would exceed the query parameter limits.
+        Only the titles are read, never the long overview texts.
+        """
+        movie_ids, titles = [], []
+        rows = Movie.objects.order_by('id').values_list('id', 'title', 'title_fa')
+        for movie_id, title, title_fa in rows.iterator(chunk_size=chunk_size):
+            movie_ids.append(movie_id)
+            titles.append((title, title_fa))
+        movie_ids = np.array(movie_ids, dtype=np.int64)
+        keep = np.isin(movie_ids, self.movie_ids)
+        return TitleIndex(movie_ids[keep], [pair for pair, kept in zip(titles, keep) if kept])
+
+    @property
+    def revision(self):
+        """
+        The artifact version plus a digest of the edits applied on top of it, in order.
+        Workers that applied the same edits share it, so it identifies cached results
+        (including cached rows) in a shared cache.
+        """
+        return f'{self.version}:{self._changes}'
+
+    def __len__(self):
+        return len(self.movie_ids)
 
-    def find_similar_movies(self, movie_name, limit=10):
+    def hydrate(self, rows):
+        """Movies for the given rows, in row order, from one `in_bulk` query; deleted movies are skipped."""
+        movie_ids = [int(self.movie_ids[row]) for row in rows]
+        movies = Movie.objects.in_bulk(movie_ids)
+        return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
+    @property
+    def memory_mapped(self):
+        """Whether the feature matrix is backed by the shared artifact mapping."""
+        if self.feature_matrix is None:
+            return False
+        return recommender_store.is_memory_mapped(self.feature_matrix if self.dense else self.feature_matrix.data)
+
+    def row_for_id(self, movie_id):
+        if self.movie_ids is None or not len(self.movie_ids):
+            return None
+        row = int(np.searchsorted(self.movie_ids, movie_id))
+        if row < len(self.movie_ids) and self.movie_ids[row] == movie_id:
+            return row
+        return None
+
+    def rows_for_ids(self, movie_ids):
+        """Sorted, unique rows of the given movie ids; ids without a row are dropped."""
+        movie_ids = np.unique(np.asarray(movie_ids, dtype=np.int64))
+        if self.movie_ids is None or not len(self.movie_ids) or not len(movie_ids):
+            return np.empty(0, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.movie_ids, movie_ids), len(self.movie_ids) - 1)
+        return rows[self.movie_ids[rows] == movie_ids]
+
+    def with_movies(self, movies):
+        """
+        Return a copy with the given movies' rows added or replaced, weighted with the
+        already-fitted IDF. The current instance is left untouched so
+        requests already holding it keep a consistent view. The stored matrix is never
+        copied, so a memory-mapped artifact stays shared between workers: new vectors go
+        to a small overlay and only the compact per-row arrays are rebuilt.
+        """
+        if self.feature_matrix is None:
+            raise ValueError("Cannot update a recommender that has not been fitted")
+
+        # Keep only the last version of each movie
+        movies = list({movie.id: movie for movie in movies}.values())
+        if not movies:
+            return self
+
+        changed_ids = np.array([movie.id for movie in movies], dtype=np.int64)
+        vectors = self.vectorize(movies)
+        keep = ~np.isin(self.movie_ids, changed_ids)
+
+        # Append the new rows to the untouched ones, then restore id order in one pass
+        movie_ids = np.concatenate([self.movie_ids[keep], changed_ids])
+        order = np.argsort(movie_ids, kind='stable')
+
+        # Overlay rows nothing points at any more are dropped, the rest are renumbered
+        sources, edits = self._overlay()
+        stored = self.feature_matrix.shape[0]
+        kept = sources[keep]
+        edited = kept >= stored
+        live = np.unique(kept[edited] - stored)
+        kept[edited] = stored + np.searchsorted(live, kept[edited] - stored)
+        edits = self._stack([edits[live], vectors])
+        added = stored + len(live) + np.arange(len(movies), dtype=np.int64)
+
+        updated = copy.copy(self)
+        updated._set_overlay(np.concatenate([kept, added])[order], edits)
+        updated.movie_ids = movie_ids[order]
+        updated.catalog = self.catalog.take(keep).concatenate(movies).take(order)
+        updated.ann_index = self.ann_index.with_extra_ids(changed_ids)
+        updated.title_index = self.title_index.updated(movies=movies)
+        # synced_at only moves in _sync_recommender: a local edit says nothing about the
+        # edits of other workers that commit later with an earlier updated_at
+        updated._applied_edits = {**self._applied_edits, **{movie.id: movie.updated_at for movie in movies}}
+        updated._changes = _chained(self._changes, 'with', [
+            (movie.id, movie.updated_at.isoformat() if movie.updated_at else None) for movie in movies
+        ])
+        return updated
+
+    def without_movies(self, movie_ids):
+        keep = ~np.isin(self.movie_ids, np.asarray(movie_ids, dtype=np.int64))
+        if keep.all():
+            return self
+
+        sources, edits = self._overlay()
+        updated = copy.copy(self)
+        # The stored rows of deleted movies become tombstones
+        updated._set_overlay(sources[keep], edits)
+        updated.movie_ids = self.movie_ids[keep]
+        updated.catalog = self.catalog.take(keep)
+        updated.title_index = self.title_index.updated(removed_ids=self.movie_ids[~keep])
+        updated._changes = _chained(self._changes, 'without', self.movie_ids[~keep].tolist())
+        return updated
+
+    def synced_to(self, latest):
+        """This model once a sync has read every edit up to `latest`, the newest updated_at it returned."""
+        if latest is None or (self.synced_at is not None and latest <= self.synced_at):
+            return self
+        updated = copy.copy(self)
+        updated.synced_at = latest
+        margin = latest - timedelta(seconds=settings.RECOMMENDER_SYNC_OVERLAP)
+        updated._applied_edits = {
+            movie_id: at for movie_id, at in self._applied_edits.items() if at is None or at > margin
+        }
+        return updated
+
+    def _overlay(self):
+        """(row sources, edited rows), an identity mapping and no rows before the first edit."""
+        if self._sources is not None:
+            return self._sources, self._edits
+        width = self.feature_matrix.shape[1]
+        if self.dense:
+            edits = np.empty((0, width), dtype=self.feature_matrix.dtype)
+        else:
+            edits = sparse.csr_matrix((0, width), dtype=self.feature_matrix.dtype)
+        return np.arange(len(self), dtype=np.int64), edits
+
+    def _set_overlay(self, sources, edits):
+        self._sources, self._edits = sources, edits
+        self._targets = np.full(self.feature_matrix.shape[0] + edits.shape[0], -1, dtype=np.int64)
+        self._targets[sources] = np.arange(len(sources), dtype=np.int64)
+
+    def _stack(self, parts):
+        return np.vstack(parts) if self.dense else sparse.vstack(parts, format='csr')
+
+    def row_vectors(self, rows):
+        """Feature rows of `rows` (an index array or a slice), in that order, read through the edit overlay."""
+        if self._sources is None:
+            return self.feature_matrix[rows]
+        sources = self._sources[rows]
+        stored = self.feature_matrix.shape[0]
+        edited = sources >= stored
+        if not edited.any():
+            return self.feature_matrix[sources]
+        stacked = self._stack([self.feature_matrix[sources[~edited]], self._edits[sources[edited] - stored]])
+        # Put the rows back in request order
+        return stacked[np.argsort(np.concatenate([np.flatnonzero(~edited), np.flatnonzero(edited)]), kind='stable')]
+
+    def _top_rows(self, scores, limit, exclude=None):
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        limit = min(limit, scores.shape[0])
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        # Highest score first, ties in row (movie id) order
+        top = top[np.lexsort((top, -scores[top]))]
+        return top[np.isfinite(scores[top])]
+
+    def find_similar_movies(self, movie_name, limit=10, filters=None, diversity=0):
         try:
-            if not self.movies or self.feature_matrix is None:
+            if not len(self) or self.feature_matrix is None:
                 return []
             
-            # Search in both English and Persian titles
-            query_movie = None
-            for movie in self.movies:
-                if (movie.title and movie_name.lower() in movie.title.lower()) or \
-                   (movie.title_fa and movie_name.lower() in movie.title_fa.lower()):
-                    query_movie = movie
-                    break
-            
-            if not query_movie:
+            # Resolve the best English or Persian title match through the index
+            query_movie_id = self.title_index.lookup(movie_name)
+            if query_movie_id is None:
                 return []
             
-            # Get movie index
-            movie_idx = self.movies.index(query_movie)
-            
-            # Calculate similarity scores
-            movie_vector = self.feature_matrix[movie_idx]
-            similarity_scores = cosine_similarity(movie_vector, self.feature_matrix)
-            
-            # Get top similar movies
-            similar_indices = similarity_scores.argsort()[0][-limit-1:-1][::-1]
-            
-            # Filter out the query movie and return results
-            return [self.movies[idx] for idx in similar_indices if idx != movie_idx]
+            return self.similar_to_movie(query_movie_id, limit, filters, diversity)
             
         except Exception as e:
             print(f"Error finding similar movies: {e}")
             return []
 
-    def get_recommendations_from_answers(self, user_answers, limit=10):
+    def similar_to_movie(self, movie_id, limit=10, filters=None, diversity=0):
+        return self.similar_to_movies([movie_id], limit, filters, diversity)[0]
+
+    def similar_to_movies(self, movie_ids, limit=10, filters=None, diversity=0):
+        """
+        Similar movies for every id in `movie_ids`, in the same order; ids without a row
+        get an empty list. The offline neighbor table answers the ids it covers with one
+        indexed query, and the others share one `similar_rows_batch` product and one
+        hydration query, whether a request asks for one movie or many.
+        """
+        neighbors = {} if filters or diversity else precomputed_neighbors(movie_ids, limit)
+        seed_rows = {}
+        if self.feature_matrix is not None:
+            for movie_id in movie_ids:
+                row = self.row_for_id(movie_id) if movie_id not in neighbors else None
+                if row is not None:
+                    seed_rows[movie_id] = row
+
+        similar = {}
+        if seed_rows:
+            rows = np.array(sorted(set(seed_rows.values())), dtype=np.int64)
+            allowed_rows = self.catalog.filter_rows(filters) if filters else None
+            pool = pool_size(limit) if diversity else limit
+            similar = dict(zip(rows.tolist(), self.similar_rows_batch(rows, pool, allowed_rows=allowed_rows)))
+            if diversity:
+                for row, found in similar.items():
+                    relevance = self.vector_scores(self.row_vectors(slice(row, row + 1)), found)
+                    similar[row] = self.diversify(found, relevance, limit, diversity)
+
+        # Hydrate every computed row with a single query
+        movies = {}
+        if similar:
+            result_ids = np.unique(np.concatenate([self.movie_ids[rows] for rows in similar.values()]))
+            movies = Movie.objects.in_bulk([int(movie_id) for movie_id in result_ids])
+
+        results = []
+        for movie_id in movie_ids:
+            if movie_id in neighbors:
+                results.append(neighbors[movie_id])
+            elif movie_id in seed_rows:
+                found = (int(found_id) for found_id in self.movie_ids[similar[seed_rows[movie_id]]])
+                results.append([movies[found_id] for found_id in found if found_id in movies])
+            else:
+                results.append([])
+        return results
+
+    def diversify(self, rows, relevance, limit, diversity):
+        """
+        Re-rank a candidate pool by maximal marginal relevance over the pool's pairwise
+        similarity block; `diversity` 0 keeps the relevance order, 1 only avoids redundancy.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if not diversity or len(rows) <= 1:
+            return rows[:limit]
+        similarity = self._scores(self.row_vectors(rows), rows)
+        return rows[mmr_order(relevance, similarity, limit, diversity)]
+
+    def similar_rows(self, row, limit=10, probes=None, exact=False, allowed_rows=None):
+        """
+        Rows most similar to `row`, excluding itself. The ANN backend narrows the rows
+        that are scored unless `exact` is set; `probes` trades recall for latency.
+        With `allowed_rows` (sorted rows matching a filter) only those rows are returned:
+        small partitions are scanned exactly and large ones fall back to a scan when
+        the ANN candidates leave fewer than `limit` matches.
+        """
+        # Rows are L2-normalized, so cosine similarity is a plain dot product
+        movie_vector = self.row_vectors(slice(row, row + 1))
+        if allowed_rows is not None:
+            # Partitions no bigger than a catalog that would not get an ANN index are scanned exactly
+            candidate_ids = None
+            if not exact and len(allowed_rows) > settings.RECOMMENDER_ANN['MIN_ROWS']:
+                candidate_ids = self.ann_index.candidate_ids(movie_vector, probes)
+            if candidate_ids is not None:
+                candidates = self.rows_for_ids(candidate_ids)
+                candidates = candidates[np.isin(candidates, allowed_rows, assume_unique=True)]
+                similarity_scores = self._scores(movie_vector, candidates).ravel()
+                top = candidates[self._top_rows(similarity_scores, limit, exclude=candidates == row)]
+                if len(top) >= limit:
+                    return top
+            similarity_scores = self._scores(movie_vector, allowed_rows).ravel()
+            return allowed_rows[self._top_rows(similarity_scores, limit, exclude=allowed_rows == row)]
+
+        candidate_ids = None if exact else self.ann_index.candidate_ids(movie_vector, probes)
+
+        if candidate_ids is None:
+            similarity_scores = self._scores(movie_vector).ravel()
+            return self._top_rows(similarity_scores, limit, exclude=row)
+
+        candidates = self.rows_for_ids(candidate_ids)
+        similarity_scores = self._scores(movie_vector, candidates).ravel()
+        return candidates[self._top_rows(similarity_scores, limit, exclude=candidates == row)]
+
+    def nearest_rows(self, vector, limit=10, exclude_rows=None, probes=None):
+        """
+        Rows closest to an arbitrary query vector in the recommender's space (a sparse
+        or dense 1 x features row), best first, skipping `exclude_rows`. Only rows with
+        a positive score are returned.
+        """
+        if self.feature_matrix is None or vector is None:
+            return np.empty(0, dtype=np.int64)
+        candidate_ids = self.ann_index.candidate_ids(vector, probes)
+        candidates = None if candidate_ids is None else self.rows_for_ids(candidate_ids)
+        scores = self._scores(vector, candidates).ravel()
+        scores[scores <= 0] = -np.inf
+        if exclude_rows is not None and len(exclude_rows):
+            scores[exclude_rows if candidates is None else np.isin(candidates, exclude_rows)] = -np.inf
+        top = self._top_rows(scores, limit)
+        return top if candidates is None else candidates[top]
+
+    def vector_scores(self, vector, rows=None):
+        """Similarity of every row, or only `rows`, to one query vector."""
+        if self.feature_matrix is None or vector is None:
+            return np.zeros(len(self) if rows is None else len(rows), dtype=np.float32)
+        return self._scores(vector, rows).ravel()
+
+    def _scores(self, vectors, rows=None):
+        """
+        (rows x queries) dot products of every row, or only `rows`, with the query vectors.
+        With dense embeddings this is a single BLAS product.
+        """
+        if rows is not None:
+            return self._product(self.row_vectors(rows), vectors)
+        if self._sources is None:
+            return self._product(self.feature_matrix, vectors)
+        # Score the stored and the edited rows separately, then gather them into row order
+        scores = np.concatenate([self._product(self.feature_matrix, vectors), self._product(self._edits, vectors)])
+        return scores[self._sources]
+
+    @staticmethod
+    def _product(matrix, vectors):
+        product = matrix @ vectors.T
+        return product.toarray() if sparse.issparse(product) else np.asarray(product)
+
+    def resolve_movie(self, seed):
+        """Movie id for a seed given either as a movie id or as an English/Persian title."""
+        if isinstance(seed, int):
+            return seed if self.row_for_id(seed) is not None else None
+        return self.title_index.lookup(seed)
+
+    def find_similar_movies_batch(self, seeds, limit=10, filters=None, diversity=0):
+        """
+        Similar movies for several seeds at once, as a list in seed order. All seeds are
+        resolved first and answered by one `similar_to_movies` call, the same path as
+        single-movie requests. Seeds that cannot be resolved give None.
+        """
+        if not len(self) or self.feature_matrix is None:
+            return [None] * len(seeds)
+
+        movie_ids = [self.resolve_movie(seed) for seed in seeds]
+        found = iter(self.similar_to_movies(
+            [movie_id for movie_id in movie_ids if movie_id is not None], limit, filters, diversity
+        ))
+        return [None if movie_id is None else next(found) for movie_id in movie_ids]
+
+    def similar_rows_batch(self, rows, limit=10, probes=None, exact=False, allowed_rows=None):
+        """
+        Top similar rows for every row in `rows` from a single sparse (or dense) product.
+        Only rows with a positive similarity are returned. `allowed_rows` restricts the
+        results to a filter's partition as in `similar_rows`.
+        """
+        vectors = self.row_vectors(rows)
+        use_ann = not exact and (allowed_rows is None or len(allowed_rows) > settings.RECOMMENDER_ANN['MIN_ROWS'])
+        candidate_ids = self.ann_index.candidate_ids(vectors, probes) if use_ann else None
+        if candidate_ids is not None:
+            candidates = self.rows_for_ids(candidate_ids)
+            if allowed_rows is not None:
+                candidates = candidates[np.isin(candidates, allowed_rows, assume_unique=True)]
+        else:
+            candidates = allowed_rows
+        # None means every row
+        scored = np.arange(len(self)) if candidates is None else candidates
+
+        results = []
+        if self.dense:
+            similarity = self._scores(vectors, candidates).T
+            for offset, row in enumerate(rows):
+                scores = similarity[offset].copy()
+                scores[(scored == row) | (scores <= 0)] = -np.inf
+                results.append(scored[self._top_rows(scores, limit)])
+        else:
+            if candidates is None and self._sources is not None:
+                # Score the stored and the edited rows; tombstones map to -1
+                similarity = sparse.hstack([vectors @ self.feature_matrix.T, vectors @ self._edits.T], format='csr')
+                scored = self._targets
+            else:
+                matrix = self.feature_matrix if candidates is None else self.row_vectors(candidates)
+                similarity = (vectors @ matrix.T).tocsr()
+            for offset, row in enumerate(rows):
+                lo, hi = similarity.indptr[offset], similarity.indptr[offset + 1]
+                found = scored[similarity.indices[lo:hi]]
+                scores = similarity.data[lo:hi]
+                keep = (found != row) & (found >= 0) & (scores > 0)
+                found, scores = found[keep], scores[keep]
+                # Row order first, so ties break by movie id as in similar_rows
+                order = np.argsort(found)
+                found, scores = found[order], scores[order]
+                results.append(found[self._top_rows(scores, limit)])
+
+        if allowed_rows is not None and candidate_ids is not None:
+            # ANN candidates can leave a large partition short; scan it for those seeds
+            results = [
+                found if len(found) >= limit else
+                self.similar_rows_batch(np.array([row]), limit, exact=True, allowed_rows=allowed_rows)[0]
+                for row, found in zip(rows, results)
+            ]
+        return results
+
+    def iter_top_neighbors(self, k=20, block_size=512):
+        """
+        Yield (row, neighbor_rows, scores) for every row, computing the cosine matrix one
+        block of rows at a time as a sparse product so N x N is never materialized.
+        Dense blocks are block x N floats, so they are cut to DENSE_BLOCK_BYTES.
+        An edited model is first copied into one matrix in row order.
+        """
+        matrix = self.feature_matrix if self._sources is None else self.row_vectors(slice(None))
+        if self.dense:
+            block_size = max(1, min(block_size, DENSE_BLOCK_BYTES // (matrix.itemsize * max(matrix.shape[0], 1))))
+            for start in range(0, matrix.shape[0], block_size):
+                block = matrix[start:start + block_size] @ matrix.T
+                for offset in range(block.shape[0]):
+                    row = start + offset
+                    scores = block[offset]
+                    rows = np.flatnonzero(scores > 0)
+                    rows = rows[rows != row]
+                    if len(rows) > k:
+                        rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+                    rows = rows[np.argsort(-scores[rows], kind='stable')]
+                    yield row, rows, scores[rows]
+            return
+
+        transposed = matrix.T.tocsr()
+        for start in range(0, matrix.shape[0], block_size):
+            block = (matrix[start:start + block_size] @ transposed).tocsr()
+            for offset in range(block.shape[0]):
+                row = start + offset
+                lo, hi = block.indptr[offset], block.indptr[offset + 1]
+                rows, scores = block.indices[lo:hi], block.data[lo:hi]
+                keep = (rows != row) & (scores > 0)
+                rows, scores = rows[keep], scores[keep]
+                if len(rows) > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    rows, scores = rows[top], scores[top]
+                order = np.argsort(-scores, kind='stable')
+                yield row, rows[order], scores[order]
+
+    def get_recommendations_from_answers(self, user_answers, limit=10, weights=None, exclude_rows=None):
         try:
-            if not self.movies:
+            if not len(self) or not len(self.catalog):
                 return []
             
-            weights = {
-                'genre': 0.4,
-                'year': 0.2,
-                'rating': 0.2,
-                'language': 0.1,
-                'type': 0.1
-            }
-            
-            preferences = self._process_user_answers(user_answers)
-            
-            scored_movies = []
-            for movie in self.movies:
-                score = self._calculate_movie_score(movie, preferences, weights)
-                if score > 0:
-                    scored_movies.append((movie, score))
-            
-            scored_movies.sort(key=lambda x: x[1], reverse=True)
-            return [movie for movie, _ in scored_movies[:limit]]
+            return self.hydrate(self.answer_rows(user_answers, limit, weights, exclude_rows))
             
         except Exception as e:
             print(f"Error getting recommendations: {e}")
             return []
 
+    def answer_rows(self, user_answers, limit=10, weights=None, exclude_rows=None):
+        """
+        Best matching rows for questionnaire answers, skipping `exclude_rows`;
+        `weights` overrides some or all of ANSWER_WEIGHTS. Only the candidates from
+        `answer_candidates` are scored when the answers narrow the catalog enough.
+        """
+        weights = {**ANSWER_WEIGHTS, **(weights or {})}
+        preferences = self._process_user_answers(user_answers)
+        candidates = self.answer_candidates(preferences, weights, limit, exclude_rows)
+        if candidates is None:
+            scores = self._calculate_movie_scores(preferences, weights)
+            scores[scores <= 0] = -np.inf
+            return self._top_rows(scores, limit, exclude_rows)
+
+        rows, scores = candidates
+        return rows[self._top_rows(scores, limit)]
+
+    def answer_candidates(self, preferences, weights, limit, exclude_rows=None):
+        """
+        (sorted rows, scores) of a catalog partition that is known to hold the best
+        `limit` rows, or None when the whole catalog has to be scored; excluded rows
+        score -inf. Rows meeting every kept criterion score at least the kept weights,
+        and every other row misses one of them, so it scores at most the total weight
+        minus the lightest kept weight. Starting from all criteria, the lightest is
+        dropped until the `limit`-th best score of the partition beats that bound.
+        """
+        criteria = self._answer_criteria(preferences, weights)
+        if limit <= 0 or any(weight < 0 for weight, _ in criteria):
+            return None
+        # Criteria without weight do not change any score, so they never narrow the rows
+        criteria = sorted((c for c in criteria if c[0] > 0), key=lambda criterion: criterion[0])
+        total = sum(weight for weight, _ in criteria)
+        while criteria:
+            constraints = {}
+            for _, constraint in criteria:
+                constraints.update(constraint)
+            rows = self.catalog.filter_rows(CatalogFilter(**constraints))
+            if len(rows) >= limit:
+                scores = self._calculate_movie_scores(preferences, weights, rows)
+                if exclude_rows is not None:
+                    scores[np.isin(rows, exclude_rows)] = -np.inf
+                kept = scores[np.isfinite(scores)]
+                # Strictly above the bound (with float32 slack), so ties with outside rows
+                # are still broken by row like the full scan does
+                bound = total - criteria[0][0] + 1e-6
+                if len(kept) >= limit and np.partition(kept, len(kept) - limit)[len(kept) - limit] > bound:
+                    return rows, scores
+            criteria = criteria[1:]
+        return None
+
+    @staticmethod
+    def _answer_criteria(preferences, weights):
+        """(weight, CatalogFilter arguments) of every criterion `_calculate_movie_scores` checks."""
+        criteria = []
+        if preferences['genres']:
+            criteria.append((weights['genre'], {'genres': preferences['genres']}))
+        if preferences['year_range']:
+            try:
+                min_year, max_year = map(int, preferences['year_range'])
+                criteria.append((weights['year'], {'min_year': min_year, 'max_year': max_year}))
+            except (ValueError, TypeError):
+                pass
+        if preferences['min_rating']:
+            criteria.append((weights['rating'], {'min_rating': preferences['min_rating']}))
+        if preferences['languages']:
+            criteria.append((weights['language'], {'languages': preferences['languages']}))
+        if preferences['movie_type'] in ('movie', 'series'):
+            criteria.append((weights['type'], {'is_tv_series': preferences['movie_type'] == 'series'}))
+        return criteria
+
+    def answer_scores(self, user_answers, rows=None, weights=None):
+        """Questionnaire score of every row, or only `rows`, for the given answers."""
+        preferences = self._process_user_answers(user_answers)
+        return self._calculate_movie_scores(preferences, {**ANSWER_WEIGHTS, **(weights or {})}, rows)
+
     def _process_user_answers(self, user_answers):
         preferences = {
             'genres': [],
@@ -142,39 +839,318 @@ class MovieRecommender:
         
         return preferences
 
-    def _calculate_movie_score(self, movie, preferences, weights):
-        try:
-            score = 0
-            
-            if preferences['genres'] and movie.genre:
-                genre_match = 1 if movie.genre in preferences['genres'] else 0
-                score += weights['genre'] * genre_match
-            
-            if preferences['year_range'] and movie.release_year:
-                try:
-                    min_year, max_year = map(int, preferences['year_range'])
-                    if min_year <= movie.release_year <= max_year:
-                        score += weights['year']
-                except (ValueError, TypeError):
-                    pass
-            
-            if preferences['min_rating']:
-                rating = movie.imdb_rating or movie.tmdb_rating
-                if rating and rating >= preferences['min_rating']:
-                    score += weights['rating']
-            
-            if preferences['languages'] and movie.original_language:
-                if movie.original_language in preferences['languages']:
-                    score += weights['language']
-            
-            if preferences['movie_type']:
-                if preferences['movie_type'] == 'movie' and not movie.is_tv_series:
-                    score += weights['type']
-                elif preferences['movie_type'] == 'series' and movie.is_tv_series:
-                    score += weights['type']
-            
-            return score
-            
-        except Exception as e:
-            print(f"Error calculating movie score: {e}")
-            return 0
\ No newline at end of file
+    def _calculate_movie_scores(self, preferences, weights, rows=None):
+        """
+        Score every catalog row (or only `rows`) against the processed answers with
+        boolean masks over the columnar snapshot, instead of one Python call per movie.
+        """
+        catalog = self.catalog if rows is None else self.catalog.take(rows)
+        criteria = []
+
+        if preferences['genres']:
+            criteria.append((weights['genre'], catalog.genre_mask(preferences['genres'])))
+
+        if preferences['year_range']:
+            try:
+                min_year, max_year = map(int, preferences['year_range'])
+                years = catalog.release_year
+                criteria.append((weights['year'], (years != 0) & (years >= min_year) & (years <= max_year)))
+            except (ValueError, TypeError):
+                pass
+
+        if preferences['min_rating']:
+            ratings = catalog.rating
+            criteria.append((weights['rating'], (ratings != 0) & (ratings >= preferences['min_rating'])))
+
+        if preferences['languages']:
+            criteria.append((weights['language'], catalog.language_mask(preferences['languages'])))
+
+        if preferences['movie_type'] == 'movie':
+            criteria.append((weights['type'], ~catalog.is_tv_series))
+        elif preferences['movie_type'] == 'series':
+            criteria.append((weights['type'], catalog.is_tv_series))
+
+        # Pack the matched criteria into one bit per criterion, then map every bit pattern
+        # to its summed weight with a single table lookup
+        matched = np.zeros(len(catalog), dtype=np.uint8)
+        for bit, (_, mask) in enumerate(criteria):
+            matched |= mask.view(np.uint8) << bit
+        weight_table = np.array([
+            sum(weight for bit, (weight, _) in enumerate(criteria) if pattern >> bit & 1)
+            for pattern in range(1 << len(criteria))
+        ], dtype=np.float32)
+        scores = np.take(weight_table, matched)
+        return scores
+
+def _chained(digest, *parts):
+    """Digest of `digest` followed by `parts`; identifies one sequence of edits."""
+    return hashlib.sha1(repr((digest,) + parts).encode()).hexdigest()[:16]
+
+
+def precomputed_neighbors(movie_ids, limit):
+    """
+    Top `limit` neighbors from the MovieNeighbor table for each of `movie_ids`, read in
+    one query. Movies with fewer than `limit` stored rows are left out, so the caller
+    computes them live.
+    """
+    neighbors = {}
+    stored = MovieNeighbor.objects.filter(movie_id__in=set(movie_ids), rank__lt=limit) \
+        .select_related('neighbor').order_by('movie_id', 'rank')
+    for neighbor in stored:
+        neighbors.setdefault(neighbor.movie_id, []).append(neighbor.neighbor)
+    return {movie_id: found for movie_id, found in neighbors.items() if len(found) >= limit}
+
+
+_recommender = None
+_recommender_lock = threading.Lock()
+# Held by the one request that syncs or applies queued edits, so only one new model is
+# built at a time; the others keep serving the current model meanwhile
+_sync_lock = threading.Lock()
+_last_sync = 0.0
+# Bumped by reset_recommender, so a load or sync started before a reset is not swapped in
+_epoch = 0
+# Movie edits saved through this process and not applied yet: movie id -> Movie, or None once deleted
+_pending_changes = {}
+
+
+def load_recommender(path=None, mmap=True):
+    """
+    Load the recommender from the published artifact, or fit it on the live catalog
+    when no artifact has been built yet.
+    """
+    path = path or recommender_store.current_version_dir()
+    if path is None:
+        return MovieRecommender()
+    return MovieRecommender.load(path, mmap)
+
+
+class RecommenderNotReady(Exception):
+    """The first model of this process is still loading in the background."""
+
+
+def get_recommender(background=None):
+    """
+    Return the recommender shared by every request handled in this process. Loading the
+    first model, syncs (including loading a newly published artifact) and queued movie
+    edits run in one background thread when `background` (default:
+    RECOMMENDER_BACKGROUND_LOAD) is set, so no request waits for them: the current model
+    keeps being served, and RecommenderNotReady is raised until the first one is loaded.
+    Otherwise the caller runs them itself, as management commands do. Either way the
+    result is swapped in with a single assignment.
+    """
+    if background is None:
+        background = settings.RECOMMENDER_BACKGROUND_LOAD
+    with _recommender_lock:
+        recommender = _recommender
+        stale = (recommender is None or bool(_pending_changes) or
+                 time.monotonic() - _last_sync >= settings.RECOMMENDER_SYNC_INTERVAL)
+    if not stale:
+        return recommender
+
+    if background:
+        if _sync_lock.acquire(blocking=False):
+            threading.Thread(target=_refresh_in_background, daemon=True).start()
+        if recommender is None:
+            raise RecommenderNotReady('The recommender is still loading')
+        return recommender
+
+    # Without a model every caller waits for the one load; otherwise syncing is left to
+    # whoever already runs it
+    if not _sync_lock.acquire(blocking=recommender is None):
+        return recommender
+    try:
+        return _refresh()
+    finally:
+        _sync_lock.release()
+
+
+def _refresh_in_background():
+    try:
+        _refresh()
+    except Exception as e:
+        print(f"Error loading recommender: {e}")
+    finally:
+        _sync_lock.release()
+        # This thread's own connection would otherwise stay open until the worker exits
+        connections.close_all()
+
+
+def _refresh():
+    """Load the first model, or sync the current one; the caller holds _sync_lock."""
+    global _recommender, _last_sync
+    with _recommender_lock:
+        recommender, epoch = _recommender, _epoch
+        if recommender is None:
+            _pending_changes.clear()
+        due = recommender is None or time.monotonic() - _last_sync >= settings.RECOMMENDER_SYNC_INTERVAL
+        if not (due or _pending_changes):
+            return recommender
+        if due:
+            _last_sync = time.monotonic()
+        changes = dict(_pending_changes)
+        _pending_changes.clear()
+
+    if recommender is None:
+        loaded = load_recommender()
+        with _recommender_lock:
+            if _epoch == epoch:
+                _recommender = loaded
+        return loaded
+
+    try:
+        synced = _sync_recommender(recommender, changes, full=due)
+    except Exception as e:
+        # Keep serving the previous model rather than an empty one, and retry the edits next time
+        print(f"Error syncing recommender: {e}")
+        with _recommender_lock:
+            if _epoch == epoch:
+                for movie_id, movie in changes.items():
+                    _pending_changes.setdefault(movie_id, movie)
+        return recommender
+
+    with _recommender_lock:
+        # A reset while syncing means the caller wants a fresh load, not this model
+        if _epoch == epoch:
+            _recommender = synced
+        return synced
+
+
+def loaded_recommender():
+    """The shared recommender if this process has already loaded one; never loads it."""
+    return _recommender
+
+
+def _sync_recommender(recommender, changes=None, full=True):
+    """
+    Apply the queued `changes` ({movie id: Movie, or None once deleted}) in one batch.
+    A `full` sync also loads a newly published artifact and picks up the edits made
+    through other worker processes.
+    """
+    changes = dict(changes or {})
+    if full:
+        # A newly published artifact replaces the in-memory model outright
+        current = recommender_store.current_version_dir()
+        if current is not None and recommender_store.version_name(current) != recommender.version:
+            recommender = MovieRecommender.load(current)
+
+        if recommender.feature_matrix is None:
+            return load_recommender()
+
+        # The database holds the newest version of every movie edited since the last sync.
+        # updated_at is set before a transaction commits, so an edit can become visible
+        # after a later one was read; the overlap rereads that margin, skipping the edits
+        # already applied.
+        edited = Movie.objects.all()
+        if recommender.synced_at is not None:
+            overlap = timedelta(seconds=settings.RECOMMENDER_SYNC_OVERLAP)
+            edited = edited.filter(updated_at__gt=recommender.synced_at - overlap)
+        edited = list(edited)
+        changes.update(
+            (movie.id, movie) for movie in edited if recommender._applied_edits.get(movie.id) != movie.updated_at
+        )
+
+    recommender = recommender.with_movies([movie for movie in changes.values() if movie is not None])
+    recommender = recommender.without_movies([movie_id for movie_id, movie in changes.items() if movie is None])
+    if full:
+        recommender = recommender.synced_to(max((movie.updated_at for movie in edited), default=None))
+
+    if full and Movie.objects.count() != len(recommender.movie_ids):
+        existing = np.fromiter(Movie.objects.values_list('id', flat=True), dtype=np.int64)
+        recommender = recommender.without_movies(np.setdiff1d(recommender.movie_ids, existing))
+    return recommender
+
+
+def build_recommender_artifact(backend=None, n_lists=None, probes=None, chunk_size=2000, workers=1,
+                               recall_queries=0, embedding_dim=None):
+    """
+    Fit the recommender on the live catalog and save it into a fresh version directory
+    without publishing it. Returns (path, manifest, ann recall report or None).
+    """
+    recommender = MovieRecommender(prepare=False)
+    if embedding_dim is None:
+        embedding_dim = settings.RECOMMENDER_EMBEDDING_DIM
+    recommender.fit(Movie.objects.all(), chunk_size=chunk_size, workers=workers, embedding_dim=embedding_dim)
+    if recommender.feature_matrix is None:
+        raise ValueError('No movies in the catalog, nothing to index')
+
+    ann_settings = settings.RECOMMENDER_ANN
+    if backend is None:
+        small = recommender.feature_matrix.shape[0] < ann_settings['MIN_ROWS']
+        backend = 'exact' if small else ann_settings['BACKEND']
+
+    path = recommender_store.create_version_dir()
+    report = None
+    if backend != 'exact':
+        recommender.build_ann(
+            backend,
+            n_lists=n_lists or ann_settings['LISTS'],
+            probes=probes or ann_settings['PROBES'],
+        )
+        if recall_queries:
+            report = recall_report(recommender, queries=recall_queries)
+            recommender_store.write_json(path, 'ann_report.json', report)
+    return path, recommender.save(path), report
+
+
+def rebuild_recommender(keep=3, **options):
+    """
+    Build a new artifact next to the one being served, then switch the `current`
+    pointer to it. Workers move over on their next sync; requests in flight keep the
+    model they already hold. Returns the published manifest.
+    """
+    path, manifest, _ = build_recommender_artifact(**options)
+    recommender_store.publish_version(path)
+    recommender_store.prune_versions(keep=keep)
+    bump_catalog_generation()
+    return manifest
+
+
+_rebuild_process = None
+_rebuild_lock = threading.Lock()
+
+
+def rebuild_in_background():
+    """
+    Run `manage.py build_recommender_index` in a child process unless a rebuild is
+    still running in this or another process; returns whether it started. The fit never runs inside the
+    web worker, and the child has its own memory and database connection.
+    """
+    global _rebuild_process
+    with _rebuild_lock:
+        if _rebuild_process is not None and _rebuild_process.poll() is None:
+            return False
+        # Started by another worker; the command itself also refuses to run twice
+        if recommender_store.rebuild_running():
+            return False
+        _rebuild_process = subprocess.Popen(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'build_recommender_index'],
+            stdin=subprocess.DEVNULL,
+        )
+        return True
+
+
+def apply_movie_change(movie):
+    """
+    Queue one saved movie for the shared recommender. Queued edits are applied in one
+    batch by the next request, so saving many movies does not copy the model per save.
+    """
+    with _recommender_lock:
+        if _recommender is None or _recommender.feature_matrix is None:
+            return
+        _pending_changes[movie.id] = movie
+
+
+def apply_movie_delete(movie_id):
+    with _recommender_lock:
+        if _recommender is None or _recommender.feature_matrix is None:
+            return
+        _pending_changes[movie_id] = None
+
+
+def reset_recommender():
+    """Drop the shared recommender so the next request reloads the newest artifact."""
+    global _recommender, _epoch
+    with _recommender_lock:
+        _recommender = None
+        _epoch += 1
+        _pending_changes.clear()
@@ -0,0 +1,212 @@
+import json
+import mmap
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: rebuilds are not guarded across processes
+    fcntl = None
+
+import numpy as np
+from django.conf import settings
+
+ARTIFACT_FORMAT = 3
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'current'
+REBUILD_LOCK_NAME = 'rebuild.lock'
+
+
+def artifact_root(kind='content'):
+    return os.path.join(settings.RECOMMENDER_ROOT, kind)
+
+
+def create_version_dir(kind='content'):
+    """Create a fresh, uniquely named version directory under the artifact root."""
+    root = artifact_root(kind)
+    os.makedirs(root, exist_ok=True)
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    path = os.path.join(root, version)
+    suffix = 1
+    while os.path.exists(path):
+        path = os.path.join(root, f"{version}-{suffix}")
+        suffix += 1
+    os.makedirs(path)
+    return path
+
+
+def list_versions(kind='content'):
+    root = artifact_root(kind)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if _is_current_format(os.path.join(root, name)))
+
+
+def _is_current_format(path):
+    # Directories from older formats (or still being written) are never picked up
+    try:
+        return read_json(path, MANIFEST_NAME).get('format') == ARTIFACT_FORMAT
+    except (OSError, ValueError):
+        return False
+
+
+def version_name(path):
+    return os.path.basename(os.path.normpath(path))
+
+
+def latest_version_dir(kind='content'):
+    versions = list_versions(kind)
+    if not versions:
+        return None
+    return os.path.join(artifact_root(kind), versions[-1])
+
+
+def publish_version(path, kind='content'):
+    """
+    Atomically point the `current` pointer of `kind` at the version directory `path`.
+    Workers switch on their next sync; until then they keep serving the version they
+    have mapped.
+    """
+    pointer = os.path.join(artifact_root(kind), CURRENT_NAME)
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version_name(path))
+    os.replace(tmp, pointer)
+
+
+def current_version_dir(kind='content'):
+    """The published version directory, or the newest one when nothing has been published."""
+    try:
+        with open(os.path.join(artifact_root(kind), CURRENT_NAME), encoding='utf-8') as f:
+            path = os.path.join(artifact_root(kind), f.read().strip())
+        if _is_current_format(path):
+            return path
+    except OSError:
+        pass
+    return latest_version_dir(kind)
+
+
+@contextmanager
+def rebuild_lock(kind='content'):
+    """
+    Hold the exclusive rebuild lock of `kind` for the block without waiting for it; yields
+    whether it was acquired. The lock is a file lock, so it is shared by every worker
+    process on the machine and released by the OS if the holder dies.
+    """
+    root = artifact_root(kind)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, REBUILD_LOCK_NAME), 'a') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+
+
+def rebuild_running(kind='content'):
+    with rebuild_lock(kind) as acquired:
+        return not acquired
+
+
+def prune_versions(kind='content', keep=3):
+    """Delete all but the newest `keep` versions, never the published one."""
+    current = current_version_dir(kind)
+    for name in list_versions(kind)[:-keep] if keep else list_versions(kind):
+        path = os.path.join(artifact_root(kind), name)
+        if current is None or version_name(current) != name:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def save_arrays(path, **arrays):
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(array))
+
+
+def load_array(path, name, mmap=True):
+    return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+
+
+def is_memory_mapped(array):
+    # Views of a mapped array (as scipy keeps them) are plain ndarrays whose base is the memmap
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def write_json(path, name, data):
+    with open(os.path.join(path, name), 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def read_json(path, name):
+    with open(os.path.join(path, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_text(path, name, text):
+    with open(os.path.join(path, name), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def read_text(path, name):
+    with open(os.path.join(path, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def write_manifest(path, **fields):
+    # The manifest is written last so a half-written directory is never picked up.
+    manifest = {'format': ARTIFACT_FORMAT, 'version': os.path.basename(path), 'created_at': time.time()}
+    manifest.update(fields)
+    write_json(path, MANIFEST_NAME, manifest)
+    return manifest
+
+
+def read_manifest(path):
+    manifest = read_json(path, MANIFEST_NAME)
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format')} in {path}")
+    return manifest
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in os.listdir(path)
+        if os.path.isfile(os.path.join(path, name))
+    )
+
+
+_MEMORY_FIELDS = {
+    'Rss': 'rss',
+    'Pss': 'pss',
+    'Shared_Clean': 'shared',
+    'Shared_Dirty': 'shared',
+    'Private_Clean': 'private',
+    'Private_Dirty': 'private',
+}
+
+
+def process_memory():
+    """
+    Resident memory of the current process in bytes. `shared` pages (such as
+    memory-mapped artifacts) are counted once per node, `pss` splits them evenly
+    between the processes mapping them. Off Linux only the peak RSS is known.
+    """
+    memory = {'pid': os.getpid(), 'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+    try:
+        with open('/proc/self/smaps_rollup', encoding='ascii') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in _MEMORY_FIELDS:
+                    memory[_MEMORY_FIELDS[name]] += int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        memory['rss'] = memory['private'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        memory['pss'] = None
+    return memory
@@ -0,0 +1,58 @@
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .models import UserPreference
+from .recommendation_cache import cache
+
+
+def seen_preferences():
+    """Preferences that mark a movie as seen: liked, rated or on the watchlist."""
+    return UserPreference.objects.filter(Q(liked=True) | Q(watchlist=True) | Q(rating__isnull=False))
+
+
+class SeenSet:
+    """
+    Sorted ids of the movies one user has seen. Ids rather than rows are cached because
+    incremental catalog updates shift rows; `rows()` maps them onto a recommender with one
+    `searchsorted`, so every path can mask seen movies before its top-K selection.
+    """
+
+    def __init__(self, movie_ids):
+        self.movie_ids = np.unique(np.asarray(movie_ids, dtype=np.int64))
+        # Identifies this exact set in the keys of cached result lists
+        self.stamp = hashlib.sha1(self.movie_ids.tobytes()).hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def rows(self, recommender):
+        return recommender.rows_for_ids(self.movie_ids)
+
+    def mask(self, recommender, rows=None):
+        """Boolean mask of seen rows over the whole recommender, or over `rows` only."""
+        if rows is not None:
+            return np.isin(recommender.movie_ids[rows], self.movie_ids)
+        mask = np.zeros(len(recommender), dtype=bool)
+        mask[self.rows(recommender)] = True
+        return mask
+
+
+def _seen_key(user_id):
+    return f'seen:{user_id}'
+
+
+def get_seen_set(user_id):
+    """The user's cached seen set, read from UserPreference only after a preference write."""
+    seen = cache.get(_seen_key(user_id))
+    if seen is None:
+        seen = SeenSet(seen_preferences().filter(user_id=user_id).values_list('movie_id', flat=True))
+        cache.set(_seen_key(user_id), seen, settings.RECOMMENDATION_CACHE_TIMEOUT)
+    return seen
+
+
+def forget_seen_set(user_id):
+    """Drop the cached set; the signals call this on write and again once the write commits."""
+    cache.delete(_seen_key(user_id))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Movie, UserPreference, RecommendationQuestion, UserAnswer
+from .models import Movie, UserPreference, RecommendationQuestion, UserAnswer, GENRE_CHOICES, LANGUAGE_CHOICES
+from .catalog import CatalogFilter
 
 class MovieBriefSerializer(serializers.ModelSerializer):
     class Meta:
@@ -33,6 +34,55 @@ class UserAnswerSerializer(serializers.ModelSerializer):
         fields = ['id', 'question', 'answer_value']
         read_only_fields = ['user']
 
-class MovieSimilarityRequestSerializer(serializers.Serializer):
+class SimilarityFilterSerializer(serializers.Serializer):
+    """Optional constraints on similarity results; see `CatalogFilter`."""
+    is_tv_series = serializers.BooleanField(required=False, allow_null=True, default=None)
+    genres = serializers.ListField(child=serializers.ChoiceField(choices=GENRE_CHOICES), required=False)
+    languages = serializers.ListField(child=serializers.ChoiceField(choices=LANGUAGE_CHOICES), required=False)
+    min_year = serializers.IntegerField(required=False, min_value=1800, max_value=2100)
+    max_year = serializers.IntegerField(required=False, min_value=1800, max_value=2100)
+    min_rating = serializers.FloatField(required=False, min_value=0, max_value=10)
+
+    def validate(self, data):
+        if data.get('min_year') is not None and data.get('max_year') is not None \
+                and data['min_year'] > data['max_year']:
+            raise serializers.ValidationError("min_year cannot be greater than max_year")
+        return data
+
+    def catalog_filter(self):
+        """The validated constraints as a CatalogFilter, or None when none were given."""
+        data = self.validated_data
+        catalog_filter = CatalogFilter(
+            is_tv_series=data.get('is_tv_series'),
+            genres=data.get('genres'),
+            languages=data.get('languages'),
+            min_year=data.get('min_year'),
+            max_year=data.get('max_year'),
+            min_rating=data.get('min_rating'),
+        )
+        return catalog_filter if catalog_filter else None
+
+
+class MovieSimilarityRequestSerializer(SimilarityFilterSerializer):
     movie_name = serializers.CharField(max_length=255)
-    limit = serializers.IntegerField(default=1, min_value=1, max_value=50) 
\ No newline at end of file
+    limit = serializers.IntegerField(default=1, min_value=1, max_value=50)
+    diversity = serializers.FloatField(default=0, min_value=0, max_value=1)
+
+
+class BatchSimilarityRequestSerializer(SimilarityFilterSerializer):
+    movies = serializers.ListField(child=serializers.JSONField(), min_length=1, max_length=20)
+    limit = serializers.IntegerField(default=10, min_value=1, max_value=50)
+    diversity = serializers.FloatField(default=0, min_value=0, max_value=1)
+
+    def validate_movies(self, value):
+        seeds = []
+        for seed in value:
+            if isinstance(seed, bool) or not isinstance(seed, (int, str)):
+                raise serializers.ValidationError("Each movie must be a movie ID or a movie name")
+            if isinstance(seed, str):
+                seed = seed.strip()
+                if not seed or len(seed) > 255:
+                    raise serializers.ValidationError("Movie names must be between 1 and 255 characters")
+            seeds.append(seed)
+        # Keep the first occurrence of every seed, in request order
+        return list(dict.fromkeys(seeds))
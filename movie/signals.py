@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Movie, UserPreference
+from .recommendations import apply_movie_change, apply_movie_delete, loaded_recommender
+from .recommendation_cache import bump_catalog_generation
+from .taste import update_taste_vector
+from .hybrid import forget_hybrid_results
+from .seen import forget_seen_set
+from .trending import preference_events, record_event
+
+
+@receiver(post_save, sender=Movie)
+def update_recommender_on_save(sender, instance, **kwargs):
+    try:
+        apply_movie_change(instance)
+        bump_catalog_generation()
+    except Exception as e:
+        print(f"Error updating recommender for movie {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender=Movie)
+def update_recommender_on_delete(sender, instance, **kwargs):
+    try:
+        apply_movie_delete(instance.pk)
+        bump_catalog_generation()
+    except Exception as e:
+        print(f"Error removing movie {instance.pk} from recommender: {e}")
+
+
+def update_taste(preference, deleted=False):
+    try:
+        update_taste_vector(preference, loaded_recommender(), deleted)
+    except Exception as e:
+        print(f"Error updating taste vector for user {preference.user_id}: {e}")
+
+
+@receiver(post_save, sender=UserPreference)
+def update_taste_on_save(sender, instance, **kwargs):
+    try:
+        update_taste(instance)
+        # Applying a preference is idempotent, so apply it again once committed, in case
+        # another worker rebuilt the vector from the old rows in between
+        transaction.on_commit(lambda: update_taste(instance))
+        forget_seen_set(instance.user_id)
+        forget_hybrid_results(instance.user_id)
+        # Also once committed: another worker may have cached results from the old rows meanwhile
+        transaction.on_commit(lambda: forget_seen_set(instance.user_id))
+        transaction.on_commit(lambda: forget_hybrid_results(instance.user_id))
+    except Exception as e:
+        print(f"Error updating taste vector for user {instance.user_id}: {e}")
+
+
+@receiver(post_delete, sender=UserPreference)
+def update_taste_on_delete(sender, instance, **kwargs):
+    try:
+        update_taste(instance, deleted=True)
+        transaction.on_commit(lambda: update_taste(instance, deleted=True))
+        forget_seen_set(instance.user_id)
+        forget_hybrid_results(instance.user_id)
+        transaction.on_commit(lambda: forget_seen_set(instance.user_id))
+        transaction.on_commit(lambda: forget_hybrid_results(instance.user_id))
+    except Exception as e:
+        print(f"Error updating taste vector for user {instance.user_id}: {e}")
+
+
+@receiver(post_init, sender=UserPreference)
+def remember_preference_state(sender, instance, **kwargs):
+    # What the row held when loaded, so post_save can tell which engagement events are new.
+    # Read from __dict__ so deferred fields are not fetched.
+    fields = instance.__dict__
+    instance._trending_state = (fields.get('liked'), fields.get('watchlist'), fields.get('rating'))
+
+
+def record_trending(user_id, movie_id, counters):
+    try:
+        for counter in counters:
+            record_event(movie_id, counter, user_id=user_id)
+    except Exception as e:
+        print(f"Error recording trending events for movie {movie_id}: {e}")
+
+
+@receiver(post_save, sender=UserPreference)
+def record_trending_events(sender, instance, created, **kwargs):
+    try:
+        counters = preference_events(instance, None if created else instance._trending_state)
+        instance._trending_state = (instance.liked, instance.watchlist, instance.rating)
+        if counters:
+            # Only count writes that commit
+            transaction.on_commit(lambda: record_trending(instance.user_id, instance.movie_id, counters))
+    except Exception as e:
+        print(f"Error recording trending events for movie {instance.movie_id}: {e}")
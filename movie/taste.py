@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.utils import timezone
+
+from .collaborative import HIGH_RATING
+from .models import UserPreference
+from .recommendation_cache import cache
+
+# Ratings at or below this pull the taste vector away from a movie
+LOW_RATING = 4.0
+
+# How long one worker may hold a user's vector for a read-modify-write
+UPDATE_LOCK_SECONDS = 10
+
+
+def preference_weight(preference):
+    """How much one preference pulls the taste vector towards (or away from) its movie."""
+    weight = 1.0 if preference.liked else 0.0
+    if preference.rating is not None:
+        if preference.rating >= HIGH_RATING:
+            weight += preference.rating / 10
+        elif preference.rating <= LOW_RATING:
+            weight -= 1 - preference.rating / 10
+    return weight
+
+
+def _decay(seconds):
+    return 0.5 ** (max(seconds, 0.0) / (settings.TASTE_HALF_LIFE_DAYS * 86400))
+
+
+class TasteVector:
+    """
+    Recency-weighted sum of the rows of a user's liked and rated movies in the
+    recommender's space. Every contribution is stored with its weight and time, and
+    the sum is kept decayed to `as_of`, so one changed preference is applied by
+    decaying the sum and swapping that movie's contribution instead of re-reading
+    every preference.
+    """
+
+    def __init__(self, revision, as_of):
+        # Movie edits change rows in place, so the vector is only valid for the exact revision
+        self.revision = revision
+        self.as_of = as_of
+        self.vector = None
+        self.contributions = {}
+
+    @classmethod
+    def build(cls, recommender, preferences, now=None):
+        taste = cls(recommender.revision, now or timezone.now())
+        for preference in preferences:
+            taste.apply(recommender, preference)
+        return taste
+
+    def _add(self, recommender, movie_id, scale):
+        row = recommender.row_for_id(movie_id)
+        if row is None or not scale:
+            return
+        contribution = recommender.row_vectors(slice(row, row + 1)) * scale
+        self.vector = contribution if self.vector is None else self.vector + contribution
+
+    def apply(self, recommender, preference):
+        """Replace the contribution of `preference`'s movie with its current weight."""
+        when = preference.updated_at or self.as_of
+        if when > self.as_of:
+            if self.vector is not None:
+                self.vector = self.vector * _decay((when - self.as_of).total_seconds())
+            self.as_of = when
+
+        previous = self.contributions.pop(preference.movie_id, None)
+        if previous is not None:
+            weight, at = previous
+            self._add(recommender, preference.movie_id, -weight * _decay((self.as_of - at).total_seconds()))
+
+        weight = preference_weight(preference)
+        if weight:
+            self.contributions[preference.movie_id] = (weight, when)
+            self._add(recommender, preference.movie_id, weight * _decay((self.as_of - when).total_seconds()))
+
+    def remove(self, recommender, movie_id):
+        previous = self.contributions.pop(movie_id, None)
+        if previous is not None:
+            weight, at = previous
+            self._add(recommender, movie_id, -weight * _decay((self.as_of - at).total_seconds()))
+
+
+def _cache_key(user_id):
+    return f'taste:{user_id}'
+
+
+def _lock_key(user_id):
+    return f'taste:lock:{user_id}'
+
+
+def _stale_key(user_id):
+    return f'taste:stale:{user_id}'
+
+
+def get_taste_vector(user_id, recommender):
+    """The user's cached taste vector, rebuilt from all preferences only when missing or stale."""
+    taste = cache.get(_cache_key(user_id))
+    if taste is None or taste.revision != recommender.revision:
+        taste = TasteVector.build(recommender, UserPreference.objects.filter(user_id=user_id))
+        cache.set(_cache_key(user_id), taste, settings.TASTE_CACHE_TIMEOUT)
+    return taste
+
+
+def update_taste_vector(preference, recommender, deleted=False):
+    """
+    Apply one written (or deleted) preference to the cached vector, if one is cached.
+    Without a loaded recommender (or with another revision) the vector is dropped instead.
+
+    Every worker shares the cached vector, so the update holds a cache lock for the user.
+    A writer that finds the lock taken marks the vector stale and drops it; the lock
+    holder drops its own result too if it sees the mark after writing, so neither
+    update is lost and the next read rebuilds the vector.
+    """
+    key, stale = _cache_key(preference.user_id), _stale_key(preference.user_id)
+    lock = _lock_key(preference.user_id)
+    if not cache.add(lock, True, UPDATE_LOCK_SECONDS):
+        cache.set(stale, True, UPDATE_LOCK_SECONDS)
+        cache.delete(key)
+        return
+    try:
+        taste = cache.get(key)
+        if taste is None:
+            return
+        if recommender is None or taste.revision != recommender.revision:
+            cache.delete(key)
+            return
+        if deleted:
+            taste.remove(recommender, preference.movie_id)
+        else:
+            taste.apply(recommender, preference)
+        cache.set(key, taste, settings.TASTE_CACHE_TIMEOUT)
+        if cache.get(stale):
+            cache.delete(key)
+    finally:
+        cache.delete(lock)
@@ -1,3 +1,1189 @@
-from django.test import TestCase
+import copy
+from datetime import timedelta
+from io import StringIO
+import json
+import os
+from unittest import mock
+import shutil
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .models import (
+    Movie, MovieNeighbor, MovieAlsoLiked, MovieTrendingScore, RecommendationQuestion, UserAnswer, UserPreference
+)
+from .recommendations import (
+    ANSWER_WEIGHTS, MovieRecommender, RecommenderNotReady, _sync_recommender, get_recommender, load_recommender,
+    loaded_recommender, rebuild_in_background, reset_recommender,
+)
+from . import recommender_store
+from .collaborative import get_als_model, reset_als_model
+from .title_index import TitleIndex, normalize_title
+from .catalog import CatalogColumns, CatalogFilter
+from .diversity import mmr_order
+from .trending import flush_trending, record_event, reset_trending
+from .benchmarks import compare_runs
+from .evaluation import ranking_metrics
+from .taste import TasteVector, get_taste_vector, preference_weight
+from .seen import SeenSet, get_seen_set
+from .recommendation_cache import CATALOG_GENERATION_KEY, cache, catalog_generation
+
+
+def create_catalog():
+    movies = [
+        ('Inception', 'تلقین', 'A thief steals corporate secrets through dream sharing technology.', 'sci-fi', 2010),
+        ('Interstellar', 'میان ستاره ای', 'Explorers travel through a wormhole in space to save humanity.', 'sci-fi', 2014),
+        ('The Dark Knight', 'شوالیه تاریکی', 'Batman faces the Joker, a criminal mastermind in Gotham.', 'action', 2008),
+        ('The Shawshank Redemption', 'رستگاری در شاوشنک', 'Two imprisoned men bond over years in prison.', 'drama', 1994),
+        ('The Prestige', 'حیثیت', 'Two rival magicians in London engage in a dangerous dream of secrets.', 'drama', 2006),
+    ]
+    return [
+        Movie.objects.create(
+            title=title, title_fa=title_fa, overview=overview, genre=genre, release_year=year,
+            director='Christopher Nolan' if title != 'The Shawshank Redemption' else 'Frank Darabont',
+            imdb_rating=8.5, cast=[], keywords=[],
+        )
+        for title, title_fa, overview, genre, year in movies
+    ]
+
+
+class RecommenderTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.artifact_root = tempfile.mkdtemp()
+        # Requests load the model themselves, so every test sees it without polling
+        self.settings_override = override_settings(RECOMMENDER_ROOT=self.artifact_root,
+                                                   RECOMMENDER_BACKGROUND_LOAD=False)
+        self.settings_override.enable()
+        self.movies = create_catalog()
+        reset_recommender()
+        reset_als_model()
+        reset_trending()
+
+    def tearDown(self):
+        reset_recommender()
+        reset_als_model()
+        reset_trending()
+        self.settings_override.disable()
+        shutil.rmtree(self.artifact_root, ignore_errors=True)
+
+
+class RecommenderArtifactTest(RecommenderTestCase):
+    def test_build_command_writes_versioned_artifact(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        path = recommender_store.latest_version_dir()
+        self.assertIsNotNone(path)
+        manifest = recommender_store.read_manifest(path)
+        self.assertEqual(manifest['shape'][0], len(self.movies))
+
+    def test_loaded_artifact_matches_fresh_fit(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        loaded = load_recommender()
+        fresh = MovieRecommender()
+        self.assertIsNotNone(loaded.version)
+        self.assertEqual(
+            [m.id for m in loaded.find_similar_movies('Inception', 3)],
+            [m.id for m in fresh.find_similar_movies('Inception', 3)],
+        )
+        self.assertNotIn(self.movies[0], loaded.find_similar_movies('Inception', 3))
+
+    def test_titles_load_from_the_artifact_without_queries(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        path = recommender_store.latest_version_dir()
+        with self.assertNumQueries(0):
+            loaded = MovieRecommender.load(path)
+        self.assertEqual(loaded.title_index.lookup('رستگاری در شاوشنک'), self.movies[3].id)
+
+        # Artifacts saved without titles read them from the whole table instead
+        os.remove(os.path.join(path, 'titles.txt'))
+        self.assertEqual(MovieRecommender.load(path).title_index.lookup('Prestige'), self.movies[4].id)
+
+    def test_loaded_artifact_is_shared(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        loaded = load_recommender()
+        self.assertTrue(loaded.memory_mapped)
+        self.assertTrue(recommender_store.is_memory_mapped(loaded.tfidf.idf_))
+        self.assertFalse(load_recommender(mmap=False).memory_mapped)
+
+    def test_edits_keep_the_artifact_shared(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        loaded = load_recommender()
+        inception, dark_knight = self.movies[0], self.movies[2]
+        inception.overview = 'Batman faces the Joker in Gotham.'
+        edited = loaded.with_movies([inception]).without_movies([self.movies[4].id])
+        edited = edited.with_movies([inception, Movie(id=999999, title='Memento', overview='Batman in Gotham.')])
+
+        self.assertTrue(edited.memory_mapped)
+        self.assertIs(edited.feature_matrix, loaded.feature_matrix)
+        self.assertEqual(edited._edits.shape[0], 2)
+        self.assertIsNone(edited.row_for_id(self.movies[4].id))
+        # Results through the overlay match a model rebuilt with the same vectors
+        rebuilt = copy.copy(edited)
+        rebuilt.feature_matrix, rebuilt._edits, rebuilt._sources, rebuilt._targets = \
+            edited.row_vectors(slice(None)), None, None, None
+        row = edited.row_for_id(dark_knight.id)
+        self.assertEqual(edited.movie_ids[edited.similar_rows(row, 1)].tolist(), [inception.id])
+        for limit in (2, 4):
+            self.assertEqual(edited.similar_rows(row, limit).tolist(), rebuilt.similar_rows(row, limit).tolist())
+            self.assertEqual(edited.similar_rows_batch([row], limit)[0].tolist(),
+                             rebuilt.similar_rows_batch([row], limit)[0].tolist())
+
+    def test_streamed_parallel_fit_matches_in_memory_fit(self):
+        streamed = MovieRecommender(prepare=False)
+        streamed.fit(Movie.objects.all(), chunk_size=2, workers=2)
+        in_memory = MovieRecommender(prepare=False)
+        in_memory.fit(list(Movie.objects.all()))
+        self.assertEqual(list(streamed.movie_ids), list(in_memory.movie_ids))
+        self.assertEqual(list(streamed.catalog.genre), list(in_memory.catalog.genre))
+        self.assertAlmostEqual(abs(streamed.feature_matrix - in_memory.feature_matrix).sum(), 0)
+
+    def test_results_are_hydrated_from_ids(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        loaded = load_recommender()
+        self.assertFalse(hasattr(loaded, 'movies'))
+        self.movies[4].delete()
+        rows = loaded.rows_for_ids([movie.id for movie in self.movies])
+        self.assertEqual(len(rows), len(self.movies))
+        self.assertEqual(loaded.hydrate(rows), self.movies[:4])
+
+    def test_lsa_embeddings_round_trip(self):
+        call_command('build_recommender_index', lsa_dim=3, stdout=StringIO())
+        loaded = load_recommender()
+        self.assertTrue(loaded.dense)
+        self.assertEqual(loaded.feature_matrix.shape, (len(self.movies), 3))
+        self.assertEqual(loaded.feature_matrix.dtype, np.float32)
+        self.assertTrue(loaded.feature_matrix.flags['C_CONTIGUOUS'])
+        self.assertTrue(loaded.memory_mapped)
+        np.testing.assert_allclose(np.linalg.norm(loaded.feature_matrix, axis=1), 1, rtol=1e-5)
+
+        fresh = MovieRecommender(prepare=False)
+        fresh.fit(Movie.objects.all(), embedding_dim=3)
+        row = loaded.row_for_id(self.movies[0].id)
+        self.assertEqual(list(loaded.similar_rows(row, 2)), list(fresh.similar_rows(row, 2)))
+        self.assertEqual(loaded.similar_rows_batch([row], 2)[0].tolist(), loaded.similar_rows(row, 2).tolist())
+
+        edited = loaded.with_movies([self.movies[1]])
+        np.testing.assert_allclose(edited.row_vectors(slice(None)), loaded.feature_matrix, atol=1e-5)
+        self.assertEqual(edited.similar_rows_batch([row], 2)[0].tolist(), loaded.similar_rows(row, 2).tolist())
+
+    def test_dense_mode_memory_report_and_neighbor_blocks(self):
+        call_command('build_recommender_index', lsa_dim=3, stdout=StringIO())
+        out = StringIO()
+        call_command('recommender_memory', stdout=out)
+        self.assertIn('rss', out.getvalue())
+
+        loaded = load_recommender()
+        expected = [(row, rows.tolist()) for row, rows, _ in loaded.iter_top_neighbors(k=2)]
+        # One row per block once a block of all rows would exceed the budget
+        with mock.patch('movie.recommendations.DENSE_BLOCK_BYTES', 4 * len(loaded)):
+            self.assertEqual([(row, rows.tolist()) for row, rows, _ in loaded.iter_top_neighbors(k=2)], expected)
+
+    def test_lsa_components_keep_the_most_used_columns(self):
+        recommender = MovieRecommender()
+        document_frequency = np.bincount(recommender.feature_matrix.indices)
+        recommender.fit_embeddings(dim=2, max_columns=4)
+        columns, components = recommender.projection
+        self.assertEqual(components.shape, (2, 4))
+        self.assertEqual(list(columns), sorted(columns))
+        self.assertGreaterEqual(document_frequency[columns].min(), np.sort(document_frequency)[-4])
+
+    def test_memory_report(self):
+        out = StringIO()
+        call_command('recommender_memory', stdout=out)
+        self.assertIn('rss', out.getvalue())
+
+        url = reverse('movie:recommender-memory')
+        user = get_user_model().objects.create_user(email='memory@example.com', password='TestPassword123!')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(response.data['memory']['rss'], 0)
+
+    def test_ann_backend_is_saved_with_recall_report(self):
+        call_command('build_recommender_index', ann='ivf', lists=2, probes=2, recall_queries=5, stdout=StringIO())
+        path = recommender_store.latest_version_dir()
+        report = recommender_store.read_json(path, 'ann_report.json')
+        self.assertEqual(report['probes'][-1]['recall'], 1.0)
+
+        loaded = load_recommender()
+        self.assertEqual(loaded.ann_index.name, 'ivf')
+        row = loaded.row_for_id(self.movies[0].id)
+        self.assertEqual(
+            list(loaded.similar_rows(row, 3, probes=2)),
+            list(loaded.similar_rows(row, 3, exact=True)),
+        )
+
+    def test_probes_setting_is_read_at_query_time(self):
+        call_command('build_recommender_index', ann='ivf', lists=3, probes=1, recall_queries=0, stdout=StringIO())
+        loaded = load_recommender()
+        vector = loaded.feature_matrix[:1]
+        with override_settings(RECOMMENDER_ANN={**settings.RECOMMENDER_ANN, 'PROBES': 3}):
+            self.assertEqual(len(loaded.ann_index.candidate_ids(vector)), len(self.movies))
+        with override_settings(RECOMMENDER_ANN={**settings.RECOMMENDER_ANN, 'PROBES': 1}):
+            self.assertLess(len(loaded.ann_index.candidate_ids(vector)), len(self.movies))
+
+
+class RecommenderIncrementalUpdateTest(RecommenderTestCase):
+    def test_shared_instance_is_reused(self):
+        self.assertIs(get_recommender(), get_recommender())
+
+    def test_saved_movie_is_swapped_in_without_refit(self):
+        recommender = get_recommender()
+        idf = recommender.tfidf.idf_
+
+        inception = self.movies[0]
+        inception.overview = 'Batman faces the Joker in Gotham.'
+        inception.save()
+        sequel = Movie.objects.create(title='Inception Returns', overview='A thief steals secrets through dream sharing.')
+
+        updated = get_recommender()
+        self.assertIsNot(updated, recommender)
+        self.assertIs(updated.tfidf.idf_, idf)
+        self.assertEqual(list(updated.movie_ids), sorted(m.id for m in self.movies + [sequel]))
+        row = updated.row_for_id(inception.id)
+        expected = updated.vectorize([inception])
+        self.assertEqual(updated.row_vectors([row]).nnz, expected.nnz)
+        self.assertEqual(updated.find_similar_movies('The Dark Knight', 1), [inception])
+
+    def test_queued_edits_are_applied_in_one_batch(self):
+        recommender = get_recommender()
+        with mock.patch.object(MovieRecommender, 'with_movies', autospec=True,
+                               side_effect=MovieRecommender.with_movies) as with_movies:
+            added = [Movie.objects.create(title=f'Sequel {number}', overview='A thief steals secrets.')
+                     for number in range(3)]
+            updated = get_recommender()
+        self.assertEqual(with_movies.call_count, 1)
+        self.assertEqual(len(updated), len(recommender) + len(added))
+
+    def test_sync_picks_up_edits_that_commit_after_a_later_local_edit(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        recommender = MovieRecommender()
+        synced_at = recommender.synced_at
+
+        def edit(movie, overview, seconds):
+            Movie.objects.filter(id=movie.id).update(overview=overview, updated_at=synced_at + timedelta(seconds=seconds))
+            movie.refresh_from_db()
+            return movie
+
+        def reflects(model, movie):
+            row = model.row_for_id(movie.id)
+            return (model.row_vectors([row]) != model.vectorize([movie])).nnz == 0
+
+        # This worker applies its own edit; another worker's earlier edit commits afterwards
+        recommender = recommender.with_movies([edit(shawshank, 'Two men bond in prison.', 10)])
+        edit(inception, 'Batman faces the Joker in Gotham.', 5)
+        synced = _sync_recommender(recommender)
+        self.assertTrue(reflects(synced, inception))
+
+        # Late commits within the overlap are read again, edits already applied are not
+        edit(prestige, 'Magicians in London.', 8)
+        synced = _sync_recommender(synced)
+        self.assertTrue(reflects(synced, prestige))
+        self.assertEqual(_sync_recommender(synced).revision, synced.revision)
+
+    def test_deleted_movie_is_removed(self):
+        get_recommender()
+        removed_id = self.movies[4].id
+        self.movies[4].delete()
+        recommender = get_recommender()
+        self.assertIsNone(recommender.row_for_id(removed_id))
+        self.assertEqual(len(recommender), len(self.movies) - 1)
+
+
+class RecommenderRebuildTest(RecommenderTestCase):
+    def test_published_version_is_swapped_in_on_next_sync(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        old = get_recommender()
+        first_version = old.version
+
+        call_command('build_recommender_index', stdout=StringIO())
+        current = recommender_store.current_version_dir()
+        self.assertNotEqual(recommender_store.version_name(current), first_version)
+        # Requests holding the old model keep a working one
+        self.assertEqual(old.version, first_version)
+        self.assertTrue(old.find_similar_movies('Inception', 2))
+
+        with override_settings(RECOMMENDER_SYNC_INTERVAL=0):
+            self.assertEqual(get_recommender().version, recommender_store.version_name(current))
+
+    def test_pointer_wins_over_newest_directory_and_old_versions_are_pruned(self):
+        for _ in range(3):
+            call_command('build_recommender_index', keep=2, stdout=StringIO())
+        versions = recommender_store.list_versions()
+        self.assertEqual(len(versions), 2)
+
+        recommender_store.publish_version(recommender_store.artifact_root() + '/' + versions[0])
+        self.assertEqual(load_recommender().version, versions[0])
+
+    def test_scheduled_rebuild_survives_database_errors(self):
+        err = StringIO()
+        command = 'movie.management.commands.build_recommender_index'
+        with mock.patch(f'{command}.Command.build', side_effect=[OperationalError('server closed'), None]) as build, \
+                mock.patch(f'{command}.time.sleep', side_effect=[None, KeyboardInterrupt]), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('build_recommender_index', every=1, stdout=StringIO(), stderr=err)
+        self.assertEqual(build.call_count, 2)
+        self.assertIn('server closed', err.getvalue())
+
+    def test_background_rebuild_runs_in_a_child_process(self):
+        with mock.patch('movie.recommendations.subprocess.Popen') as popen:
+            popen.return_value.poll.return_value = None
+            self.assertTrue(rebuild_in_background())
+            self.assertFalse(rebuild_in_background())
+            popen.return_value.poll.return_value = 0
+            self.assertTrue(rebuild_in_background())
+        self.assertEqual(popen.call_count, 2)
+        self.assertEqual(popen.call_args[0][0][-1], 'build_recommender_index')
+
+    def test_rebuilds_are_exclusive_across_processes(self):
+        # Held the way the command of another worker holds it
+        with recommender_store.rebuild_lock() as acquired, \
+                mock.patch('movie.recommendations.subprocess.Popen') as popen:
+            self.assertTrue(acquired)
+            self.assertFalse(rebuild_in_background())
+            with self.assertRaises(CommandError):
+                call_command('build_recommender_index', stdout=StringIO())
+        popen.assert_not_called()
+        self.assertIsNone(recommender_store.latest_version_dir())
+
+    def test_first_load_runs_in_the_background(self):
+        model = MovieRecommender()
+        release = threading.Event()
+
+        def slow_load():
+            release.wait(5)
+            return model
+
+        with override_settings(RECOMMENDER_BACKGROUND_LOAD=True), \
+                mock.patch('movie.recommendations.load_recommender', side_effect=slow_load):
+            with self.assertRaises(RecommenderNotReady):
+                get_recommender(background=True)
+            response = self.client.post(reverse('movie:similar-movies'), {'movie_name': 'Inception'})
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            release.set()
+            for _ in range(100):
+                if loaded_recommender() is not None:
+                    break
+                time.sleep(0.05)
+        self.assertIs(get_recommender(background=True), model)
+
+    def test_failed_sync_keeps_serving_previous_model(self):
+        recommender = get_recommender()
+        with override_settings(RECOMMENDER_SYNC_INTERVAL=0), \
+                mock.patch('movie.recommendations._sync_recommender', side_effect=RuntimeError('boom')):
+            self.assertIs(get_recommender(), recommender)
+
+
+class MovieNeighborTableTest(RecommenderTestCase):
+    def test_table_matches_live_similarity(self):
+        live = get_recommender().similar_to_movie(self.movies[0].id, 3)
+        call_command('build_movie_neighbors', top_k=3, block_size=2, stdout=StringIO())
+        stored = MovieNeighbor.objects.filter(movie=self.movies[0]).order_by('rank')
+        self.assertEqual([n.neighbor for n in stored], live)
+        self.assertFalse(MovieNeighbor.objects.filter(movie=self.movies[0], neighbor=self.movies[0]).exists())
+
+    def test_similar_endpoint(self):
+        call_command('build_movie_neighbors', top_k=3, stdout=StringIO())
+        url = reverse('movie:movie-neighbors', args=[self.movies[0].id])
+        response = self.client.get(url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+        response = self.client.get(reverse('movie:movie-neighbors', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TitleIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = TitleIndex(
+            [1, 2, 3, 4],
+            [
+                ('The Dark Knight Rises', 'شوالیه تاریکی برمی‌خیزد'),
+                ('The Dark Knight', 'شوالیه تاریکی'),
+                ('Darkness', None),
+                ('Knight and Day', 'شوالیه و روز'),
+            ],
+        )
+
+    def test_exact_match_beats_prefix_and_substring(self):
+        self.assertEqual(self.index.lookup('the dark knight'), 2)
+        self.assertEqual(self.index.lookup('Dark'), 3)
+        self.assertEqual([match[0] for match in self.index.search('knight')], [4, 2, 1])
+
+    def test_persian_titles_are_normalized(self):
+        self.assertEqual(normalize_title('شواليه تاريكي'), 'شوالیه تاریکی')
+        self.assertEqual(self.index.lookup('شواليه تاريكي'), 2)
+        self.assertEqual(self.index.lookup('تاریکی برمی خیزد'), 1)
+
+    def test_fuzzy_match_when_nothing_contains_the_query(self):
+        self.assertEqual(self.index.lookup('The Dark Knigt'), 2)
+        self.assertIsNone(self.index.lookup('Interstellar'))
+
+    def test_updates_go_through_overlay(self):
+        updated = self.index.updated(movies=[Movie(id=3, title='Interstellar')], removed_ids=[2])
+        self.assertEqual(updated.lookup('Interstellar'), 3)
+        self.assertIsNone(updated.lookup('Darkness'))
+        self.assertEqual(updated.lookup('the dark knight'), 1)
+        self.assertEqual(self.index.lookup('Darkness'), 3)
+
+    def test_large_overlay_is_folded_into_the_base(self):
+        with mock.patch('movie.title_index.MAX_OVERLAY_MOVIES', 2):
+            updated = self.index.updated(movies=[Movie(id=3, title='Interstellar')], removed_ids=[2])
+            self.assertIsNotNone(updated._overlay)
+            updated = updated.updated(movies=[Movie(id=5, title='Memento')])
+        self.assertIsNone(updated._overlay)
+        self.assertFalse(updated._hidden_ids)
+        self.assertEqual(updated.lookup('Memento'), 5)
+        self.assertEqual(updated.lookup('Interstellar'), 3)
+        self.assertEqual(updated.lookup('the dark knight'), 1)
+        self.assertEqual(updated.lookup('Knight and Day'), 4)
+
+
+class QuestionnaireScoringTest(RecommenderTestCase):
+    def answer(self, question_text, question_type, value):
+        question = RecommendationQuestion.objects.create(question_text=question_text, question_type=question_type)
+        return UserAnswer(question=question, answer_value=value)
+
+    def test_scores_rank_best_matches_first(self):
+        Movie.objects.filter(id=self.movies[1].id).update(is_tv_series=True)
+        answers = [
+            self.answer('Which genres do you like?', 'multiple', ['sci-fi', 'drama']),
+            self.answer('Release year range', 'range', [2005, 2012]),
+            self.answer('Movie or series type?', 'single', 'movie'),
+        ]
+        recommended = MovieRecommender().get_recommendations_from_answers(answers, limit=3)
+        # Inception and The Prestige match every criterion; Shawshank misses the year range and
+        # beats Interstellar, which is a series outside the range
+        self.assertEqual(recommended, [self.movies[0], self.movies[4], self.movies[3]])
+
+    def test_prefiltered_candidates_rank_like_a_full_scan(self):
+        recommender = MovieRecommender()
+        answers = [
+            self.answer('Which genres do you like?', 'multiple', ['drama']),
+            self.answer('Release year range', 'range', [2000, 2020]),
+        ]
+        preferences = recommender._process_user_answers(answers)
+        candidates, _ = recommender.answer_candidates(preferences, ANSWER_WEIGHTS, 1)
+        self.assertEqual(list(recommender.movie_ids[candidates]), [self.movies[4].id])
+
+        full_scan = recommender.answer_scores(answers)
+        full_scan[full_scan <= 0] = -np.inf
+        for limit in (1, 2, 4):
+            self.assertEqual(
+                list(recommender.answer_rows(answers, limit)),
+                list(recommender._top_rows(full_scan.copy(), limit)),
+            )
+
+    def test_widening_keeps_rows_that_can_still_outscore_the_candidates(self):
+        # Three Persian dramas in the year range miss only the rating (0.8); twelve
+        # old, well rated series miss the year, language and type (0.6)
+        close = [
+            Movie.objects.create(title=f'Close {i}', genre='drama', release_year=2010, original_language='fa',
+                                 imdb_rating=5, cast=[], keywords=[])
+            for i in range(3)
+        ]
+        for i in range(12):
+            Movie.objects.create(title=f'Far {i}', genre='drama', release_year=1980, is_tv_series=True,
+                                 imdb_rating=9, cast=[], keywords=[])
+        recommender = MovieRecommender()
+        answers = [
+            self.answer('Which genres do you like?', 'multiple', ['drama']),
+            self.answer('Release year range', 'range', [2000, 2020]),
+            self.answer('Minimum rating', 'range', [8]),
+            self.answer('Which languages?', 'multiple', ['fa']),
+            self.answer('Movie or series type?', 'single', 'movie'),
+        ]
+        full_scan = recommender.answer_scores(answers)
+        full_scan[full_scan <= 0] = -np.inf
+        close_rows = recommender.rows_for_ids([movie.id for movie in close])
+        for exclude in (None, close_rows[:1]):
+            for limit in (1, 3, 5, 10, 20):
+                expected = recommender._top_rows(full_scan.copy(), limit, exclude)
+                self.assertEqual(list(recommender.answer_rows(answers, limit, exclude_rows=exclude)), list(expected))
+        self.assertTrue(set(close_rows) <= set(recommender.answer_rows(answers, 10)))
+
+    def test_movies_without_any_match_are_left_out(self):
+        answers = [self.answer('Which languages?', 'multiple', ['fa'])]
+        self.assertEqual(MovieRecommender().get_recommendations_from_answers(answers), [])
+
+    def test_loaded_artifact_scores_like_fresh_fit(self):
+        call_command('build_recommender_index', stdout=StringIO())
+        answers = [self.answer('Minimum rating', 'range', [8])]
+        self.assertEqual(
+            load_recommender().get_recommendations_from_answers(answers, limit=10),
+            MovieRecommender().get_recommendations_from_answers(answers, limit=10),
+        )
+
+
+class BatchSimilarMoviesTest(RecommenderTestCase):
+    def test_batch_matches_single_requests(self):
+        recommender = get_recommender()
+        results = recommender.find_similar_movies_batch(['Inception', self.movies[2].id, 'Unknown Title'], 2)
+        self.assertIsNone(results[2])
+        self.assertEqual(results[0], recommender.find_similar_movies('Inception', 2))
+        self.assertEqual(results[1], recommender.similar_to_movie(self.movies[2].id, 2))
+
+    def test_batch_uses_the_neighbor_table_like_single_requests(self):
+        call_command('build_movie_neighbors', top_k=3, stdout=StringIO())
+        stored = MovieNeighbor.objects.get(movie=self.movies[0], rank=0)
+        stored.neighbor = self.movies[3]
+        stored.save()
+        recommender = get_recommender()
+        single = recommender.similar_to_movie(self.movies[0].id, 3)
+        self.assertEqual(single[0], self.movies[3])
+        self.assertEqual(recommender.find_similar_movies_batch([self.movies[0].id], 3), [single])
+
+    def test_batch_endpoint(self):
+        response = self.client.post(
+            reverse('movie:similar-movies-batch'),
+            {'movies': ['Inception', self.movies[1].id, 'Unknown Title'], 'limit': 2},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry['movie'] for entry in response.data['results']], ['Inception', self.movies[1].id])
+        self.assertEqual(response.data['not_found'], ['Unknown Title'])
+
+        # An id and the same id as a string are separate seeds
+        seed = self.movies[1].id
+        response = self.client.post(
+            reverse('movie:similar-movies-batch'), {'movies': [seed, str(seed)], 'limit': 2}, format='json'
+        )
+        self.assertEqual([entry['movie'] for entry in response.data['results']], [seed])
+        self.assertEqual(response.data['not_found'], [str(seed)])
+
+        response = self.client.post(reverse('movie:similar-movies-batch'), {'movies': [[1]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FilteredSimilarityTest(RecommenderTestCase):
+    def test_filter_rows_intersects_partitions_and_ranges(self):
+        catalog = CatalogColumns.from_movies(self.movies)
+        self.assertEqual(list(catalog.filter_rows(CatalogFilter(genres=['drama']))), [3, 4])
+        self.assertEqual(list(catalog.filter_rows(CatalogFilter(genres=['drama'], min_year=2000))), [4])
+        self.assertEqual(list(catalog.filter_rows(CatalogFilter(is_tv_series=True))), [])
+        self.assertEqual(len(catalog.filter_rows(CatalogFilter(min_rating=9))), 0)
+
+    def test_filtered_results_fill_the_limit_from_the_partition(self):
+        recommender = get_recommender()
+        dramas = CatalogFilter(genres=['drama'])
+        ids = [movie.id for movie in recommender.find_similar_movies('Inception', 5, dramas)]
+        self.assertEqual(ids[0], self.movies[4].id)
+        self.assertLessEqual(set(ids), {self.movies[3].id, self.movies[4].id})
+
+        # ANN candidates that miss the partition fall back to scanning it
+        inception_only = np.array([self.movies[0].id], dtype=np.int64)
+        with override_settings(RECOMMENDER_ANN={**settings.RECOMMENDER_ANN, 'MIN_ROWS': 0}), \
+                mock.patch.object(recommender.ann_index, 'candidate_ids', return_value=inception_only):
+            results = recommender.find_similar_movies_batch(['Inception'], 1, dramas)
+        self.assertEqual([movie.id for movie in results[0]], [self.movies[4].id])
+
+    def test_similarity_endpoint_accepts_filters(self):
+        self.movies[3].is_tv_series = True
+        self.movies[3].save()
+        response = self.client.post(
+            reverse('movie:similar-movies'),
+            {'movie_name': 'Inception', 'limit': 5, 'is_tv_series': True},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['id'] for m in response.data['results']], [self.movies[3].id])
+
+        response = self.client.post(
+            reverse('movie:similar-movies'),
+            {'movie_name': 'Inception', 'min_year': 2010, 'max_year': 2000},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DiversityRerankTest(RecommenderTestCase):
+    def test_mmr_skips_near_duplicates(self):
+        relevance = np.array([1.0, 0.99, 0.5], dtype=np.float32)
+        similarity = np.array([[1, 1, 0], [1, 1, 0], [0, 0, 1]], dtype=np.float32)
+        self.assertEqual(list(mmr_order(relevance, similarity, 2, 0)), [0, 1])
+        self.assertEqual(list(mmr_order(relevance, similarity, 2, 0.5)), [0, 2])
+
+    def test_diversity_keeps_the_best_match_first(self):
+        recommender = get_recommender()
+        plain = recommender.find_similar_movies('Inception', 3)
+        diverse = recommender.find_similar_movies('Inception', 3, diversity=0.7)
+        self.assertEqual(len(diverse), 3)
+        self.assertEqual(diverse[0], plain[0])
+
+    def test_endpoints_validate_diversity(self):
+        response = self.client.post(reverse('movie:similar-movies'),
+                                    {'movie_name': 'Inception', 'limit': 2, 'diversity': 0.5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('movie:similar-movies'),
+                                    {'movie_name': 'Inception', 'diversity': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        user = get_user_model().objects.create_user(email='diverse@example.com', password='TestPassword123!')
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('movie:taste-recommendations'), {'diversity': 'lots'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AlsoLikedTest(RecommenderTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        liked_by_user = [
+            [inception, interstellar, prestige],
+            [inception, interstellar],
+            [inception, prestige, dark_knight],
+            [interstellar, shawshank],
+        ]
+        for i, movies in enumerate(liked_by_user):
+            user = User.objects.create_user(email=f'user{i}@example.com', password='TestPassword123!')
+            for movie in movies:
+                UserPreference.objects.create(user=user, movie=movie, liked=True)
+        # A low rating is not a positive signal
+        UserPreference.objects.create(user=user, movie=dark_knight, rating=3)
+
+    def test_build_command_ranks_co_liked_movies(self):
+        call_command('build_also_liked', top_k=5, min_support=2, stdout=StringIO())
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        rows = MovieAlsoLiked.objects.filter(movie=inception).order_by('rank')
+        # Both were co-liked twice; The Prestige is less popular overall, so it scores higher
+        self.assertEqual([row.neighbor for row in rows], [prestige, interstellar])
+        self.assertFalse(MovieAlsoLiked.objects.filter(movie=dark_knight).exists())
+
+    def test_movie_detail_includes_also_liked(self):
+        call_command('build_also_liked', min_support=1, stdout=StringIO())
+        response = self.client.get(reverse('movie:movie-detail', args=[self.movies[3].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['id'] for m in response.data['also_liked']], [self.movies[1].id])
+
+
+class PersonalRecommendationsTest(RecommenderTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        liked_by_user = [
+            [inception, interstellar],
+            [inception, prestige],
+            [interstellar, prestige],
+            [dark_knight, shawshank],
+            [dark_knight],
+        ]
+        self.users = []
+        for i, movies in enumerate(liked_by_user):
+            user = User.objects.create_user(email=f'user{i}@example.com', password='TestPassword123!')
+            for movie in movies:
+                UserPreference.objects.create(user=user, movie=movie, liked=True)
+            self.users.append(user)
+
+    def test_train_command_saves_memory_mapped_factors(self):
+        out = StringIO()
+        call_command('train_als', factors=4, epochs=3, workers=2, stdout=out)
+        self.assertIn('epoch 3/3', out.getvalue())
+
+        model = get_als_model()
+        self.assertEqual(model.user_factors.shape, (5, 4))
+        self.assertEqual(model.item_factors.dtype, np.float32)
+        self.assertIsInstance(model.item_factors, np.memmap)
+
+    def test_personal_recommendations_follow_taste_and_skip_seen(self):
+        call_command('train_als', factors=4, epochs=10, stdout=StringIO())
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(reverse('movie:personal-recommendations'), {'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['id'] for m in response.data['results']], [self.movies[4].id])
+
+    def test_user_without_preferences_gets_404(self):
+        call_command('train_als', factors=4, epochs=1, stdout=StringIO())
+        user = get_user_model().objects.create_user(email='new@example.com', password='TestPassword123!')
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('movie:personal-recommendations'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TasteRecommendationsTest(RecommenderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(email='taste@example.com', password='TestPassword123!')
+        self.client.force_authenticate(self.user)
+
+    def recommended_ids(self, limit=4):
+        response = self.client.get(reverse('movie:taste-recommendations'), {'limit': limit})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [m['id'] for m in response.data['results']]
+
+    def test_likes_pull_towards_similar_unseen_movies(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        self.client.post(reverse('movie:like-movie', args=[inception.id]))
+        ids = self.recommended_ids()
+        self.assertNotIn(inception.id, ids)
+        self.assertNotEqual(ids[0], shawshank.id)
+
+    def test_writes_update_the_cached_vector_incrementally(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        self.client.post(reverse('movie:like-movie', args=[inception.id]))
+        self.recommended_ids()
+
+        self.client.post(reverse('movie:rate-movie', args=[prestige.id]), {'rating': 9})
+        with mock.patch.object(TasteVector, 'build') as build:
+            ids = self.recommended_ids()
+        build.assert_not_called()
+        self.assertNotIn(prestige.id, ids)
+        taste = get_taste_vector(self.user.id, get_recommender())
+        self.assertEqual(set(taste.contributions), {inception.id, prestige.id})
+
+        UserPreference.objects.filter(user=self.user, movie=inception).delete()
+        taste = get_taste_vector(self.user.id, get_recommender())
+        self.assertEqual(set(taste.contributions), {prestige.id})
+
+    def test_concurrent_writers_drop_the_shared_vector(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        self.client.post(reverse('movie:like-movie', args=[inception.id]))
+        self.recommended_ids()
+
+        # Another worker is in the middle of updating this user's vector
+        cache.add(f'taste:lock:{self.user.id}', True)
+        self.client.post(reverse('movie:rate-movie', args=[prestige.id]), {'rating': 9})
+        self.assertIsNone(cache.get(f'taste:{self.user.id}'))
+        cache.delete(f'taste:lock:{self.user.id}')
+
+        taste = get_taste_vector(self.user.id, get_recommender())
+        self.assertEqual(set(taste.contributions), {inception.id, prestige.id})
+
+    def test_writes_are_applied_again_on_commit(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        self.client.post(reverse('movie:like-movie', args=[inception.id]))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse('movie:rate-movie', args=[prestige.id]), {'rating': 9})
+        self.assertTrue(callbacks)
+        taste = get_taste_vector(self.user.id, get_recommender())
+        self.assertEqual(set(taste.contributions), {inception.id, prestige.id})
+
+    def test_catalog_edits_rebuild_the_vector(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        self.client.post(reverse('movie:like-movie', args=[inception.id]))
+        self.recommended_ids()
+
+        inception.overview = 'A thief enters dreams to plant an idea.'
+        inception.save()
+        with mock.patch.object(TasteVector, 'build', wraps=TasteVector.build) as build:
+            self.recommended_ids()
+        build.assert_called()
+
+    def test_low_ratings_push_away(self):
+        self.assertLess(preference_weight(UserPreference(rating=2)), 0)
+        self.assertGreater(preference_weight(UserPreference(liked=True, rating=9)), 1)
+        self.assertEqual(preference_weight(UserPreference(rating=6)), 0)
+
+    def test_user_without_preferences_gets_404(self):
+        response = self.client.get(reverse('movie:taste-recommendations'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HybridRecommendationsTest(RecommenderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(email='hybrid@example.com', password='TestPassword123!')
+        self.client.force_authenticate(self.user)
+        question = RecommendationQuestion.objects.create(
+            question_text='Which genres do you like?', question_type='multiple'
+        )
+        self.client.post(reverse('movie:user-answers'),
+                         [{'question': question.id, 'answer_value': ['drama']}], format='json')
+        self.client.post(reverse('movie:like-movie', args=[self.movies[0].id]))
+
+    def recommend(self, **params):
+        response = self.client.get(reverse('movie:hybrid-recommendations'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_blends_answers_and_likes_and_skips_seen(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        ids = [m['id'] for m in self.recommend().data['results']]
+        # The Prestige is a drama and close to Inception, so both signals agree on it
+        self.assertEqual(ids[0], prestige.id)
+        self.assertNotIn(inception.id, ids)
+
+        ids = [m['id'] for m in self.recommend(content=0).data['results']]
+        self.assertEqual(set(ids), {shawshank.id, prestige.id})
+
+    def test_repeat_requests_are_cached_until_preferences_change(self):
+        self.recommend()
+        with mock.patch.object(MovieRecommender, 'answer_scores') as score:
+            self.recommend()
+        score.assert_not_called()
+
+        self.client.post(reverse('movie:like-movie', args=[self.movies[4].id]))
+        ids = [m['id'] for m in self.recommend().data['results']]
+        self.assertNotIn(self.movies[4].id, ids)
+
+    def test_results_cached_before_commit_are_dropped_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('movie:like-movie', args=[self.movies[4].id]))
+        # Another worker reads the preferences before the like commits
+        self.recommend()
+        for callback in callbacks:
+            callback()
+        with mock.patch.object(MovieRecommender, 'answer_scores', wraps=get_recommender().answer_scores) as score:
+            self.recommend()
+        score.assert_called()
+
+    def test_catalog_edits_change_the_signature(self):
+        self.recommend()
+        self.movies[3].overview = 'A banker escapes from prison.'
+        self.movies[3].save()
+        with mock.patch.object(MovieRecommender, 'answer_scores', wraps=get_recommender().answer_scores) as score:
+            self.recommend()
+        score.assert_called()
+
+    @override_settings(DEBUG=True)
+    def test_debug_mode_reports_stage_timings(self):
+        timings = self.recommend().data['timings']
+        self.assertEqual(set(timings), {'candidates_ms', 'scoring_ms', 'hydrate_ms'})
+
+    def test_negative_weight_is_rejected(self):
+        response = self.client.get(reverse('movie:hybrid-recommendations'), {'content': -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_finite_weight_is_rejected(self):
+        for value in ('inf', 'nan'):
+            response = self.client.get(reverse('movie:hybrid-recommendations'), {'collaborative': value})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DescribeRecommendationsTest(RecommenderTestCase):
+    def describe(self, q, **params):
+        return self.client.get(reverse('movie:describe-recommendations'), {'q': q, **params})
+
+    def test_description_ranks_matching_movies(self):
+        response = self.describe('Magicians and their secrets!', limit=2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['id'], self.movies[4].id)
+
+        # Persian descriptions use the same feature space
+        response = self.describe('شوالیه تاریکی')
+        self.assertEqual(response.data['results'][0]['id'], self.movies[2].id)
+
+    def test_repeated_descriptions_are_cached(self):
+        first = self.describe('prison drama').data['results']
+        with mock.patch.object(MovieRecommender, 'describe_rows') as describe_rows:
+            self.assertEqual(self.describe('  Prison   DRAMA ').data['results'], first)
+        describe_rows.assert_not_called()
+
+    def test_unmatched_or_empty_descriptions(self):
+        self.assertEqual(self.describe('the and of').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.describe('   ').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TrendingTest(RecommenderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            get_user_model().objects.create_user(email=f'trend{i}@example.com', password='TestPassword123!')
+            for i in range(3)
+        ]
+
+    def trending_ids(self, **params):
+        response = self.client.get(reverse('movie:trending'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [m['id'] for m in response.data['results']]
+
+    def test_events_are_buffered_until_flushed(self):
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users:
+                UserPreference.objects.create(user=user, movie=dark_knight, liked=True)
+            UserPreference.objects.create(user=self.users[0], movie=shawshank, watchlist=True)
+        self.assertFalse(MovieTrendingScore.objects.exists())
+
+        self.assertEqual(flush_trending(), 2)
+        self.assertEqual(self.trending_ids(), [dark_knight.id, shawshank.id])
+        self.assertEqual(self.trending_ids(genre='drama'), [shawshank.id])
+        self.assertEqual(self.trending_ids(type='series'), [])
+
+    def test_older_events_decay(self):
+        inception, interstellar = self.movies[:2]
+        now = timezone.now()
+        record_event(inception.id, 'likes', now - timedelta(days=30))
+        record_event(inception.id, 'likes', now - timedelta(days=30))
+        record_event(interstellar.id, 'likes', now)
+        flush_trending(now)
+        self.assertEqual(self.trending_ids(), [interstellar.id, inception.id])
+
+    def test_serving_does_not_touch_preferences(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserPreference.objects.create(user=self.users[0], movie=self.movies[0], liked=True)
+        flush_trending()
+        self.trending_ids()
+        with mock.patch.object(UserPreference.objects, 'filter') as preferences, \
+                mock.patch.object(MovieTrendingScore.objects, 'filter') as scores:
+            self.assertEqual(self.trending_ids(), [self.movies[0].id])
+        preferences.assert_not_called()
+        scores.assert_not_called()
+
+    def test_toggling_and_rebuild_count_each_event_once(self):
+        self.client.force_authenticate(self.users[0])
+        like = reverse('movie:like-movie', args=[self.movies[1].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(like)
+            self.client.post(like)
+            self.client.post(like)
+        flush_trending()
+        # Liking again after unliking does not count a second like
+        self.assertAlmostEqual(MovieTrendingScore.objects.get(movie=self.movies[1]).likes, 1, places=3)
+
+        call_command('rebuild_trending', stdout=StringIO())
+        # History only keeps the current like
+        self.assertAlmostEqual(MovieTrendingScore.objects.get(movie=self.movies[1]).likes, 1, places=3)
+
+    def test_user_events_are_deduplicated_when_flushed(self):
+        with mock.patch.object(cache, 'add') as add:
+            for _ in range(3):
+                record_event(self.movies[1].id, 'likes', user_id=self.users[0].id)
+        add.assert_not_called()
+        self.assertEqual(flush_trending(), 1)
+
+        # Another worker (or a later flush) already counted this like
+        record_event(self.movies[1].id, 'likes', user_id=self.users[0].id)
+        self.assertEqual(flush_trending(), 0)
+        self.assertAlmostEqual(MovieTrendingScore.objects.get(movie=self.movies[1]).likes, 1, places=3)
+
+    def test_full_buffers_flush_on_the_timer_thread(self):
+        with override_settings(TRENDING_FLUSH_EVENTS=2), \
+                mock.patch('movie.trending.threading.Timer') as timer, \
+                mock.patch('movie.trending.flush_trending') as flush:
+            record_event(self.movies[0].id, 'likes')
+            record_event(self.movies[1].id, 'likes')
+        flush.assert_not_called()
+        self.assertEqual(timer.call_args.args[0], 0)
+        reset_trending()
+
+    def test_uncommitted_writes_are_not_counted(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            UserPreference.objects.create(user=self.users[0], movie=self.movies[0], liked=True)
+        self.assertEqual(flush_trending(), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(flush_trending(), 1)
+
+    def test_idle_workers_flush_on_a_timer(self):
+        with override_settings(TRENDING_FLUSH_SECONDS=60), \
+                mock.patch('movie.trending.threading.Timer') as timer:
+            record_event(self.movies[0].id, 'likes')
+            record_event(self.movies[1].id, 'likes')
+        timer.assert_called_once()
+        self.assertEqual(timer.call_args.args[0], 60)
+        timer.return_value.start.assert_called_once()
+        # Cancelled by reset_trending, like any pending timer
+        reset_trending()
+        timer.return_value.cancel.assert_called_once()
+
+    def test_generation_survives_eviction(self):
+        record_event(self.movies[0].id, 'likes')
+        flush_trending()
+        self.assertEqual(self.trending_ids(), [self.movies[0].id])
+        cache.delete('trending:generation')
+        record_event(self.movies[1].id, 'likes')
+        record_event(self.movies[1].id, 'likes')
+        flush_trending()
+        self.assertEqual(self.trending_ids(), [self.movies[1].id, self.movies[0].id])
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get(reverse('movie:trending'), {'genre': 'opera'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('movie:trending'), {'type': 'short'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for limit in (0, 51, 'ten'):
+            response = self.client.get(reverse('movie:trending'), {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['error'], 'Invalid limit')
+
+
+class RecommendationCacheTest(RecommenderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(email='cache@example.com', password='TestPassword123!')
+        self.client.force_authenticate(self.user)
+        self.genre_question = RecommendationQuestion.objects.create(
+            question_text='Which genres do you like?', question_type='multiple'
+        )
+
+    def answer(self, genres):
+        return self.client.post(
+            reverse('movie:user-answers'),
+            [{'question': self.genre_question.id, 'answer_value': genres}],
+            format='json',
+        )
+
+    def recommended_ids(self):
+        response = self.client.get(reverse('movie:recommendations'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [m['id'] for m in response.data['results']]
+
+    def test_repeat_request_skips_answers_and_scoring(self):
+        self.answer(['drama'])
+        first = self.recommended_ids()
+        with mock.patch.object(MovieRecommender, 'get_recommendations_from_answers') as score, \
+                mock.patch.object(UserAnswer.objects, 'filter') as load_answers:
+            self.assertEqual(self.recommended_ids(), first)
+        score.assert_not_called()
+        load_answers.assert_not_called()
+
+    def test_new_answers_and_catalog_edits_invalidate(self):
+        self.answer(['drama'])
+        self.assertEqual(self.recommended_ids(), [self.movies[3].id, self.movies[4].id])
+
+        self.answer(['action'])
+        self.assertEqual(self.recommended_ids(), [self.movies[2].id])
+
+        self.movies[0].genre = 'action'
+        self.movies[0].save()
+        self.assertEqual(self.recommended_ids(), [self.movies[0].id, self.movies[2].id])
+
+    def test_seen_movies_are_excluded_and_invalidated_on_write(self):
+        self.answer(['drama'])
+        shawshank, prestige = self.movies[3], self.movies[4]
+        self.client.post(reverse('movie:watchlist', args=[shawshank.id]))
+        self.assertEqual(self.recommended_ids(), [prestige.id])
+
+        with mock.patch.object(UserPreference.objects, 'filter') as load_preferences:
+            self.assertEqual(list(get_seen_set(self.user.id).movie_ids), [shawshank.id])
+        load_preferences.assert_not_called()
+
+        # Removing it from the watchlist again leaves a preference that no longer counts as seen
+        self.client.post(reverse('movie:watchlist', args=[shawshank.id]))
+        self.assertEqual(self.recommended_ids(), [shawshank.id, prestige.id])
+
+    def test_seen_set_cached_before_commit_is_dropped_on_commit(self):
+        shawshank = self.movies[3]
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('movie:watchlist', args=[shawshank.id]))
+            # Another worker caches the set before the watchlist add commits
+            cache.set(f'seen:{self.user.id}', SeenSet([]))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(get_seen_set(self.user.id).movie_ids), [shawshank.id])
+
+    def test_cache_is_shared_and_survives_eviction(self):
+        # Per-process memory would leave other workers serving invalidated results
+        self.assertNotIn('locmem', settings.CACHES['recommendations']['BACKEND'])
+
+        self.answer(['drama'])
+        generation = catalog_generation()
+        self.recommended_ids()
+        cache.delete(CATALOG_GENERATION_KEY)
+        self.assertNotEqual(catalog_generation(), generation)
+        with mock.patch.object(MovieRecommender, 'get_recommendations_from_answers',
+                               return_value=[self.movies[4]]) as score:
+            self.assertEqual(self.recommended_ids(), [self.movies[4].id])
+        score.assert_called_once()
+
+    def test_user_without_answers_gets_400(self):
+        response = self.client.get(reverse('movie:recommendations'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecommenderEvaluationTest(RecommenderTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        inception, interstellar, dark_knight, shawshank, prestige = self.movies
+        # (train likes, test likes) per user
+        histories = [
+            ([inception, interstellar], [prestige]),
+            ([inception, prestige], [interstellar]),
+            ([interstellar, prestige], [inception]),
+            ([dark_knight], [shawshank]),
+        ]
+        old = timezone.now() - timedelta(days=30)
+        for i, (train, test) in enumerate(histories):
+            user = User.objects.create_user(email=f'eval{i}@example.com', password='TestPassword123!')
+            for movie in train:
+                preference = UserPreference.objects.create(user=user, movie=movie, liked=True)
+                UserPreference.objects.filter(id=preference.id).update(created_at=old)
+            for movie in test:
+                UserPreference.objects.create(user=user, movie=movie, liked=True)
+
+    def test_metrics_are_reported_per_strategy(self):
+        out = StringIO()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = f'{directory}/evaluation.json'
+        call_command('evaluate_recommenders', strategies=['popularity', 'item_item', 'content'], k=2,
+                     cutoff=(timezone.now() - timedelta(days=1)).isoformat(), output=output, per_query=True,
+                     stdout=out)
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+
+        self.assertEqual(set(report['summary']), {'popularity', 'item_item', 'content'})
+        item_item = report['summary']['item_item']
+        self.assertEqual(item_item['users'], 4)
+        # The first three users' held-out movie is the one co-liked with both of their train likes
+        self.assertGreaterEqual(item_item['recall@2'], 0.75)
+        self.assertEqual(len(report['per_query']), 12)
+        self.assertIn('latency_ms', report['per_query'][0])
+
+    def test_partial_weights_keep_the_other_defaults(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown --weights gnre'):
+            call_command('evaluate_recommenders', strategies=['questionnaire'], weights={'gnre': 1}, stdout=StringIO())
+
+        recommender = get_recommender()
+        question = RecommendationQuestion.objects.create(question_text='Which genres?', question_type='multiple')
+        answers = [UserAnswer(question=question, answer_value=['drama'])]
+        scores = recommender.answer_scores(answers, weights={'year': 0.5})
+        np.testing.assert_allclose(scores, recommender.answer_scores(answers))
+        self.assertEqual(recommender.answer_rows(answers, 2, {'genre': 0.9}).tolist(),
+                         recommender.answer_rows(answers, 2).tolist())
+
+    def test_ranking_metrics(self):
+        metrics = ranking_metrics(np.array([5, 1, 7]), np.array([1, 9]), k=3)
+        self.assertAlmostEqual(metrics['precision'], 1 / 3)
+        self.assertAlmostEqual(metrics['recall'], 1 / 2)
+        self.assertAlmostEqual(metrics['ndcg'], (1 / np.log2(3)) / (1 + 1 / np.log2(3)))
+
+
+class RecommenderBenchmarkTest(SimpleTestCase):
+    # SimpleTestCase fails any database query, so this also checks that none is timed
+    def test_benchmark_writes_comparable_json(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = f'{directory}/benchmark.json'
+        call_command('benchmark_recommender', sizes=[300], queries=5, output=output, stdout=StringIO())
+        with open(output, encoding='utf-8') as f:
+            run = json.load(f)
+        result = run['results'][0]
+        self.assertEqual(result['movies'], 300)
+        self.assertEqual(result['similar_rows']['queries'], 5)
+        self.assertEqual(result['answer_rows']['queries'], 5)
+        self.assertGreater(result['artifact_bytes'], 0)
+        self.assertEqual(result['ann']['backend'], 'ivf')
+        self.assertEqual(result['ann']['similar_rows']['queries'], 5)
+        self.assertTrue(0 <= result['ann']['recall'] <= 1)
+        self.assertEqual(len(result['ann']['probe_sweep']), 6)
+
+        self.assertEqual(compare_runs(run, run), [])
+        slower = copy.deepcopy(run)
+        slower['results'][0]['build_seconds'] = result['build_seconds'] * 2 + 1
+        self.assertEqual([metric for _, metric, _, _ in compare_runs(run, slower)], ['build_seconds'])
+        worse = copy.deepcopy(run)
+        worse['results'][0]['ann']['recall'] = result['ann']['recall'] / 2
+        self.assertEqual([metric for _, metric, _, _ in compare_runs(run, worse)],
+                         ['ann.recall'] if result['ann']['recall'] else [])
+        # Baselines from before a metric existed are still comparable
+        del slower['results'][0]['title_lookup']
+        self.assertEqual(compare_runs(slower, run), [])
@@ -0,0 +1,234 @@
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+from . import recommender_store
+
+# Arabic code points that Persian keyboards and datasets use interchangeably with Persian ones
+_PERSIAN_TRANSLATION = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'ٱ': 'ا',
+    '\u200c': ' ',  # zero-width non-joiner
+    '\u0640': None,  # tatweel
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670]')
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+# Match quality tiers, best first
+EXACT, PREFIX, WORD, SUBSTRING, FUZZY = 4, 3, 2, 1, 0
+MIN_FUZZY_SIMILARITY = 0.5
+# Edited movies kept in the overlay before it is folded back into the base structures
+MAX_OVERLAY_MOVIES = 1000
+
+
+def normalize_title(text):
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text).casefold().translate(_PERSIAN_TRANSLATION)
+    text = _DIACRITICS.sub('', text)
+    text = _PUNCTUATION.sub('', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """
+    Resolves English or Persian titles to movie ids.
+
+    Every title is normalized once at build time and stored in an exact-match dict,
+    a sorted list for prefix lookups and a trigram inverted index for substring and
+    fuzzy matches. Incremental edits are kept in a small overlay index so the base
+    structures never have to be rebuilt for a single movie; once the overlay holds
+    MAX_OVERLAY_MOVIES movies everything is rebuilt into a fresh base.
+    """
+
+    def __init__(self, movie_ids, titles):
+        entry_ids, entry_titles = [], []
+        for movie_id, movie_titles in zip(movie_ids, titles):
+            for title in dict.fromkeys(normalize_title(t) for t in movie_titles):
+                if title:
+                    entry_ids.append(int(movie_id))
+                    entry_titles.append(title)
+        self._build(np.array(entry_ids, dtype=np.int64), entry_titles)
+
+    def _build(self, entry_ids, entry_titles):
+        """Index already normalized (movie id, title) entries."""
+        self._entry_ids = entry_ids
+        self._entry_titles = entry_titles
+        self._lengths = np.array([len(title) for title in self._entry_titles], dtype=np.int32)
+
+        self._exact = {}
+        for entry, title in enumerate(self._entry_titles):
+            self._exact.setdefault(title, entry)
+
+        order = sorted(range(len(self._entry_titles)), key=self._entry_titles.__getitem__)
+        self._sorted_titles = [self._entry_titles[entry] for entry in order]
+        self._sorted_entries = np.array(order, dtype=np.int64)
+
+        postings = {}
+        self._gram_counts = np.zeros(len(self._entry_titles), dtype=np.int32)
+        for entry, title in enumerate(self._entry_titles):
+            grams = trigrams(title)
+            self._gram_counts[entry] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(entry)
+        self._grams = {gram: np.array(entries, dtype=np.int32) for gram, entries in postings.items()}
+
+        self._hidden_ids = frozenset()
+        self._overlay_movies = {}
+        self._overlay = None
+
+    @classmethod
+    def from_movies(cls, movies):
+        movies = [movie for movie in movies if movie is not None]
+        return cls([movie.id for movie in movies], [(movie.title, movie.title_fa) for movie in movies])
+
+    def __len__(self):
+        return len(self._entry_titles)
+
+    def save(self, path):
+        """Store the normalized entries next to the other artifact arrays; edits are folded in first."""
+        index = self._compacted() if self._overlay_movies or self._hidden_ids else self
+        recommender_store.save_arrays(path, title_ids=index._entry_ids)
+        # Normalized titles never contain a newline
+        recommender_store.write_text(path, 'titles.txt', '\n'.join(index._entry_titles))
+
+    @classmethod
+    def load(cls, path):
+        """The index saved in `path`, or None for artifacts saved without their titles."""
+        try:
+            text = recommender_store.read_text(path, 'titles.txt')
+        except FileNotFoundError:
+            return None
+        index = object.__new__(cls)
+        index._build(np.array(recommender_store.load_array(path, 'title_ids', mmap=False)),
+                     text.split('\n') if text else [])
+        return index
+
+    def updated(self, movies=(), removed_ids=()):
+        """Return a copy where `movies` replace their old titles and `removed_ids` disappear."""
+        movies = [movie for movie in movies if movie is not None]
+        changed_ids = [movie.id for movie in movies] + [int(movie_id) for movie_id in removed_ids]
+        if not changed_ids:
+            return self
+
+        overlay_movies = dict(self._overlay_movies)
+        for movie_id in changed_ids:
+            overlay_movies.pop(movie_id, None)
+        for movie in movies:
+            overlay_movies[movie.id] = (movie.title, movie.title_fa)
+
+        updated = object.__new__(TitleIndex)
+        updated.__dict__.update(self.__dict__)
+        updated._hidden_ids = self._hidden_ids | frozenset(changed_ids)
+        updated._overlay_movies = overlay_movies
+        updated._overlay = TitleIndex(overlay_movies.keys(), overlay_movies.values()) if overlay_movies else None
+        if len(updated._hidden_ids) > MAX_OVERLAY_MOVIES:
+            return updated._compacted()
+        return updated
+
+    def _compacted(self):
+        """A fresh index holding the visible base titles and the overlay, with no overlay of its own."""
+        titles = {}
+        for movie_id, title in zip(self._entry_ids.tolist(), self._entry_titles):
+            if movie_id not in self._hidden_ids:
+                titles.setdefault(movie_id, []).append(title)
+        titles.update((movie_id, list(pair)) for movie_id, pair in self._overlay_movies.items())
+        return TitleIndex(titles.keys(), titles.values())
+
+    def lookup(self, query):
+        matches = self.search(query, limit=1)
+        return matches[0][0] if matches else None
+
+    def search(self, query, limit=10):
+        """Return up to `limit` (movie_id, quality, similarity) tuples, best match first."""
+        query = normalize_title(query)
+        if not query:
+            return []
+
+        matches = self._search_base(query, limit)
+        if self._overlay is not None:
+            matches.update(self._overlay._search_base(query, limit))
+
+        ranked = sorted(matches.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+        return [(movie_id, quality, similarity) for movie_id, (quality, similarity) in ranked[:limit]]
+
+    def _search_base(self, query, limit):
+        # movie_id -> best (quality, similarity) among the movie's titles. Similarity is the
+        # share of the title covered by the query, or trigram Dice overlap for fuzzy matches.
+        matches = {}
+
+        def add(entries, quality, similarities):
+            for entry, similarity in zip(entries, similarities):
+                movie_id = int(self._entry_ids[entry])
+                if movie_id in self._hidden_ids:
+                    continue
+                if (quality, similarity) > matches.get(movie_id, (-1, -1.0)):
+                    matches[movie_id] = (quality, float(similarity))
+
+        def coverage(entries):
+            return len(query) / self._lengths[entries]
+
+        def shortest(entries, count):
+            # Shorter titles are closer matches for the same query
+            if len(entries) > count:
+                entries = entries[np.argpartition(self._lengths[entries], count - 1)[:count]]
+            return entries[np.argsort(self._lengths[entries], kind='stable')]
+
+        exact = self._exact.get(query)
+        if exact is not None:
+            add([exact], EXACT, [1.0])
+
+        lo = bisect.bisect_left(self._sorted_titles, query)
+        hi = bisect.bisect_right(self._sorted_titles, query + '\uffff')
+        prefixed = shortest(self._sorted_entries[lo:hi], limit + len(self._hidden_ids))
+        add(prefixed, PREFIX, coverage(prefixed))
+
+        # Later passes only find lower quality tiers, so stop once the request is covered
+        query_grams = trigrams(query)
+        if not query_grams or len(matches) >= limit:
+            return matches
+
+        postings = [self._grams.get(gram) for gram in query_grams]
+        if all(posting is not None for posting in postings):
+            # A substring match contains every query trigram; intersect starting from the rarest
+            postings.sort(key=len)
+            candidates = postings[0]
+            for posting in postings[1:]:
+                candidates = np.intersect1d(candidates, posting, assume_unique=True)
+                if not len(candidates):
+                    break
+
+            found = {WORD: [], SUBSTRING: []}
+            for entry in candidates[np.argsort(self._lengths[candidates], kind='stable')]:
+                title = self._entry_titles[entry]
+                position = title.find(query)
+                if position > 0:
+                    found[WORD if title[position - 1] == ' ' else SUBSTRING].append(entry)
+                    if len(found[WORD]) >= limit + len(self._hidden_ids):
+                        break
+            for quality, entries in found.items():
+                entries = np.array(entries, dtype=np.int64)
+                add(entries, quality, coverage(entries))
+
+        if not matches:
+            present = [posting for posting in postings if posting is not None]
+            if present:
+                entries, shared = np.unique(np.concatenate(present), return_counts=True)
+                scores = 2.0 * shared / (len(query_grams) + self._gram_counts[entries])
+                keep = scores >= MIN_FUZZY_SIMILARITY
+                add(entries[keep], FUZZY, scores[keep])
+        return matches
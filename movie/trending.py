@@ -0,0 +1,296 @@
+import atexit
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Movie, MovieTrendingScore, UserPreference
+from .recommendation_cache import cache
+from .seen import seen_preferences
+
+COUNTERS = ('likes', 'watchlist_adds', 'ratings')
+
+# rank_key is log2(score) plus the half-lives elapsed since this instant
+RANK_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+# Stored instead of -inf for rows without a score
+NO_RANK = -1e18
+
+TRENDING_GENERATION_KEY = 'trending:generation'
+
+
+def _half_lives(seconds):
+    return seconds / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def decay(seconds):
+    return 0.5 ** _half_lives(max(seconds, 0.0))
+
+
+def rank_key(score, at):
+    """log2 of `score` (valid at `at`) decayed back to RANK_EPOCH; the same order as current scores."""
+    if score <= 0:
+        return NO_RANK
+    return math.log2(score) + _half_lives((at - RANK_EPOCH).total_seconds())
+
+
+def preference_events(preference, previous=None):
+    """
+    Counters a saved preference adds to: a new like, a new watchlist entry or a new or
+    changed rating. `previous` is the (liked, watchlist, rating) loaded from the database,
+    or None for a new preference.
+    """
+    liked, watchlist, rating = previous or (False, False, None)
+    events = []
+    if preference.liked and not liked:
+        events.append('likes')
+    if preference.watchlist and not watchlist:
+        events.append('watchlist_adds')
+    if preference.rating is not None and preference.rating != rating:
+        events.append('ratings')
+    return events
+
+
+class TrendingBuffer:
+    """
+    Engagement events of this process, summed per movie and counter in memory until
+    enough events or time accumulate for one batched write. Counters are scaled to the
+    buffer's start time, so events decay correctly whenever the buffer is flushed.
+
+    Events of a known user are kept apart, once per user, movie and counter, until the
+    flush checks them against the shared dedup keys; recording an event never touches
+    the cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.started = timezone.now()
+        self.opened = time.monotonic()
+        self.events = 0
+        self.pending = {}
+        self.user_events = {}
+
+    def add(self, movie_id, counter, when=None, user_id=None):
+        """Buffer one event; returns whether the buffer is due for a flush."""
+        growth = 2 ** _half_lives(((when or timezone.now()) - self.started).total_seconds())
+        with self._lock:
+            if user_id is None:
+                counts = self.pending.setdefault(movie_id, dict.fromkeys(COUNTERS, 0.0))
+                counts[counter] += growth
+                self.events += 1
+            elif (user_id, movie_id, counter) not in self.user_events:
+                self.user_events[user_id, movie_id, counter] = growth
+                self.events += 1
+            return (self.events >= settings.TRENDING_FLUSH_EVENTS or
+                    time.monotonic() - self.opened >= settings.TRENDING_FLUSH_SECONDS)
+
+    def take(self):
+        """Swap out and return (started, pending counters, {(user_id, movie_id, counter): growth})."""
+        with self._lock:
+            started, pending, user_events = self.started, self.pending, self.user_events
+            self._reset()
+        return started, pending, user_events
+
+
+_buffer = TrendingBuffer()
+
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def _schedule_flush(due=False):
+    """
+    Flush TRENDING_FLUSH_SECONDS from now, so a worker that goes idle still writes its
+    events, or right away on the timer thread once the buffer is `due`. Requests only
+    ever buffer; the writes and their row locks stay off the request thread.
+    """
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            if not due or _timer.interval == 0:
+                return
+            _timer.cancel()
+        _timer = threading.Timer(0 if due else settings.TRENDING_FLUSH_SECONDS, _flush_on_timer)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _cancel_flush():
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+
+
+def _flush_on_timer():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    try:
+        flush_trending()
+    except Exception as e:
+        print(f"Error flushing trending events: {e}")
+    finally:
+        # The timer thread's own connection would otherwise stay open until the server restarts
+        connections.close_all()
+
+
+def _dedup_key(user_id, movie_id, counter):
+    return f'trending:seen:{user_id}:{movie_id}:{counter}'
+
+
+def record_event(movie_id, counter, when=None, user_id=None):
+    """
+    Buffer one engagement event. With `user_id`, only the first event of that user,
+    movie and counter in TRENDING_DEDUP_HOURS counts, so toggling a like off and on
+    again does not inflate the score; the flush checks that.
+    """
+    _schedule_flush(due=_buffer.add(movie_id, counter, when, user_id))
+
+
+def _first_events(user_events):
+    """Add each user event nobody counted within TRENDING_DEDUP_HOURS; yields (movie_id, counter, growth)."""
+    timeout = settings.TRENDING_DEDUP_HOURS * 3600
+    for (user_id, movie_id, counter), growth in user_events.items():
+        if cache.add(_dedup_key(user_id, movie_id, counter), True, timeout):
+            yield movie_id, counter, growth
+
+
+def flush_trending(now=None):
+    """Write this process's buffered events; returns the number of movies updated."""
+    started, pending, user_events = _buffer.take()
+    for movie_id, counter, growth in _first_events(user_events):
+        pending.setdefault(movie_id, dict.fromkeys(COUNTERS, 0.0))[counter] += growth
+    if not pending:
+        return 0
+    now = now or timezone.now()
+    scale = decay((now - started).total_seconds())
+    return write_counters({
+        movie_id: {counter: value * scale for counter, value in counts.items()}
+        for movie_id, counts in pending.items()
+    }, now)
+
+
+def reset_trending():
+    """Drop buffered events without writing them."""
+    _cancel_flush()
+    _buffer.take()
+
+
+@atexit.register
+def _flush_at_exit():
+    _cancel_flush()
+    try:
+        flush_trending()
+    except Exception as e:
+        print(f"Error flushing trending events: {e}")
+
+
+def _score(row):
+    weights = settings.TRENDING_WEIGHTS
+    return sum(weights[counter] * getattr(row, counter) for counter in COUNTERS)
+
+
+def write_counters(counters, now):
+    """Add `counters` ({movie_id: {counter: value at `now`}}) to the stored rows in one transaction."""
+    movie_ids = list(Movie.objects.filter(id__in=list(counters)).values_list('id', flat=True))
+    if not movie_ids:
+        return 0
+    with transaction.atomic():
+        # Create missing rows first, so concurrent flushes from other workers only ever update
+        MovieTrendingScore.objects.bulk_create(
+            [MovieTrendingScore(movie_id=movie_id, updated_at=now) for movie_id in movie_ids],
+            ignore_conflicts=True,
+        )
+        # Lock rows in one order, so two workers flushing overlapping movies cannot deadlock
+        rows = list(MovieTrendingScore.objects.select_for_update().filter(movie_id__in=movie_ids).order_by('movie_id'))
+        for row in rows:
+            at = max(now, row.updated_at)
+            stored, added = decay((at - row.updated_at).total_seconds()), decay((at - now).total_seconds())
+            for counter in COUNTERS:
+                setattr(row, counter, getattr(row, counter) * stored + counters[row.movie_id][counter] * added)
+            row.score = _score(row)
+            row.rank_key = rank_key(row.score, at)
+            row.updated_at = at
+        MovieTrendingScore.objects.bulk_update(rows, COUNTERS + ('score', 'rank_key', 'updated_at'), batch_size=500)
+    bump_trending_generation()
+    return len(rows)
+
+
+def rebuild_trending(now=None, chunk_size=10000, batch_size=5000):
+    """
+    Recompute every row from UserPreference history, taking each preference's
+    updated_at as the time of its like, watchlist add and rating.
+    Returns the number of movies stored.
+    """
+    now = now or timezone.now()
+    counters = {}
+    rows = seen_preferences().values_list('movie_id', 'liked', 'watchlist', 'rating', 'updated_at')
+    for movie_id, liked, watchlist, rating, updated_at in rows.iterator(chunk_size=chunk_size):
+        weight = decay((now - updated_at).total_seconds())
+        counts = counters.setdefault(movie_id, dict.fromkeys(COUNTERS, 0.0))
+        for counter in preference_events(UserPreference(liked=liked, watchlist=watchlist, rating=rating)):
+            counts[counter] += weight
+
+    with transaction.atomic():
+        MovieTrendingScore.objects.all().delete()
+        batch = []
+        for movie_id, counts in counters.items():
+            row = MovieTrendingScore(movie_id=movie_id, updated_at=now, **counts)
+            row.score = _score(row)
+            row.rank_key = rank_key(row.score, now)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                MovieTrendingScore.objects.bulk_create(batch)
+                batch = []
+        MovieTrendingScore.objects.bulk_create(batch)
+    bump_trending_generation()
+    return len(counters)
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def trending_generation():
+    return cache.get_or_set(TRENDING_GENERATION_KEY, _new_generation, None)
+
+
+def bump_trending_generation():
+    """
+    Invalidate every cached trending list after a flush or rebuild. Like the catalog
+    generation it is a fresh random value, so an evicted generation never comes back.
+    """
+    cache.set(TRENDING_GENERATION_KEY, _new_generation(), None)
+
+
+def trending_movie_ids(genre=None, is_tv_series=None):
+    """
+    Ids of the TRENDING_LIST_SIZE top movies, optionally of one genre and/or type, best
+    first. Each list is read once per flush from the rank_key index and then served
+    from the cache; rank_key order stays correct between flushes, since every score
+    decays at the same rate.
+    """
+    kind = 'all' if is_tv_series is None else ('series' if is_tv_series else 'movie')
+    key = f'trending:list:{genre or "all"}:{kind}:{trending_generation()}'
+    movie_ids = cache.get(key)
+    if movie_ids is None:
+        queryset = MovieTrendingScore.objects.filter(score__gt=0)
+        if genre:
+            queryset = queryset.filter(movie__genre=genre)
+        if is_tv_series is not None:
+            queryset = queryset.filter(movie__is_tv_series=is_tv_series)
+        movie_ids = list(
+            queryset.order_by('-rank_key', 'movie_id').values_list('movie_id', flat=True)[:settings.TRENDING_LIST_SIZE]
+        )
+        cache.set(key, movie_ids, settings.RECOMMENDATION_CACHE_TIMEOUT)
+    return movie_ids
@@ -5,9 +5,18 @@ from .views import (
     GenreListView,
     MovieSearchView,
     SimilarMoviesView,
+    BatchSimilarMoviesView,
+    MovieNeighborsView,
     RecommendationQuestionsView,
     UserAnswersView,
     GetRecommendationsView,
+    PersonalRecommendationsView,
+    TasteRecommendationsView,
+    DescribeRecommendationsView,
+    HybridRecommendationsView,
+    TrendingMoviesView,
+    RecommenderMemoryView,
+    RecommenderRebuildView,
     UserPreferenceView,
     LikeMovieView,
     WatchlistView,
@@ -31,7 +40,16 @@ urlpatterns = [
 
     # Recommendor
     path('recommendations/', GetRecommendationsView.as_view(), name='recommendations'),
+    path('recommendations/personal/', PersonalRecommendationsView.as_view(), name='personal-recommendations'),
+    path('recommendations/taste/', TasteRecommendationsView.as_view(), name='taste-recommendations'),
+    path('recommendations/hybrid/', HybridRecommendationsView.as_view(), name='hybrid-recommendations'),
+    path('recommendations/describe/', DescribeRecommendationsView.as_view(), name='describe-recommendations'),
+    path('trending/', TrendingMoviesView.as_view(), name='trending'),
     path('similar/', SimilarMoviesView.as_view(), name='similar-movies'),
+    path('similar/batch/', BatchSimilarMoviesView.as_view(), name='similar-movies-batch'),
+    path('movies/<int:movie_id>/similar/', MovieNeighborsView.as_view(), name='movie-neighbors'),
+    path('recommender/memory/', RecommenderMemoryView.as_view(), name='recommender-memory'),
+    path('recommender/rebuild/', RecommenderRebuildView.as_view(), name='recommender-rebuild'),
     
     # User preferences
     path('preferences/', UserPreferenceView.as_view(), name='user-preferences'),
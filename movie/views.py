@@ -1,21 +1,71 @@
+import math
+import time
+
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
 from django.db.models import Q
 from django.core.exceptions import ValidationError
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_page
 from .models import Movie, UserPreference, RecommendationQuestion, UserAnswer
 from .serializers import (
     MovieSerializer, MovieBriefSerializer, UserPreferenceSerializer,
     RecommendationQuestionSerializer, UserAnswerSerializer,
-    MovieSimilarityRequestSerializer
+    MovieSimilarityRequestSerializer, BatchSimilarityRequestSerializer
+)
+from .recommendations import RecommenderNotReady, get_recommender, loaded_recommender, rebuild_in_background
+from . import recommender_store
+from .collaborative import also_liked_movies, get_als_model
+from .recommendation_cache import (
+    cached_description_ids, cached_recommendation_ids, forget_answers, remember_answers
 )
-from .recommendations import MovieRecommender
+from .taste import get_taste_vector
+from .hybrid import HYBRID_SIGNALS, HybridRecommender
+from .seen import get_seen_set
+from .diversity import pool_size
+from .trending import trending_movie_ids
 from .models import GENRE_CHOICES
 from rest_framework import permissions
 
 
+def parse_diversity(request):
+    """The `diversity` query parameter as a float in [0, 1] (0 when absent), or None when invalid."""
+    try:
+        diversity = float(request.query_params.get('diversity', 0))
+    except (TypeError, ValueError):
+        return None
+    return diversity if 0 <= diversity <= 1 else None
+
+
+def parse_limit(request, default=10, maximum=50):
+    """The `limit` query parameter as an int in [1, maximum] (`default` when absent), or None when invalid."""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except (TypeError, ValueError):
+        return None
+    return limit if 1 <= limit <= maximum else None
+
+
+INVALID_DIVERSITY = {
+    "error": "Invalid diversity",
+    "details": "Diversity must be a number between 0 and 1"
+}
+
+INVALID_LIMIT = {
+    "error": "Invalid limit",
+    "details": "Limit must be a number between 1 and 50"
+}
+
+RECOMMENDER_NOT_READY = {
+    "error": "Recommender not ready",
+    "details": "The recommender is still loading, please try again in a few seconds"
+}
+
+
 class MovieDetailView(APIView):
     permission_classes = [AllowAny]
 
@@ -48,6 +98,9 @@ class MovieDetailView(APIView):
             if user_preference:
                 movie_data['user_preference'] = UserPreferenceSerializer(user_preference).data
             
+            # Users who liked this also liked, from the precomputed co-occurrence table
+            movie_data['also_liked'] = MovieBriefSerializer(also_liked_movies(movie.id), many=True).data
+            
             return Response(movie_data)
             
         except Exception as e:
@@ -159,8 +212,10 @@ class SimilarMoviesView(APIView):
                         "details": "Please provide a valid movie name"
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
-                recommender = MovieRecommender()
-                similar_movies = recommender.find_similar_movies(movie_name, limit)
+                recommender = get_recommender()
+                similar_movies = recommender.find_similar_movies(
+                    movie_name, limit, serializer.catalog_filter(), serializer.validated_data['diversity']
+                )
                 
                 if not similar_movies:
                     return Response({
@@ -179,6 +234,78 @@ class SimilarMoviesView(APIView):
                 "details": serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
             
+        except RecommenderNotReady:
+            return Response(RECOMMENDER_NOT_READY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({
+                "error": "Failed to find similar movies",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class BatchSimilarMoviesView(APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        try:
+            serializer = BatchSimilarityRequestSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({
+                    "error": "Invalid request data",
+                    "details": serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            seeds = serializer.validated_data['movies']
+            limit = serializer.validated_data['limit']
+
+            similar_movies = get_recommender().find_similar_movies_batch(
+                seeds, limit, serializer.catalog_filter(), serializer.validated_data['diversity']
+            )
+
+            # A list in request order, so seeds such as 5 and "5" never share an entry
+            return Response({
+                "count": len(seeds),
+                "results": [
+                    {"movie": seed, "results": MovieBriefSerializer(movies, many=True).data}
+                    for seed, movies in zip(seeds, similar_movies) if movies is not None
+                ],
+                "not_found": [seed for seed, movies in zip(seeds, similar_movies) if movies is None]
+            })
+
+        except RecommenderNotReady:
+            return Response(RECOMMENDER_NOT_READY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({
+                "error": "Failed to find similar movies",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class MovieNeighborsView(APIView):
+    permission_classes = [AllowAny]
+
+    # Neighbors only change when the offline table is rebuilt, so responses are shared by everyone
+    @method_decorator(cache_page(60 * 15))
+    def get(self, request, movie_id):
+        try:
+            limit = parse_limit(request)
+            if limit is None:
+                return Response(INVALID_LIMIT, status=status.HTTP_400_BAD_REQUEST)
+
+            if not Movie.objects.filter(id=movie_id).exists():
+                return Response({
+                    "error": "Movie not found",
+                    "details": f"No movie found with ID {movie_id}"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            similar_movies = get_recommender().similar_to_movie(movie_id, limit)
+
+            return Response({
+                "movie_id": movie_id,
+                "count": len(similar_movies),
+                "results": MovieBriefSerializer(similar_movies, many=True).data
+            })
+
+        except RecommenderNotReady:
+            return Response(RECOMMENDER_NOT_READY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             return Response({
                 "error": "Failed to find similar movies",
@@ -243,6 +370,7 @@ class UserAnswersView(generics.CreateAPIView):
             
             # Clear previous answers
             UserAnswer.objects.filter(user=request.user).delete()
+            forget_answers(request.user.id)
             
             # Validate and create new answers
             answers = []
@@ -262,6 +390,8 @@ class UserAnswersView(generics.CreateAPIView):
                 
                 answers.append(serializer.save(user=request.user))
             
+            remember_answers(request.user.id, answers)
+            
             return Response({
                 "message": f"Successfully saved {len(answers)} answers",
                 "count": len(answers),
@@ -279,17 +409,24 @@ class GetRecommendationsView(APIView):
 
     def get(self, request):
         try:
-            user_answers = UserAnswer.objects.filter(user=request.user)
+            # Ranked ids are cached per answer fingerprint and catalog version, so repeat
+            # requests skip both the answer query and the scoring pass
+            recommender = get_recommender()
+            movie_ids = cached_recommendation_ids(
+                request.user.id,
+                recommender,
+                lambda: UserAnswer.objects.filter(user=request.user).select_related('question'),
+                seen=get_seen_set(request.user.id),
+            )
             
-            if not user_answers.exists():
+            if movie_ids is None:
                 return Response({
                     "error": "No answers found",
                     "details": "Please answer the recommendation questions first before getting recommendations"
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Get recommendations
-            recommender = MovieRecommender()
-            recommended_movies = recommender.get_recommendations_from_answers(user_answers)
+            movies = Movie.objects.in_bulk(movie_ids)
+            recommended_movies = [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
             
             if not recommended_movies:
                 return Response({
@@ -302,12 +439,270 @@ class GetRecommendationsView(APIView):
                 "results": MovieBriefSerializer(recommended_movies, many=True).data
             })
             
+        except RecommenderNotReady:
+            return Response(RECOMMENDER_NOT_READY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             return Response({
                 "error": "Failed to get recommendations",
                 "details": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class PersonalRecommendationsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = parse_limit(request)
+            if limit is None:
+                return Response(INVALID_LIMIT, status=status.HTTP_400_BAD_REQUEST)
+
+            model = get_als_model()
+            seen = get_seen_set(request.user.id)
+            movie_ids, scores = model.recommend(request.user.id, limit, seen.movie_ids) if model else ((), ())
+
+            if not len(movie_ids):
+                return Response({
+                    "error": "No recommendations available",
+                    "details": "Like, rate or add a few movies to your watchlist to get personalized recommendations"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            movies = Movie.objects.in_bulk([int(movie_id) for movie_id in movie_ids])
+            recommended_movies = [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
+            return Response({
+                "model_version": model.version,
+                "count": len(recommended_movies),
+                "results": MovieBriefSerializer(recommended_movies, many=True).data
+            })
+
+        except Exception as e:
+            return Response({
+                "error": "Failed to get recommendations",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class DescribeRecommendationsView(APIView):
+    """Movies matching a short free-text description, e.g. ?q=space heist with a twist."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            description = request.query_params.get('q', '').strip()
+            if not 1 <= len(description) <= 200:
+                return Response({
+                    "error": "Invalid description",
+                    "details": "Please describe what you want to watch in 1 to 200 characters"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            limit = parse_limit(request)
+            if limit is None:
+                return Response(INVALID_LIMIT, status=status.HTTP_400_BAD_REQUEST)
+
+            movie_ids = cached_description_ids(description, get_recommender(), limit)
+            movies = Movie.objects.in_bulk(movie_ids)
+            matching_movies = [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
+            if not matching_movies:
+                return Response({
+                    "error": "No matching movies",
+                    "details": f"No movies found matching '{description}'"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            return Response({
+                "description": description,
+                "count": len(matching_movies),
+                "results": MovieBriefSerializer(matching_movies, many=True).data
+            })
+
+        except RecommenderNotReady:
+            return Response(RECOMMENDER_NOT_READY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({
+                "error": "Failed to search by description",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class TasteRecommendationsView(APIView):
+    """Movies nearest to the user's recency-weighted taste vector of likes and ratings."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = parse_limit(request)
+            if limit is None:
+                return Response(INVALID_LIMIT, status=status.HTTP_400_BAD_REQUEST)
+
+            diversity = parse_diversity(request)
+            if diversity is None:
+                return Response(INVALID_DIVERSITY, status=status.HTTP_400_BAD_REQUEST)
+
+            recommender = get_recommender()
+            taste = get_taste_vector(request.user.id, recommender)
+            seen = get_seen_set(request.user.id)
+            rows = recommender.nearest_rows(taste.vector, pool_size(limit) if diversity else limit,
+                                            seen.rows(recommender))
+            if diversity:
+                rows = recommender.diversify(rows, recommender.vector_scores(taste.vector, rows), limit, diversity)
+
+            if not len(rows):
+                return Response({
+                    "error": "No recommendations available",
+                    "details": "Like or rate a few movies to get recommendations based on your taste"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            recommended_movies = recommender.hydrate(rows)
+            return Response({
+                "count": len(recommended_movies),
+                "results": MovieBriefSerializer(recommended_movies, many=True).data
+            })
+
+        except RecommenderNotReady:
+            return Response(RECOMMENDER_NOT_READY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({
+                "error": "Failed to get recommendations",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class HybridRecommendationsView(APIView):
+    """
+    Questionnaire, taste and collaborative scores blended into one ranking. Any of the
+    HYBRID_SIGNALS can be passed as a query parameter to override its weight.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = parse_limit(request)
+            if limit is None:
+                return Response(INVALID_LIMIT, status=status.HTTP_400_BAD_REQUEST)
+
+            weights = {}
+            for signal in HYBRID_SIGNALS:
+                if signal not in request.query_params:
+                    continue
+                try:
+                    weights[signal] = float(request.query_params[signal])
+                except ValueError:
+                    weights[signal] = -1
+                if not (math.isfinite(weights[signal]) and weights[signal] >= 0):
+                    return Response({
+                        "error": "Invalid weight",
+                        "details": f"The {signal} weight must be a finite non-negative number"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+            diversity = parse_diversity(request)
+            if diversity is None:
+                return Response(INVALID_DIVERSITY, status=status.HTTP_400_BAD_REQUEST)
+
+            hybrid = HybridRecommender(request.user.id, weights)
+            movie_ids = hybrid.recommend(limit, diversity)
+
+            started = time.perf_counter()
+            movies = Movie.objects.in_bulk(movie_ids)
+            recommended_movies = [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+            hybrid.timings['hydrate_ms'] = (time.perf_counter() - started) * 1000
+
+            if not recommended_movies:
+                return Response({
+                    "error": "No recommendations available",
+                    "details": "Answer the recommendation questions or like a few movies to get recommendations"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            data = {
+                "weights": hybrid.weights,
+                "count": len(recommended_movies),
+                "results": MovieBriefSerializer(recommended_movies, many=True).data
+            }
+            if settings.DEBUG:
+                data["timings"] = hybrid.timings
+            return Response(data)
+
+        except RecommenderNotReady:
+            return Response(RECOMMENDER_NOT_READY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({
+                "error": "Failed to get recommendations",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class TrendingMoviesView(APIView):
+    """Top movies by time-decayed likes, watchlist adds and ratings, optionally per genre or type."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            limit = parse_limit(request, default=20)
+            if limit is None:
+                return Response(INVALID_LIMIT, status=status.HTTP_400_BAD_REQUEST)
+
+            genre = request.query_params.get('genre')
+            if genre and genre not in dict(GENRE_CHOICES):
+                return Response({
+                    "error": "Invalid genre",
+                    "details": f"Genre must be one of: {', '.join(dict(GENRE_CHOICES))}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            movie_type = request.query_params.get('type')
+            if movie_type not in (None, 'movie', 'series'):
+                return Response({
+                    "error": "Invalid type",
+                    "details": "Type must be either 'movie' or 'series'"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            is_tv_series = None if movie_type is None else movie_type == 'series'
+
+            movie_ids = trending_movie_ids(genre, is_tv_series)[:limit]
+            movies = Movie.objects.in_bulk(movie_ids)
+            trending_movies = [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
+            return Response({
+                "genre": genre,
+                "type": movie_type,
+                "count": len(trending_movies),
+                "results": MovieBriefSerializer(trending_movies, many=True).data
+            })
+
+        except Exception as e:
+            return Response({
+                "error": "Failed to get trending movies",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class RecommenderMemoryView(APIView):
+    """Resident memory of the worker that serves the request; call repeatedly to sample workers."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # Only reports the model this worker already holds; sampling must not load one
+        recommender = loaded_recommender()
+        return Response({
+            "recommender_version": recommender.version if recommender is not None else None,
+            "memory_mapped": recommender is not None and recommender.memory_mapped,
+            "memory": recommender_store.process_memory(),
+        })
+
+class RecommenderRebuildView(APIView):
+    """Start a background rebuild; workers switch to the new artifact once it is published."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        try:
+            if not rebuild_in_background():
+                return Response({
+                    "error": "Rebuild already running",
+                    "details": "Wait for the current rebuild to be published before starting another"
+                }, status=status.HTTP_409_CONFLICT)
+            recommender = loaded_recommender()
+            return Response({
+                "message": "Recommender rebuild started",
+                "current_version": recommender.version if recommender is not None else None
+            }, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response({
+                "error": "Failed to start rebuild",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class UserPreferenceView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = UserPreferenceSerializer